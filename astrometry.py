@@ -52,11 +52,12 @@ class AstrometryClient:
         else:
             logging.critical("Authentication failed. Session key not obtained.")
 
-    def upload_image(self, image_path):
+    def upload_image(self, image_path, image=None):
         """Uploads an image to the Astrometry.net API and returns the submission ID.
 
         Args:
             image_path (str): The path to the image file to be uploaded.
+            image (bytes): Contents of the image to upload instead of the file, optional.
 
         Returns:
             str: The submission ID of the uploaded image, or None if the upload failed.
@@ -65,9 +66,13 @@ class AstrometryClient:
             logging.warning("Please authenticate first.")
             return None
 
+        if image is None:
+            with open(image_path, "rb") as file:
+                image = file.read()
+
         files = {
             "request-json": (None, json.dumps({"session": self.session})),
-            "file": (image_path, open(image_path, "rb"), "application/octet-stream"),
+            "file": (image_path, image, "application/octet-stream"),
         }
         response = requests.post("http://nova.astrometry.net/api/upload", files=files)
 
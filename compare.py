@@ -59,8 +59,17 @@ class FolderComparator:
             int(year), int(month), int(day), int(hour), int(minute), int(second)
         )
 
-    def get_dir(self, num, path=None):
-        # List all directories in the home directory
+    def get_dirs(self, path=None):
+        """
+        Lists all observatory directories in the home directory.
+
+        Args:
+            path (str): The home directory to use, optional.
+
+        Returns:
+            list: Sorted names of the observatory directories.
+
+        """
         if path is not None:
             self.home_dir = path
 
@@ -71,6 +80,11 @@ class FolderComparator:
         ]
 
         dirs.sort()
+        return dirs
+
+    def get_dir(self, num, path=None):
+        # List all directories in the home directory
+        dirs = self.get_dirs(path)
 
         if num > len(dirs):
             raise ValueError(f"At least {num} directories are required. Only {len(dirs)} found.")
@@ -205,6 +219,60 @@ class FolderComparator:
         )
         return folders
 
+    def find_matching_observations(self, folders=None):
+        """
+        Finds meteors observed from any number of observatories. Meteor folders
+        of the first observatory are matched with the folders of all others.
+
+        Args:
+            folders (list): Names of the observatory directories, all directories
+            in the home directory are used if not set.
+
+        Returns:
+            list: For each meteor a list with one entry per observatory, either a tuple
+            (path, data file exists, date, time) or None if not observed there.
+        """
+        if folders is None:
+            folders = self.get_dirs()
+
+        if len(folders) < 2:
+            raise ValueError(f"At least 2 directories are required. Only {len(folders)} found.")
+
+        def describe(path, folder):
+            date = self.parse_folder_name(folder)
+            return (
+                os.path.join(path, folder),
+                os.path.exists(os.path.join(path, folder, "data.txt")),
+                date.strftime("%d.%m.%Y"),
+                date.strftime("%H:%M:%S"),
+            )
+
+        subfolders = []
+        for folder in folders:
+            path = os.path.join(self.home_dir, folder)
+            subfolders.append(
+                (path, [f for f in os.listdir(path) if os.path.isdir(os.path.join(path, f))])
+            )
+
+        observations = []
+        first_path, first_folders = subfolders[0]
+        for meteor in first_folders:
+            observation = [describe(first_path, meteor)]
+
+            for path, others in subfolders[1:]:
+                match = next(
+                    (f for f in others if self.compare_folders(meteor, f) is not None),
+                    None,
+                )
+                observation.append(describe(path, match) if match is not None else None)
+
+            logging.info(f"Meteor {meteor} observed from {sum(o is not None for o in observation)} observatories")
+            observations.append(observation)
+
+        # Sort the observations by date and time
+        observations.sort(key=lambda x: (x[0][2], x[0][3]))
+        return observations
+
 
 if __name__ == "__main__":
     comparator = FolderComparator()
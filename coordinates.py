@@ -3,59 +3,114 @@ from astropy.io import fits
 from astropy.coordinates import SkyCoord, AltAz, EarthLocation
 from astropy.time import Time
 import astropy.units as u
+import numpy
 
 from main import AstrometryClient
 import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from time import sleep
-from modules import ConfigLoader
+from modules import ConfigLoader, load_observation
 
 from station import Station
+from store import get_wcs_store
+
+# Altitudes closer to the horizon than this (in degrees) are recalculated
+# with the full astropy transform instead of the sidereal time approximation
+HORIZON_TOLERANCE = 1.0
+
+# WGS84 ellipsoid, the default used by astropy's EarthLocation
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+WGS84_EP2 = WGS84_E2 / (1 - WGS84_E2)
+
+# Largest number of parsed WCS files kept in memory
+WCS_CACHE_SIZE = 32
+
+# Parsed WCS files by path, modification time and size, least recently
+# used first
+wcs_cache = OrderedDict()
+wcs_cache_lock = threading.Lock()
+
+def load_wcs(path: str) -> wcs.WCS:
+    """Loads a WCS file. Parsed files are cached by their path and
+    modification time, so a changed file is parsed again, and the least
+    recently used ones are evicted beyond WCS_CACHE_SIZE files.
 
-def pixels_to_world(path: str, meteor: list[list[float]]) -> list[list[float]]:
-    """Convert pixel data to RA and Dec
-    
     Args:
         path (str): WCS file path
-        meteor (list[list[float]]): Meteor path in pixel coordinates
 
     Returns:
-        list[list[float]]: Meteor path in RA and Dec coordinates
+        wcs.WCS: the parsed WCS, shared by all callers
     """
 
-    # Load WCS from file
-    hdulist = fits.open(path)
-    w = wcs.WCS(hdulist[0].header)
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+
+    with wcs_cache_lock:
+        w = wcs_cache.get(key)
+        if w is not None:
+            wcs_cache.move_to_end(key)
+            return w
+
+    with fits.open(path) as hdulist:
+        w = wcs.WCS(hdulist[0].header)
+
+    # Prepare the transformation now, so that threads sharing it only read
+    w.wcs.set()
 
-    # Convert pixel coordinates to world coordinates
-    world = []
-    for point in meteor:
-        skyCoord = w.pixel_to_world(point[0], point[1])
-        world.append([skyCoord.ra.degree,skyCoord.dec.degree])
+    with wcs_cache_lock:
+        for stale in [cached for cached in wcs_cache if cached[0] == path]:
+            del wcs_cache[stale]
 
-    return world
+        wcs_cache[key] = w
+        while len(wcs_cache) > WCS_CACHE_SIZE:
+            wcs_cache.popitem(last=False)
 
-def world_to_pixel(path: str, meteor: list[list[float]]):
-    """Convert RA and Dec to pixel coordinates
+    return w
+
+def pixels_to_world(path: str, pixels: numpy.ndarray) -> numpy.ndarray:
+    """Convert pixel data to RA and Dec, all points in one call
     
     Args:
         path (str): WCS file path
-        meteor (list[list[float]]): Meteor path in RA and Dec
+        pixels (numpy.ndarray): Pixel coordinates x and y, e.g. a meteor
+        path or many meteors concatenated, shape (..., 2)
 
     Returns:
-        list[list[float]]: Meteor path in pixel coordinates
+        numpy.ndarray: RA and Dec in decimal degrees, shape (..., 2)
     """
 
     # Load WCS from file
-    hdulist = fits.open(path)
-    w = wcs.WCS(hdulist[0].header)
+    w = load_wcs(path)
+
+    pixels = numpy.asarray(pixels, dtype=float)
+    return w.all_pix2world(pixels.reshape(-1, 2), 0).reshape(pixels.shape)
+
+def world_to_pixel(path: str, world: numpy.ndarray) -> numpy.ndarray:
+    """Convert RA and Dec to pixel coordinates, all points in one call, e.g.
+    to project a star catalogue onto an image
+    
+    Args:
+        path (str): WCS file path
+        world (numpy.ndarray): RA and Dec in decimal degrees, shape (..., 2)
+
+    Returns:
+        numpy.ndarray: Pixel coordinates x and y, shape (..., 2)
+    """
 
-    pixels = []
-    for point in meteor:
-        skyCoord = SkyCoord(ra=point[0], dec=point[1], unit='deg', frame='fk5')
-        pixels.append(w.world_to_pixel(skyCoord))
+    # Load WCS from file
+    w = load_wcs(path)
 
-    return pixels
+    world = numpy.asarray(world, dtype=float)
+    return w.all_world2pix(world.reshape(-1, 2), 0).reshape(world.shape)
 
 def world_to_altaz(ra: float, dec: float, station: Station, time: Time) -> list[float]:
     """Converts RA and Dec to Alt and Az.
@@ -76,6 +131,113 @@ def world_to_altaz(ra: float, dec: float, station: Station, time: Time) -> list[
     altaz = skyCoord.transform_to(AltAz(obstime=time, location=observatory))
     return altaz.alt.degree, altaz.az.degree
 
+def world_to_altaz_array(ra: numpy.ndarray, dec: numpy.ndarray,
+                         stations: list[Station], times: Time) -> list[numpy.ndarray]:
+    """Converts arrays of RA and Dec to Alt and Az in a single transform,
+    each object observed from its own station and time
+    
+    Args:
+        ra (numpy.ndarray): Right ascensions in decimal degrees
+        dec (numpy.ndarray): Declinations in decimal degrees
+        stations (list[Station]): Observing station of each object
+        times (Time): Observation time of each object
+
+    Returns:
+        list[numpy.ndarray]: Altitudes and azimuths of the objects
+    """
+
+    skyCoord = SkyCoord(ra=ra, dec=dec, unit='deg', frame='fk5')
+    times = Time(times) - u.hour * numpy.array([s.time_zone for s in stations])
+    observatories = EarthLocation(lat=[s.lat for s in stations] * u.deg,
+                                  lon=[s.lon for s in stations] * u.deg,
+                                  height=[s.height for s in stations] * u.m)
+
+    altaz = skyCoord.transform_to(AltAz(obstime=times, location=observatories))
+    return altaz.alt.degree, altaz.az.degree
+
+def hour_angle_altitude(ra: numpy.ndarray, dec: numpy.ndarray,
+                        lat: numpy.ndarray, lst: numpy.ndarray) -> numpy.ndarray:
+    """Calculates the altitude of objects from their hour angle, ignoring
+    precession, nutation, aberration and refraction
+
+    Args:
+        ra (numpy.ndarray): Right ascension in decimal degrees
+        dec (numpy.ndarray): Declination in decimal degrees
+        lat (numpy.ndarray): Latitude of the observer in decimal degrees
+        lst (numpy.ndarray): Local sidereal time in decimal degrees
+
+    Returns:
+        numpy.ndarray: Altitude in decimal degrees
+    """
+
+    dec, lat = numpy.radians(dec), numpy.radians(lat)
+    hour_angle = numpy.radians(numpy.asarray(lst) - numpy.asarray(ra))
+
+    sin_alt = numpy.sin(lat) * numpy.sin(dec) \
+              + numpy.cos(lat) * numpy.cos(dec) * numpy.cos(hour_angle)
+    return numpy.degrees(numpy.arcsin(numpy.clip(sin_alt, -1, 1)))
+
+def world_to_altitude(ra: float, dec: float, station: Station, time: Time,
+                      tolerance: float = HORIZON_TOLERANCE) -> float:
+    """Calculates the altitude of an object from the station's cached local
+    sidereal time. Near the horizon the full astropy transform is used.
+    
+    Args:
+        ra (float): Right ascension
+        dec (float): Declination
+        station (Station): Information about the station
+        time (Time): Time of the observation
+        tolerance (float): Width of the band around the horizon in degrees,
+        in which world_to_altaz is used instead
+
+    Returns:
+        float: Altitude of the object
+    """
+
+    alt = float(hour_angle_altitude(ra, dec, station.lat, station.get_lst(time)))
+
+    if abs(alt) < tolerance:
+        alt = world_to_altaz(ra, dec, station, time)[0]
+
+    return alt
+
+def world_to_altitude_array(ra: numpy.ndarray, dec: numpy.ndarray,
+                            stations: list[Station], times: Time,
+                            tolerance: float = HORIZON_TOLERANCE) -> numpy.ndarray:
+    """Calculates altitudes of objects, each observed from its own station
+    and time, from the local sidereal time. Objects near the horizon are
+    recalculated with the full astropy transform.
+    
+    Args:
+        ra (numpy.ndarray): Right ascensions in decimal degrees
+        dec (numpy.ndarray): Declinations in decimal degrees
+        stations (list[Station]): Observing station of each object
+        times (Time): Observation time of each object
+        tolerance (float): Width of the band around the horizon in degrees,
+        in which world_to_altaz_array is used instead
+
+    Returns:
+        numpy.ndarray: Altitudes of the objects
+    """
+
+    ra = numpy.asarray(ra, dtype=float)
+    dec = numpy.asarray(dec, dtype=float)
+    times = Time(times)
+
+    # Local sidereal times of all objects in a single call
+    utc = times - u.hour * numpy.array([s.time_zone for s in stations])
+    lst = utc.sidereal_time('mean', longitude=[s.lon for s in stations] * u.deg)
+    alt = hour_angle_altitude(ra, dec, [s.lat for s in stations], lst.degree)
+
+    near = numpy.abs(alt) < tolerance
+    if numpy.any(near):
+        indices = numpy.flatnonzero(near)
+        alt[near] = world_to_altaz_array(ra[near], dec[near],
+                                         [stations[i] for i in indices],
+                                         times[near])[0]
+
+    return alt
+
 def altaz_to_world(alt: float, az: float, station: Station, time: Time) -> list[float]:
     """Converts Alt and Az to RA and Dec
     
@@ -96,17 +258,18 @@ def altaz_to_world(alt: float, az: float, station: Station, time: Time) -> list[
     return sky_coord.ra.degree, sky_coord.dec.degree
 
 def geocentric_to_geodetic(location: list[float]) -> list[float]:
-    """Converts the vector X, Y, Z to latitude, longitude and height
+    """Converts the vector X, Y, Z to longitude, latitude and height
     
     Args:
         location (list[float]): Values X, Y and Z
 
     Returns:
-        list[float]: latitude, longitude and height values
+        list[float]: longitude, latitude and height values
     """
 
     X, Y, Z = location
-    return [x.value for x in EarthLocation.from_geocentric(X, Y, Z, u.m).geodetic]
+    lat, lon, height = geocentric_to_geodetic_array(X, Y, Z)
+    return [float(lon), float(lat), float(height)]
 
 def geodetic_to_geocentric(location: dict) -> list[float]:
     """Calculates geocentric vector (X, Y, Z) according to equations 7 and 8
@@ -118,68 +281,176 @@ def geodetic_to_geocentric(location: dict) -> list[float]:
         list[float]: vector (X, Y, Z)
     """
 
-    return tuple([x.value for x in EarthLocation.from_geodetic(location['lon'], location['lat'], location['height']).geocentric])
+    X, Y, Z = geodetic_to_geocentric_array(location['lat'],
+                                           location['lon'],
+                                           location['height'])
+    return float(X), float(Y), float(Z)
+
+def geocentric_to_geodetic_array(X: numpy.ndarray,
+                                 Y: numpy.ndarray,
+                                 Z: numpy.ndarray) -> list[numpy.ndarray]:
+    """Converts arrays of geocentric X, Y, Z values on the WGS84 ellipsoid
+    to latitude, longitude and height using Bowring's method with two
+    refining iterations, accurate well below a millimetre for points from
+    the ground up to several thousand kilometres
+
+    Args:
+        X (numpy.ndarray): X coordinates in metres
+        Y (numpy.ndarray): Y coordinates in metres
+        Z (numpy.ndarray): Z coordinates in metres
+
+    Returns:
+        list[numpy.ndarray]: latitude and longitude in decimal degrees and
+        height in metres
+    """
+
+    X = numpy.asarray(X, dtype=float)
+    Y = numpy.asarray(Y, dtype=float)
+    Z = numpy.asarray(Z, dtype=float)
 
-def load_meteors(path: str) -> list[list[list[float]]]:
+    p = numpy.hypot(X, Y)
+    lon = numpy.arctan2(Y, X)
+
+    # Bowring's initial guess through the parametric latitude
+    beta = numpy.arctan2(Z * WGS84_A, p * WGS84_B)
+    for _ in range(2):
+        lat = numpy.arctan2(Z + WGS84_EP2 * WGS84_B * numpy.sin(beta) ** 3,
+                            p - WGS84_E2 * WGS84_A * numpy.cos(beta) ** 3)
+        beta = numpy.arctan2((1 - WGS84_F) * numpy.sin(lat), numpy.cos(lat))
+
+    # Height from the prime vertical radius of curvature
+    sin_lat, cos_lat = numpy.sin(lat), numpy.cos(lat)
+    N = WGS84_A / numpy.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    height = p * cos_lat + Z * sin_lat - WGS84_A ** 2 / N
+
+    return numpy.degrees(lat), numpy.degrees(lon), height
+
+def geodetic_to_geocentric_array(lat: numpy.ndarray,
+                                 lon: numpy.ndarray,
+                                 height: numpy.ndarray) -> list[numpy.ndarray]:
+    """Converts arrays of latitude, longitude and height on the WGS84
+    ellipsoid to geocentric X, Y, Z values
+
+    Args:
+        lat (numpy.ndarray): latitude in decimal degrees
+        lon (numpy.ndarray): longitude in decimal degrees
+        height (numpy.ndarray): height in metres
+
+    Returns:
+        list[numpy.ndarray]: X, Y and Z coordinates in metres
+    """
+
+    lat = numpy.radians(numpy.asarray(lat, dtype=float))
+    lon = numpy.radians(numpy.asarray(lon, dtype=float))
+    height = numpy.asarray(height, dtype=float)
+
+    sin_lat, cos_lat = numpy.sin(lat), numpy.cos(lat)
+    N = WGS84_A / numpy.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+
+    X = (N + height) * cos_lat * numpy.cos(lon)
+    Y = (N + height) * cos_lat * numpy.sin(lon)
+    Z = (N * (1 - WGS84_E2) + height) * sin_lat
+
+    return X, Y, Z
+
+def load_meteors(path: str) -> tuple[list[numpy.ndarray], list[numpy.ndarray]]:
     """Load meteor data from data file
     
     Args:
         path (str): data.txt file path
 
     Returns:
-        list[list[list[float]]]: List of meteor paths
+        list[numpy.ndarray]: Meteor paths in pixels, shape (N, 2), empty for
+        meteors of a single frame
+        list[numpy.ndarray]: Seconds of each point of the paths
     """
 
-    file = open(path, 'r').read().split('\n')
-
-    # Cut off file and star data
-    stars = int(file[8][16:])
-    file = file[9+stars:]
-
-    # Loop through meteors
     meteory = []
     casy = []
-    for _ in range(int(file[0][18:])):
-        # Cut off file
-        file = file[1:]
+    for meteor in load_observation(path).tracks:
+        # Meteors of a single frame have no path without the first frame
+        if len(meteor) < 2:
+            meteory.append(numpy.empty((0, 2)))
+            casy.append(numpy.empty(0))
+            continue
+
+        # The first detected frame is not used, its duration is spread over
+        # the remaining frames
+        duration = meteor['t'][-1]
+        meteor = meteor[1:]
+        count = abs(meteor['frame'][-1] - meteor['frame'][0])
+
+        meteory.append(numpy.column_stack((meteor['x'], meteor['y'])))
+        casy.append((meteor['frame'] - meteor['frame'][0]) * (duration / count) if count
+                    else numpy.zeros(len(meteor)))
 
-        # Load meteor start and end time
-        data = file[0].split(' ')
+    return meteory, casy
 
-        start = float(data[-4][:-1])
-        end = float(data[-2][:-1])
+@lru_cache(maxsize=8)
+def _sky_mask(height: int, width: int) -> numpy.ndarray:
+    """Returns the read-only grayscale mask of the sky view of images of a
+    size, the circle in the middle of the image"""
 
-        duration = end - start
+    import cv2
 
-        # Cut off file
-        file = file[1:]
-        
-        # Loop through meteor positions
-        pixels = []
-        frames = []
-        j = 1
-        while file[j].startswith(' frame'):
-            data = file[j].split(' ')
-            frames.append(int(data[3]))
-            pixels.append([float(data[6]), float(data[11])])
-            j += 1
-
-        # Convert frames to time
-        first = frames[0]
-        count = abs(frames[-1] - frames[0])
-        
-        for i in range(len(frames)):
-            frames[i] = (frames[i] - first) * (duration / count)
+    mask = numpy.zeros((height, width), dtype=numpy.uint8)
+    mask = cv2.circle(mask, (width // 2, height // 2), height // 2, 255, -1)
 
-        meteory.append(pixels)
-        casy.append(frames)
-        file = file[j:]
+    mask.flags.writeable = False
+    return mask
 
-    return meteory, casy
+def preprocess_image(img_path: str, data_path: str) -> bytes:
+    """Image preprocessing for astrometry. Masks out space around sky view
+    and all meteors of the data.txt file and encodes the grayscale result
+    in memory, so that it can be uploaded without a temporary file
+
+    Args:
+        img_path (str): The path to the image to mask
+        data_path (str): The path to data.txt file describing meteor, only
+        the space around sky view is masked if not set
+
+    Returns:
+        bytes: the masked image as JPEG
+    """
+
+    import cv2
+
+    image = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise FileNotFoundError(f"Image {img_path} not found")
+
+    mask = _sky_mask(*image.shape).copy()
+    tracks = load_observation(data_path).tracks if data_path is not None else []
+    for track in tracks:
+        for x, y in zip(track['x'].astype(int), track['y'].astype(int)):
+            cv2.circle(mask, (int(x), int(y)), 3, 0, -1)
+
+    success, buffer = cv2.imencode('.jpg', cv2.bitwise_and(image, mask))
+    if not success:
+        raise ValueError(f"Image {img_path} could not be encoded")
+
+    return buffer.tobytes()
+
+def preprocess_images(paths: list[tuple[str, str]], threads: int = None) -> list[bytes]:
+    """Preprocesses many images at once, e.g. a whole night, see
+    preprocess_image(). OpenCV releases the GIL while decoding and encoding,
+    so the images are processed by threads sharing the cached masks.
+
+    Args:
+        paths (list[tuple[str, str]]): Pairs of image and data.txt paths
+        threads (int): Number of threads, by default as many as
+        ThreadPoolExecutor uses
+
+    Returns:
+        list[bytes]: the masked images as JPEG, in the order of paths
+    """
+
+    with ThreadPoolExecutor(threads, thread_name_prefix='preprocess') as executor:
+        return list(executor.map(lambda pair: preprocess_image(*pair), paths))
 
 def preprocess(img_path: str, data_path: str, tmp_path: str) -> None:
-    """Image preprocessing for astrometry. Masks out space around sky view
-    and meteor
+    """Image preprocessing for astrometry into a file, see
+    preprocess_image()
     
     Args:
         img_path (str): The path to the image to mask
@@ -190,70 +461,160 @@ def preprocess(img_path: str, data_path: str, tmp_path: str) -> None:
         None
     """
 
-    import cv2, numpy
-
-    image = cv2.imread(img_path)
-
-    mask = numpy.zeros(image.shape, dtype=numpy.uint8)
-    mask = cv2.circle(mask, (image.shape[1] // 2, image.shape[0] // 2), image.shape[0] // 2, (255, 255, 255), -1)
-
-    meteor = load_meteors(data_path)
-    for point in meteor[0][0]:
-        mask = cv2.circle(mask, (int(point[0]), int(point[1])), 3, (0, 0, 0), -1)
+    with open(tmp_path, 'wb') as file:
+        file.write(preprocess_image(img_path, data_path))
 
-    cv2.imwrite(tmp_path, cv2.bitwise_and(mask, image))
-
-def download_wcs_file(client: AstrometryClient, img_path: str, wcs_path: str = 'calibration.wcs') -> bool:
-    """Try to get astrometry from an image from nova.astrometry.net
+def download_wcs_file(client: AstrometryClient, img_path: str, wcs_path: str = None,
+                      image: bytes = None) -> bool:
+    """Try to get astrometry from an image from nova.astrometry.net. Images
+    solved before and downloaded WCS files are looked up in the WCS store
+    first, see store.WcsStore.
     
     Args:
         img_path (str): Image to use for astrometry
+        wcs_path (str): Path, where a copy of the WCS file should be saved,
+        optional, the file is always kept in the WCS store
+        image (bytes): Contents of the image to upload instead of the file,
+        e.g. from preprocess_image()
 
     Returns:
         int: job_id of the astrometry, None if unsuccessful
     """
 
-    submission_id = client.upload_image(img_path)
+    if image is None:
+        with open(img_path, 'rb') as file:
+            image = file.read()
+
+    store = get_wcs_store()
+    digest = store.image_digest(image)
+    job_id = store.find(digest)
 
-    if not submission_id:
-        logging.error("Image upload failed.")
-        return
+    if job_id is None:
+        submission_id = client.upload_image(img_path, image)
 
-    logging.info("Submission ID: %s", submission_id)
+        if not submission_id:
+            logging.error("Image upload failed.")
+            return
 
-    job_id = None
-    timeout = ConfigLoader().get_value_from_data("timeout")
-    for i in range(10):
-        status = client.is_job_done(submission_id)
-        if status != False:
-            job_id = status[0][0]
-            break
-        sleep(timeout)
+        logging.info("Submission ID: %s", submission_id)
 
-        if i == 9:
-            # Astrometry timed out, return False
-            logging.error(f"Job status not successful after {10*timeout} seconds. Aborting...")
-            return None
+        timeout = ConfigLoader().get_value_from_data("timeout")
+        for i in range(10):
+            status = client.is_job_done(submission_id)
+            if status != False:
+                job_id = status[0][0]
+                break
+            sleep(timeout)
 
-    # Download the resulting WCS file
-    client.get_wcs_file(job_id, wcs_path)
+            if i == 9:
+                # Astrometry timed out, return False
+                logging.error(f"Job status not successful after {10*timeout} seconds. Aborting...")
+                return None
+
+        store.remember(digest, job_id)
+    else:
+        logging.info(f"Image {img_path} was already solved, Job_ID: {job_id}")
+
+    # Download the resulting WCS file, unless it is stored
+    if store.get(client, job_id, wcs_path) is None:
+        return None
 
     return job_id
 
-def get_meteor_coordinates_fixed(data_path: str, station: Station, time: Time) -> list[list[float]]:
+# Alt-az directions above the horizon to which the rotation of the sky
+# seen by a fixed camera is fitted, in decimal degrees
+ROTATION_ALTITUDES = (10, 30, 50, 70, 90)
+ROTATION_AZIMUTHS = tuple(range(0, 360, 30))
+
+def get_sky_rotation(station: Station, wcs_time: Time, time: Time) -> numpy.ndarray:
+    """Calculates the rotation which moves RA and Dec seen in a fixed
+    direction at wcs_time to those seen in the same direction at time. It
+    is the least-squares rotation between directions over the whole sky
+    transformed by astropy at both times, so Earth rotation, precession and
+    nutation are included. Aberration and refraction differences, which are
+    not rotations, are left out, they stay below a few arcseconds.
+
+    Args:
+        station (Station): Station of the camera
+        wcs_time (Time): Time of the camera alignment
+        time (Time): Time of the observation
+
+    Returns:
+        numpy.ndarray: read-only rotation matrix acting on unit vectors,
+        shape (3, 3)
+    """
+
+    wcs_time, time = Time(wcs_time), Time(time)
+    return _sky_rotation(station.lat, station.lon, station.height, station.time_zone,
+                         wcs_time.scale, wcs_time.jd1, wcs_time.jd2,
+                         time.scale, time.jd1, time.jd2)
+
+@lru_cache(maxsize=256)
+def _sky_rotation(lat, lon, height, time_zone, wcs_scale, wcs_jd1, wcs_jd2, scale, jd1, jd2) -> numpy.ndarray:
+    station = Station(lat=lat, lon=lon, height=height, time_zone=time_zone)
+    alt, az = numpy.meshgrid(ROTATION_ALTITUDES, ROTATION_AZIMUTHS)
+
+    # The same directions on the sky at both times
+    before = altaz_to_world(alt.ravel(), az.ravel(), station,
+                            Time(wcs_jd1, wcs_jd2, format='jd', scale=wcs_scale))
+    after = altaz_to_world(alt.ravel(), az.ravel(), station,
+                           Time(jd1, jd2, format='jd', scale=scale))
+
+    # Kabsch algorithm for the best rotation between the two sets of vectors
+    before, after = radec_to_vectors(*before), radec_to_vectors(*after)
+    U, _, Vt = numpy.linalg.svd(after.T @ before)
+    sign = numpy.sign(numpy.linalg.det(U @ Vt))
+    rotation = U @ numpy.diag([1, 1, sign]) @ Vt
+
+    rotation.flags.writeable = False
+    return rotation
+
+def radec_to_vectors(ra: numpy.ndarray, dec: numpy.ndarray) -> numpy.ndarray:
+    """Converts RA and Dec to unit vectors
+
+    Args:
+        ra (numpy.ndarray): Right ascensions in decimal degrees
+        dec (numpy.ndarray): Declinations in decimal degrees
+
+    Returns:
+        numpy.ndarray: unit vectors, shape (N, 3)
+    """
+
+    ra, dec = numpy.radians(ra), numpy.radians(dec)
+    return numpy.column_stack((numpy.cos(dec) * numpy.cos(ra),
+                               numpy.cos(dec) * numpy.sin(ra),
+                               numpy.sin(dec)))
+
+def get_meteor_coordinates_fixed(data_path: str, station: Station, time: Time,
+                                 exact: bool = False) -> list[list[float]]:
+    """Calculates the meteor path in RA and Dec from the fixed camera
+    alignment of a station. The sky of the alignment is turned to the time
+    of the meteor by one rotation matrix, see get_sky_rotation().
+
+    Args:
+        data_path (str): Observation data.txt path
+        station (Station): Station with the saved WCS
+        time (Time): Time of the observation
+        exact (bool): Whether to transform every point through astropy alt-az
+        frames instead, including aberration
+
+    Returns:
+        list[list[float]]: Meteor path in RA and Dec and seconds
+    """
+
     meteors, times = load_meteors(data_path)
-    world = pixels_to_world(station.wcs_path, meteors[0])
-        
-    for i in range(len(world)):
-        ra, dec = world[i]
+    ra, dec = pixels_to_world(station.wcs_path, meteors[0]).T
+
+    if exact:
         alt, az = world_to_altaz(ra, dec, station, station.wcs_time)
-        world[i] = altaz_to_world(alt, az, station, time)
+        ra, dec = altaz_to_world(alt, az, station, time)
+    else:
+        vectors = radec_to_vectors(ra, dec) @ get_sky_rotation(station, station.wcs_time, time).T
+        ra = numpy.degrees(numpy.arctan2(vectors[:, 1], vectors[:, 0])) % 360
+        dec = numpy.degrees(numpy.arcsin(numpy.clip(vectors[:, 2], -1, 1)))
 
     # Merge coordinate and time data
-    for i in range(len(world)):
-        world[i] = list(world[i]) + [times[0][i]]
-
-    return world
+    return numpy.column_stack((ra, dec, times[0])).tolist()
 
 def get_meteor_coordinates(client: AstrometryClient,
                            img_path: str,
@@ -278,33 +639,34 @@ def get_meteor_coordinates(client: AstrometryClient,
         list[list[float]]: Meteor path in RA and Dec and seconds
     """
     world, times = None, None
+    wcs_path = None
+
     # Check, if images have astrometry
     if job_id == None:
         # If no, try doing astrometry on the image
 
-        # Preprocess the image
-        if prep:
-            preprocess(img_path, data_path, 'tmp.jpg')
-            img_path = 'tmp.jpg'
+        # Preprocess the image in memory
+        image = preprocess_image(img_path, data_path) if prep else None
         
         try:
-            job_id = download_wcs_file(client, img_path)
+            job_id = download_wcs_file(client, img_path, image=image)
         except:
             print('Astrometry unsuccessful, defaulting to fixed astrometry')
-    else:
-        # If yes, download the WCS file
-        client.get_wcs_file(job_id, 'calibration.wcs')
-    
+
     if job_id:
+        # Get the WCS file from the store, downloading it if needed
+        wcs_path = get_wcs_store().get(client, job_id)
+
+    if wcs_path:
         # Astrometry successful, use it to calculate meteor coordinates
         meteors, times = load_meteors(data_path)
-        world = pixels_to_world('calibration.wcs', meteors[0])
+        world = pixels_to_world(wcs_path, meteors[0])
 
         # Merge coordinate and time data
-        for i in range(len(world)):
-            world[i] = list(world[i]) + [times[0][i]]
+        world = numpy.column_stack((world, times[0])).tolist()
     else:
         # Astrometry unsuccessful, use the saved WCS to calculate
+        job_id = None
         world = get_meteor_coordinates_fixed(data_path, station, time)
 
     return job_id, world
@@ -0,0 +1,258 @@
+import threading
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, ThreadPoolExecutor
+
+from astropy.time import Time
+
+from coordinates import get_meteor_coordinates
+from station import Station
+
+def _calculate(meteor, names: tuple):
+    """Calculates computed attributes of a meteor in a worker process and
+    returns the meteor with their values"""
+
+    for name in names:
+        getattr(meteor, name)
+
+    return meteor
+
+class MeteorExecutor:
+    """Long-lived pools running the stages of many meteors concurrently.
+    Astrometry, which mostly waits for the network, runs in threads sharing
+    one authenticated client, CPU-bound calculations run in processes. The
+    pools are created once and reused, so no process is started per meteor.
+
+    Args:
+        threads (int): Number of astrometry threads
+        processes (int): Number of calculation processes, all cores by
+        default
+
+    Usage:
+        ```python
+        with MeteorExecutor() as executor:
+            futures = [Meteor.submit_astrometry(label, stations, img_paths, data_paths, time, executor=executor)
+                       for label, img_paths, data_paths, time in night]
+            meteors = [future.result(timeout=600) for future in futures]```
+    """
+
+    threads: ThreadPoolExecutor
+    processes: int
+
+    def __init__(self, threads: int = 16, processes: int = None) -> None:
+        self.threads = ThreadPoolExecutor(threads, thread_name_prefix='astrometry')
+        self.processes = processes
+
+        self._process_pool = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'MeteorExecutor':
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.shutdown()
+
+    @property
+    def client(self):
+        """AstrometryClient: client shared by all threads, authenticated on
+        first use"""
+
+        with self._lock:
+            if self._client is None:
+                from astrometry import AstrometryClient
+                client = AstrometryClient()
+                client.authenticate()
+                self._client = client
+
+            return self._client
+
+    def submit_astrometry(self, img_path: str, data_path: str, station: Station, time: Time,
+                          job_id: int = None, prep: bool = False) -> Future:
+        """Starts the astrometry of one station's observation
+
+        Args:
+            img_path (str): Image to use for astrometry
+            data_path (str): Observation data.txt path
+            station (Station): Station to use for backup astrometry
+            time (Time): Time to use for fixed camera alignment
+            job_id (int): job_id to use if astrometry was already calculated
+            prep (bool): whether to preprocess the image
+
+        Returns:
+            Future: future of the job_id and the meteor path, see
+            get_meteor_coordinates()
+        """
+
+        return self.threads.submit(
+            lambda: get_meteor_coordinates(self.client, img_path, data_path, station, time, job_id, prep)
+        )
+
+    def submit_calculation(self, meteor, names: tuple = ('radiant', 'trajectory', 'velocities')) -> Future:
+        """Calculates results of a meteor in a worker process
+
+        Args:
+            meteor (Meteor): Meteor to calculate
+            names (tuple[str]): Computed attributes to calculate
+
+        Returns:
+            Future: future of a copy of the meteor holding the results
+        """
+
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(self.processes)
+
+        return self._process_pool.submit(_calculate, meteor, tuple(names))
+
+    @staticmethod
+    def gather(futures: list[Future], combine=None) -> Future:
+        """Combines futures into one without blocking any thread. The first
+        failure is propagated and cancels the remaining futures, cancelling
+        the combined future cancels all of them.
+
+        Args:
+            futures (list[Future]): Futures to combine
+            combine (callable): Called with the list of results, its return
+            value is the result of the combined future
+
+        Returns:
+            Future: future of the combined results
+        """
+
+        combined = Future()
+        results = [None] * len(futures)
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def cancel_all(_):
+            if combined.cancelled():
+                for future in futures:
+                    future.cancel()
+
+        def finish(index, future):
+            if combined.done():
+                return
+
+            try:
+                results[index] = future.result()
+            except BaseException as e:
+                try:
+                    combined.set_exception(e)
+                except InvalidStateError:
+                    pass
+                for other in futures:
+                    other.cancel()
+                return
+
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+
+            try:
+                combined.set_result(combine(results) if combine is not None else results)
+            except InvalidStateError:
+                pass
+            except BaseException as e:
+                try:
+                    combined.set_exception(e)
+                except InvalidStateError:
+                    pass
+
+        combined.add_done_callback(cancel_all)
+        if not futures:
+            combined.set_result(combine([]) if combine is not None else [])
+        for index, future in enumerate(futures):
+            future.add_done_callback(lambda future, index=index: finish(index, future))
+
+        return combined
+
+    @staticmethod
+    def then(future: Future, function) -> Future:
+        """Chains a function onto a future without blocking any thread. The
+        function is called with the finished future, if it returns a future,
+        the chained future follows it. Cancelling the chained future cancels
+        both.
+
+        Args:
+            future (Future): Future to chain onto
+            function (callable): Called with the finished future, its return
+            value is the result of the chained future
+
+        Returns:
+            Future: future of the function's result
+        """
+
+        chained = Future()
+        following = []
+
+        def cancel_all(_):
+            if chained.cancelled():
+                for other in [future] + following:
+                    other.cancel()
+
+        def settle(result):
+            try:
+                chained.set_result(result.result() if isinstance(result, Future) else result)
+            except InvalidStateError:
+                pass
+            except BaseException as e:
+                try:
+                    chained.set_exception(e)
+                except InvalidStateError:
+                    pass
+
+        def finish(future):
+            if chained.done():
+                return
+
+            try:
+                result = function(future)
+            except BaseException as e:
+                try:
+                    chained.set_exception(e)
+                except InvalidStateError:
+                    pass
+                return
+
+            # Follow a returned future until it finishes
+            if isinstance(result, Future):
+                following.append(result)
+                if chained.cancelled():
+                    result.cancel()
+                result.add_done_callback(settle)
+            else:
+                settle(result)
+
+        chained.add_done_callback(cancel_all)
+        future.add_done_callback(finish)
+
+        return chained
+
+    def shutdown(self, wait: bool = True, cancel: bool = False) -> None:
+        """Stops the pools
+
+        Args:
+            wait (bool): Whether to wait for running tasks
+            cancel (bool): Whether to cancel tasks which have not started
+        """
+
+        self.threads.shutdown(wait, cancel_futures=cancel)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait, cancel_futures=cancel)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> MeteorExecutor:
+    """Returns the shared executor used by Meteor.from_astrometry()
+
+    Returns:
+        MeteorExecutor
+    """
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = MeteorExecutor()
+
+    return _executor
@@ -0,0 +1,185 @@
+import abc
+import itertools
+import logging
+import os
+from xml.sax.saxutils import escape
+
+# Size of the write buffer of exported files in bytes
+BUFFER_SIZE = 1 << 16
+
+GPX_HEADER = '<?xml version="1.0" encoding="UTF-8"?><gpx xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns="http://www.topografix.com/GPX/1/1" xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd http://www.garmin.com/xmlschemas/GpxExtensions/v3 http://www.garmin.com/xmlschemas/GpxExtensionsv3.xsd http://www.garmin.com/xmlschemas/TrackPointExtension/v1 http://www.garmin.com/xmlschemas/TrackPointExtensionv1.xsd http://www.topografix.com/GPX/gpx_style/0/2 http://www.topografix.com/GPX/gpx_style/0/2/gpx_style.xsd" xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1" xmlns:gpxx="http://www.garmin.com/xmlschemas/GpxExtensions/v3" xmlns:gpx_style="http://www.topografix.com/GPX/gpx_style/0/2" version="1.1" creator="https://gpx.studio"><metadata>    <name>Meteory</name>    <author>        <name>gpx.studio</name>        <link href="https://gpx.studio"></link>    </author></metadata>'
+
+KML_HEADER = '<?xml version="1.0" encoding="UTF-8"?><kml xmlns="http://www.opengis.net/kml/2.2"><Document><name>Meteory</name>'
+
+CSV_HEADER = 'label,station,t,lat,lon,height\n'
+
+def normalize_longitude(lon: float) -> float:
+    """Wraps a longitude into [-180, 180) degrees
+
+    Args:
+        lon (float): Longitude in decimal degrees
+
+    Returns:
+        float: wrapped longitude
+    """
+
+    return (lon + 180) % 360 - 180
+
+class TrajectoryWriter(abc.ABC):
+    """Writes meteor trajectories into an open file one meteor at a time
+
+    Args:
+        file: Text file opened for writing
+        stations (list[Station]): Stations written once at the beginning
+        of the file
+    """
+
+    def __init__(self, file, stations: list = ()) -> None:
+        self.file = file
+        self.stations = stations
+
+    def begin(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def write(self, meteor) -> None:
+        """Writes the trajectory of one meteor"""
+
+    def end(self) -> None:
+        pass
+
+class GPXWriter(TrajectoryWriter):
+    """Writes stations as waypoints and each meteor as a track"""
+
+    def begin(self) -> None:
+        self.file.write(GPX_HEADER)
+        self.file.writelines(
+            f'<wpt lat="{station.lat}" lon="{normalize_longitude(station.lon)}"><ele>{station.height}</ele><name>{escape(str(station.label))}</name></wpt>'
+            for station in self.stations
+        )
+
+    def write(self, meteor) -> None:
+        trajectory = meteor.get_trajectory()
+
+        self.file.write(f'<trk><name>Trajectory {escape(str(meteor.label))}</name><trkseg>')
+        self.file.writelines(
+            f'<trkpt lat="{lat}" lon="{normalize_longitude(lon)}"><ele>{height}</ele></trkpt>'
+            for lat, lon, height in zip(trajectory['lat'][trajectory.order].tolist(), trajectory['lon'][trajectory.order].tolist(), trajectory['height'][trajectory.order].tolist())
+        )
+        self.file.write('</trkseg></trk>')
+
+    def end(self) -> None:
+        self.file.write('</gpx>')
+
+class KMLWriter(TrajectoryWriter):
+    """Writes stations as points and each meteor as a line in absolute
+    altitude"""
+
+    def begin(self) -> None:
+        self.file.write(KML_HEADER)
+        self.file.writelines(
+            f'<Placemark><name>{escape(str(station.label))}</name><Point><coordinates>{normalize_longitude(station.lon)},{station.lat},{station.height}</coordinates></Point></Placemark>'
+            for station in self.stations
+        )
+
+    def write(self, meteor) -> None:
+        trajectory = meteor.get_trajectory()
+
+        self.file.write(f'<Placemark><name>Trajectory {escape(str(meteor.label))}</name><LineString><altitudeMode>absolute</altitudeMode><coordinates>')
+        self.file.writelines(
+            f'{normalize_longitude(lon)},{lat},{height} '
+            for lat, lon, height in zip(trajectory['lat'][trajectory.order].tolist(), trajectory['lon'][trajectory.order].tolist(), trajectory['height'][trajectory.order].tolist())
+        )
+        self.file.write('</coordinates></LineString></Placemark>')
+
+    def end(self) -> None:
+        self.file.write('</Document></kml>')
+
+class CSVWriter(TrajectoryWriter):
+    """Writes one row for each point of the merged trajectories"""
+
+    def begin(self) -> None:
+        self.file.write(CSV_HEADER)
+
+    def write(self, meteor) -> None:
+        trajectory = meteor.get_trajectory()
+        labels = [str(station.label) for station in meteor.stations]
+        label = str(meteor.label).replace(',', ' ')
+
+        self.file.writelines(
+            f'{label},{labels[station]},{t},{lat},{normalize_longitude(lon)},{height}\n'
+            for station, t, lat, lon, height in zip(
+                trajectory['station'][trajectory.order].tolist(), trajectory['t'][trajectory.order].tolist(),
+                trajectory['lat'][trajectory.order].tolist(), trajectory['lon'][trajectory.order].tolist(), trajectory['height'][trajectory.order].tolist()
+            )
+        )
+
+WRITERS = {
+    'gpx': GPXWriter,
+    'kml': KMLWriter,
+    'csv': CSVWriter,
+}
+
+def export_trajectories(meteors, path: str, format: str = None,
+                        separate: bool = False, stations: list = None) -> int:
+    """Streams the trajectories of many meteors into GPX, KML or CSV files.
+    Meteors are taken from the iterable one at a time, so a generator keeps
+    only one meteor in memory. Meteors whose trajectory cannot be calculated
+    are skipped.
+
+    Args:
+        meteors (Iterable[Meteor]): Meteors to export
+        path (str): Output file, or output directory if separate is set
+        format (str): 'gpx', 'kml' or 'csv', by default from the extension
+        of path
+        separate (bool): Whether to write each meteor into its own file
+        named after its label, skipped meteors leave no file
+        stations (list[Station]): Stations written into each file, by
+        default those of the first meteor
+
+    Returns:
+        int: number of exported meteors
+    """
+
+    if format is None:
+        format = os.path.splitext(path)[1][1:].lower()
+    if format not in WRITERS:
+        raise ValueError(f"Unknown export format '{format}', use 'gpx', 'kml' or 'csv'.")
+
+    meteors = iter(meteors)
+    first = next(meteors, None)
+    if first is None:
+        return 0
+    meteors = itertools.chain([first], meteors)
+
+    if stations is None:
+        stations = first.stations
+
+    if separate:
+        os.makedirs(path, exist_ok=True)
+        count = 0
+        for meteor in meteors:
+            meteor_path = os.path.join(path, f'{meteor.label}.{format}')
+            exported = export_trajectories([meteor], meteor_path, format, stations=meteor.stations)
+
+            # Skipped meteors leave no file with only the header
+            if not exported:
+                os.remove(meteor_path)
+            count += exported
+        return count
+
+    count = 0
+    with open(path, 'w', encoding='utf-8', buffering=BUFFER_SIZE) as file:
+        writer = WRITERS[format](file, stations)
+        writer.begin()
+
+        for meteor in meteors:
+            try:
+                writer.write(meteor)
+                count += 1
+            except Exception as e:
+                logging.error(f'Error exporting meteor {meteor.label}: {e}')
+
+        writer.end()
+
+    return count
@@ -0,0 +1,192 @@
+import numpy
+
+def calculate_path_lengths(points: numpy.ndarray, tracks: numpy.ndarray) -> numpy.ndarray:
+    """Calculates the cumulative path length along each track from its first
+    point
+
+    Args:
+        points (numpy.ndarray): points X, Y, Z of all tracks one after
+        another, shape (K, 3)
+        tracks (numpy.ndarray): index of the track of each point, shape (K,)
+
+    Returns:
+        numpy.ndarray: path lengths in metres, shape (K,)
+    """
+
+    points = numpy.asarray(points, dtype=float)
+    tracks = numpy.asarray(tracks, dtype=int)
+
+    # Segment lengths, skipping the jumps between tracks
+    segments = numpy.zeros(len(points))
+    segments[1:] = numpy.linalg.norm(numpy.diff(points, axis=0), axis=1)
+    segments[numpy.concatenate(([True], tracks[1:] != tracks[:-1]))] = 0
+
+    lengths = numpy.cumsum(segments)
+    starts = numpy.concatenate(([0], numpy.flatnonzero(tracks[1:] != tracks[:-1]) + 1))
+
+    return lengths - numpy.repeat(lengths[starts], numpy.diff(numpy.append(starts, len(points))))
+
+def _track_times(times: numpy.ndarray, tracks: numpy.ndarray) -> list[numpy.ndarray]:
+    """Shifts the times of each track to start at zero
+
+    Returns:
+        list[numpy.ndarray]: shifted times, shape (K,), and track indices
+        renumbered from zero, shape (K,)
+    """
+
+    times = numpy.asarray(times, dtype=float)
+    _, tracks = numpy.unique(numpy.asarray(tracks, dtype=int), return_inverse=True)
+
+    first = numpy.full(tracks.max() + 1, numpy.inf)
+    numpy.minimum.at(first, tracks, times)
+
+    return times - first[tracks], tracks
+
+def fit_linear_models(lengths: numpy.ndarray,
+                      times: numpy.ndarray,
+                      tracks: numpy.ndarray) -> list[numpy.ndarray]:
+    """Fits the model l(t) = l0 + v t to the path lengths of all tracks at
+    once by linear least squares
+
+    Args:
+        lengths (numpy.ndarray): path lengths in metres, shape (K,)
+        times (numpy.ndarray): times in seconds, shape (K,)
+        tracks (numpy.ndarray): index of the track of each point, shape (K,)
+
+    Returns:
+        list[numpy.ndarray]: parameters l0 and v of each track, shape (T, 2),
+        with the time measured from the first point of the track, and the
+        residuals in metres, shape (K,). Tracks with fewer than two points
+        have NaN parameters and residuals.
+    """
+
+    lengths = numpy.asarray(lengths, dtype=float)
+    times, tracks = _track_times(times, tracks)
+    counts = numpy.bincount(tracks)
+
+    # Closed form solution from the means, variances and covariances
+    t_mean = numpy.bincount(tracks, times) / counts
+    l_mean = numpy.bincount(tracks, lengths) / counts
+    t_centered = times - t_mean[tracks]
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        velocities = numpy.bincount(tracks, t_centered * (lengths - l_mean[tracks])) \
+                     / numpy.bincount(tracks, t_centered ** 2)
+    velocities[counts < 2] = numpy.nan
+    parameters = numpy.column_stack((l_mean - velocities * t_mean, velocities))
+
+    residuals = lengths - parameters[tracks, 0] - parameters[tracks, 1] * times
+
+    return parameters, residuals
+
+def fit_deceleration_models(lengths: numpy.ndarray,
+                            times: numpy.ndarray,
+                            tracks: numpy.ndarray) -> list[numpy.ndarray]:
+    """Fits the exponential deceleration model of Whipple and Jacchia,
+    l(t) = l0 + v t - a1 exp(a2 t), to the path lengths of all tracks in
+    one batch. For a fixed a2 the model is linear, so l0, v and a1 are
+    solved in closed form and only a2 of each track is searched, by a grid
+    and golden section search run for all tracks at once.
+
+    Args:
+        lengths (numpy.ndarray): path lengths in metres, shape (K,)
+        times (numpy.ndarray): times in seconds, shape (K,)
+        tracks (numpy.ndarray): index of the track of each point, shape (K,)
+
+    Returns:
+        list[numpy.ndarray]: parameters l0, v, a1 and a2 of each track,
+        shape (T, 4), with the time measured from the first point of the
+        track, and the residuals in metres, shape (K,). Tracks with fewer
+        than four points, too few for the four parameters, have NaN
+        parameters and residuals.
+    """
+
+    lengths = numpy.asarray(lengths, dtype=float)
+    times, tracks = _track_times(times, tracks)
+    track_count = tracks.max() + 1
+
+    # Fit only the tracks long enough for the model
+    short = numpy.bincount(tracks) < 4
+    if numpy.any(short):
+        parameters = numpy.full((track_count, 4), numpy.nan)
+        residuals = numpy.full(len(lengths), numpy.nan)
+
+        fitted = ~short[tracks]
+        if numpy.any(fitted):
+            parameters[~short], residuals[fitted] = fit_deceleration_models(lengths[fitted], times[fitted],
+                                                                             tracks[fitted])
+
+        return parameters, residuals
+
+    durations = numpy.zeros(track_count)
+    numpy.maximum.at(durations, tracks, times)
+    durations[durations <= 0] = 1
+
+    def solve_linear(log_a2):
+        # The exponential is scaled to 1 at the last point of each track
+        a2 = numpy.exp(log_a2)
+        basis = numpy.column_stack((
+            numpy.ones(len(times)),
+            times,
+            -numpy.exp(a2[tracks] * (times - durations[tracks]))
+        ))
+
+        products = (basis[:, :, None] * basis[:, None, :]).reshape(len(times), 9)
+        normal = numpy.stack([numpy.bincount(tracks, products[:, k], track_count)
+                              for k in range(9)], axis=-1).reshape(-1, 3, 3)
+        right = numpy.stack([numpy.bincount(tracks, basis[:, k] * lengths, track_count)
+                             for k in range(3)], axis=-1)
+
+        coefficients = numpy.linalg.solve(normal, right[:, :, None])[:, :, 0]
+        return coefficients, numpy.sum(basis * coefficients[tracks], axis=1) - lengths
+
+    def costs(log_a2):
+        return numpy.bincount(tracks, solve_linear(log_a2)[1] ** 2, track_count)
+
+    # Coarse grid search of the deceleration rates of all tracks at once
+    grid = numpy.linspace(numpy.log(1e-2 / durations), numpy.log(50 / durations), 24)
+    best = numpy.argmin([costs(x) for x in grid], axis=0)
+    columns = numpy.arange(track_count)
+    low = grid[numpy.maximum(best - 1, 0), columns]
+    high = grid[numpy.minimum(best + 1, len(grid) - 1), columns]
+
+    # Refine by golden section search within the bracketing grid cells,
+    # one new cost evaluation per iteration for all tracks
+    ratio = (numpy.sqrt(5) - 1) / 2
+    left, right = high - ratio * (high - low), low + ratio * (high - low)
+    cost_left, cost_right = costs(left), costs(right)
+    for _ in range(40):
+        shrink = cost_left < cost_right
+        high = numpy.where(shrink, right, high)
+        low = numpy.where(shrink, low, left)
+
+        probe = numpy.where(shrink, high - ratio * (high - low), low + ratio * (high - low))
+        cost_probe = costs(probe)
+
+        left, right = numpy.where(shrink, probe, right), numpy.where(shrink, left, probe)
+        cost_left, cost_right = numpy.where(shrink, cost_probe, cost_right), \
+                                numpy.where(shrink, cost_left, cost_probe)
+
+    log_a2 = (low + high) / 2
+    coefficients, residuals = solve_linear(log_a2)
+    a2 = numpy.exp(log_a2)
+    a1 = coefficients[:, 2] * numpy.exp(-a2 * durations)
+
+    return numpy.column_stack((coefficients[:, :2], a1, a2)), residuals
+
+def calculate_model_velocities(parameters: numpy.ndarray, times: numpy.ndarray) -> numpy.ndarray:
+    """Calculates velocities of the deceleration model, v - a1 a2 exp(a2 t)
+
+    Args:
+        parameters (numpy.ndarray): parameters l0, v, a1 and a2, shape (4,)
+        or (..., 4)
+        times (numpy.ndarray): times in seconds from the first point
+
+    Returns:
+        numpy.ndarray: velocities in m/s
+    """
+
+    parameters = numpy.asarray(parameters, dtype=float)
+    _, v, a1, a2 = numpy.moveaxis(parameters, -1, 0)
+
+    return v - a1 * a2 * numpy.exp(a2 * numpy.asarray(times, dtype=float))
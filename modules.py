@@ -3,6 +3,11 @@ import tomli
 import tomli_w
 import re
 import json
+import threading
+from collections import OrderedDict
+
+import numpy
+
 class ConfigLoader:
     """
     A class for loading and retrieving configuration settings from a TOML file.
@@ -160,6 +165,167 @@ class EditConfig:
         config[category][key] = value
         self.save_config(config)
 
+# Lines of data.txt files
+STAR_PATTERN = re.compile(r"#\d+ position \(([-\d.]+), ([-\d.]+)\)")
+METEOR_PATTERN = re.compile(r"#Meteor \d+: start \(([-\d.]+), ([-\d.]+)\) end \(([-\d.]+), ([-\d.]+)\)"
+                            r".* from: ([-\d.]+)s to: ([-\d.]+)s")
+FRAME_PATTERN = re.compile(r"\s*frame = (-?\d+) x = ([-\d.]+)\s+y = ([-\d.]+)")
+
+# Fields of the meteor tracks read from data.txt files
+TRACK_DTYPE = numpy.dtype([('frame', numpy.int64), ('x', float), ('y', float), ('t', float)])
+
+OBSERVATION_CACHE_SIZE = 256
+
+# Observations by path, modification time and size, least recently used
+# first
+observation_cache = OrderedDict()
+observation_cache_lock = threading.Lock()
+
+class Observation:
+    """Contents of one data.txt file, the detected stars and meteors. The
+    arrays are read-only, as observations are shared by all callers of
+    load_observation().
+
+    Usage:
+        ```python
+        observation = load_observation('data/data.txt')
+        observation.stars              # star coordinates in pixels
+        observation.tracks[0]['x']     # x of every frame of the first meteor
+        observation.endpoints[0]       # its start and end in pixels```
+    """
+
+    __slots__ = ('path', 'stars', 'tracks', 'endpoints')
+
+    path: str
+    stars: numpy.ndarray
+    tracks: list[numpy.ndarray]
+    endpoints: numpy.ndarray
+
+    def __init__(self, path: str, stars: numpy.ndarray, tracks: list[numpy.ndarray],
+                 endpoints: numpy.ndarray) -> None:
+        """Args:
+            path (str): data.txt file path
+            stars (numpy.ndarray): Star coordinates in pixels, shape (N, 2)
+            tracks (list[numpy.ndarray]): Track of each meteor with the
+            TRACK_DTYPE fields frame, x, y and t, the seconds from the first
+            frame
+            endpoints (numpy.ndarray): Start and end of each meteor in
+            pixels, shape (M, 2, 2)
+        """
+
+        self.path = path
+        self.stars = stars
+        self.tracks = tracks
+        self.endpoints = endpoints
+
+        for array in (stars, endpoints, *tracks):
+            array.flags.writeable = False
+
+    def start_end(self, meteor: int = 0) -> tuple:
+        """Returns the start and end coordinates of a meteor
+
+        Args:
+            meteor (int): Index of the meteor
+
+        Returns:
+            tuple: start and end coordinates as tuples of floats, None and
+            None if the file has no such meteor
+        """
+
+        if meteor >= len(self.endpoints):
+            return None, None
+
+        start, end = self.endpoints[meteor].tolist()
+        return tuple(start), tuple(end)
+
+def parse_data_file(path: str) -> Observation:
+    """Reads all meteors and stars of a data.txt file in one pass over its
+    lines, so large files from busy nights are read in linear time. Use
+    load_observation() to read each file only once.
+
+    Args:
+        path (str): data.txt file path
+
+    Returns:
+        Observation: stars and meteors of the file
+    """
+
+    stars = []
+    tracks = []
+    track = None
+
+    with open(path, 'r') as file:
+        for line in file:
+            match = FRAME_PATTERN.match(line)
+            if match and track is not None:
+                track[2].extend(match.groups())
+                continue
+
+            match = METEOR_PATTERN.match(line)
+            if match:
+                *endpoints, start, end = match.groups()
+                track = (endpoints, float(end) - float(start), [])
+                tracks.append(track)
+                continue
+
+            match = STAR_PATTERN.match(line)
+            if match:
+                stars.append(match.groups())
+
+    meteors = []
+    for _, duration, values in tracks:
+        values = numpy.array(values, dtype=float).reshape(-1, 3)
+        meteor = numpy.zeros(len(values), dtype=TRACK_DTYPE)
+        if len(meteor):
+            meteor['frame'] = values[:, 0]
+            meteor['x'] = values[:, 1]
+            meteor['y'] = values[:, 2]
+
+            # Convert frames to time, frames are evenly spaced in the duration
+            count = abs(meteor['frame'][-1] - meteor['frame'][0])
+            if count:
+                meteor['t'] = (meteor['frame'] - meteor['frame'][0]) * (duration / count)
+        meteors.append(meteor)
+
+    return Observation(path,
+                       numpy.array(stars, dtype=float).reshape(-1, 2),
+                       meteors,
+                       numpy.array([endpoints for endpoints, _, _ in tracks], dtype=float).reshape(-1, 2, 2))
+
+def load_observation(path: str) -> Observation:
+    """Loads a data.txt file. Observations are cached by the path and
+    modification time of the file, so a changed file is read again, and the
+    least recently used ones are evicted beyond OBSERVATION_CACHE_SIZE files.
+
+    Args:
+        path (str): data.txt file path
+
+    Returns:
+        Observation: stars and meteors of the file, shared by all callers
+    """
+
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+
+    with observation_cache_lock:
+        observation = observation_cache.get(key)
+        if observation is not None:
+            observation_cache.move_to_end(key)
+            return observation
+
+    observation = parse_data_file(path)
+
+    with observation_cache_lock:
+        for stale in [cached for cached in observation_cache if cached[0] == path]:
+            del observation_cache[stale]
+
+        observation_cache[key] = observation
+        while len(observation_cache) > OBSERVATION_CACHE_SIZE:
+            observation_cache.popitem(last=False)
+
+    return observation
+
 class ParseData:
     """Parse from data.txt file, meteor and stars coordinates
     
@@ -179,12 +345,7 @@ class ParseData:
     """
     def __init__ (self, data_path):
         self.data_path = data_path
-        self.data = self._read_file()
-        self.parsed_data = self.parse_data()
-
-    def parse_data(self):
-        self.get_meteor_start_end_coordinates()
-        self.get_stars_coordinates()
+        self.observation = load_observation(data_path)
 
     def get_meteor_start_end_coordinates(self) -> list[float]:
         """Get meteor coordinates from data.txt file
@@ -195,29 +356,121 @@ class ParseData:
         Returns:
             tuple(): Meteor coordinates
         """
-        file = open(self.data_path, 'r')
-        for line in file:
-            if line.startswith("#Meteor 1:"):
-                match = re.search(r'start \(([^)]+)\) end \(([^)]+)\)', line)
-                if match:
-                    start = tuple(map(float, match.group(1).split(', ')))
-                    end = tuple(map(float, match.group(2).split(', ')))
-                    return start, end
-        return None, None  # Return the coordinates of the meteor
+        return self.observation.start_end()
     
     def get_stars_coordinates(self):
-        star_pattern = re.compile(r"#\d+ position \((\d+\.?\d*), (\d+\.?\d*)\)")
-        stars = star_pattern.findall(self.data)
-        return [(float(x), float(y)) for x, y in stars]
-
-    def _read_file(self):
-        if not os.path.exists(self.data_path):
-            raise FileNotFoundError(f"File {self.data_path} not found")
-        
-        with open(self.data_path, 'r') as f:
-            data = f.read()
-        return data
+        return [tuple(star) for star in self.observation.stars.tolist()]
     
+class computed:
+    """Memoized attribute derived from other attributes of the instance.
+    Each computed attribute declares its inputs, plain or computed
+    attributes, and is recalculated only after one of them changes.
+    Assigning a value stores it as if it was computed, assigning None
+    discards it.
+
+    Args:
+        inputs (str): Names of the attributes the value depends on
+
+    Usage:
+        Decorate methods of a Computed subclass
+        ```python
+        class Meteor(Computed):
+            @computed('observations')
+            def planes(self):
+                return calculate_meteor_planes(self.observations)```
+    """
+
+    def __init__(self, *inputs: str) -> None:
+        self.inputs = inputs
+
+    def __call__(self, function):
+        self.function = function
+        self.__doc__ = function.__doc__
+        return self
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+        # Register this attribute as a dependent of all its inputs
+        if '_dependents' not in owner.__dict__:
+            owner._dependents = {key: list(value) for key, value in getattr(owner, '_dependents', {}).items()}
+        for key in self.inputs:
+            owner._dependents.setdefault(key, []).append(name)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        values = instance.__dict__.setdefault('_computed_values', {})
+        counter = instance.__dict__.setdefault('_computed_counters', {}).setdefault(self.name, [0, 0])
+
+        if self.name in values:
+            counter[0] += 1
+            return values[self.name]
+
+        counter[1] += 1
+        value = self.function(instance)
+        values[self.name] = value
+        return value
+
+    def __set__(self, instance, value):
+        values = instance.__dict__.setdefault('_computed_values', {})
+        if value is None:
+            values.pop(self.name, None)
+        else:
+            values[self.name] = value
+
+class Computed:
+    """Base class for objects with computed attributes, invalidating them
+    whenever one of their inputs is assigned. Inputs changed in place, e.g.
+    by appending to a list, have to be invalidated explicitly."""
+
+    _dependents: dict = {}
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        self._invalidate_dependents(name)
+
+    def invalidate(self, name: str = None) -> None:
+        """Discards a computed value and everything computed from it, or
+        from an input attribute
+
+        Args:
+            name (str): Name of the attribute, all computed values if not set
+        """
+
+        values = self.__dict__.get('_computed_values', {})
+        if name is None:
+            values.clear()
+            return
+
+        values.pop(name, None)
+        self._invalidate_dependents(name)
+
+    def cache_info(self) -> dict:
+        """Returns the hit and miss counts of all computed attributes
+
+        Returns:
+            dict: hits and misses for each attribute name
+        """
+
+        return {
+            name: {'hits': hits, 'misses': misses}
+            for name, (hits, misses) in self.__dict__.get('_computed_counters', {}).items()
+        }
+
+    def _invalidate_dependents(self, name: str) -> None:
+        values = self.__dict__.get('_computed_values')
+        if not values:
+            return
+
+        stack = list(self._dependents.get(name, ()))
+        while stack:
+            dependent = stack.pop()
+            if dependent in values:
+                del values[dependent]
+            stack.extend(self._dependents.get(dependent, ()))
+
 class cache():
     def __init__(self):
         self.dirname = os.path.dirname(__file__)
@@ -0,0 +1,221 @@
+from astropy.time import Time
+import numpy
+
+# Gravitational parameters of the Sun and the Earth in m^3/s^2
+GM_SUN = 1.32712440018e20
+GM_EARTH = 3.986004418e14
+
+# Astronomical unit in metres and Earth rotation rate in rad/s
+AU = 149597870700.0
+EARTH_ROTATION = 7.2921150e-5
+
+# Obliquity of the ecliptic at J2000 in degrees
+OBLIQUITY = 23.4392911
+
+# Keplerian elements of the Earth-Moon barycentre with their rates per
+# Julian century from J2000, Standish, "Keplerian Elements for Approximate
+# Positions of the Major Planets", valid 1800 - 2050: a (AU), e, I, L,
+# longitude of perihelion and longitude of the node (degrees)
+EARTH_ELEMENTS = numpy.array([
+    [1.00000261, 0.01671123, -0.00001531, 100.46457166, 102.93768193, 0.0],
+    [0.00000562, -0.00004392, -0.01294668, 35999.37244981, 0.32327364, 0.0],
+])
+
+# Calculated orbit of a meteor
+ORBIT_DTYPE = numpy.dtype([
+    ('ra_g', 'f8'), ('dec_g', 'f8'),
+    ('v_g', 'f8'), ('v_h', 'f8'),
+    ('a', 'f8'), ('e', 'f8'), ('q', 'f8'),
+    ('i', 'f8'), ('omega', 'f8'), ('node', 'f8'),
+])
+
+def calculate_earth_state(times: Time) -> list[numpy.ndarray]:
+    """Calculates the heliocentric position and velocity of the Earth from
+    low-precision Keplerian elements, accurate to about 1e-4 AU and
+    a few m/s, without any downloaded ephemeris
+
+    Args:
+        times (Time): Times of the states, shape (N,)
+
+    Returns:
+        list[numpy.ndarray]: positions in metres and velocities in m/s in
+        the ecliptic frame of J2000, shape (N, 3) each
+    """
+
+    centuries = numpy.atleast_1d((times.tt.jd - 2451545.0) / 36525)
+    a, e, inclination, longitude, perihelion, node = \
+        (EARTH_ELEMENTS[0] + EARTH_ELEMENTS[1] * centuries[:, None]).T
+
+    inclination, node = numpy.radians(inclination), numpy.radians(node)
+    argument = numpy.radians(perihelion) - node
+    anomaly = numpy.radians(longitude - perihelion)
+
+    # Solve Kepler's equation by Newton's method
+    E = anomaly + e * numpy.sin(anomaly)
+    for _ in range(5):
+        E = E - (E - e * numpy.sin(E) - anomaly) / (1 - e * numpy.cos(E))
+
+    # Position and velocity in the orbital plane
+    a = a * AU
+    rate = numpy.sqrt(GM_SUN / a ** 3) / (1 - e * numpy.cos(E))
+    plane = numpy.stack((
+        a * (numpy.cos(E) - e),
+        a * numpy.sqrt(1 - e ** 2) * numpy.sin(E),
+        -a * numpy.sin(E) * rate,
+        a * numpy.sqrt(1 - e ** 2) * numpy.cos(E) * rate
+    ), axis=-1)
+
+    # Rotate by the argument of perihelion, inclination and node
+    cos_w, sin_w = numpy.cos(argument), numpy.sin(argument)
+    cos_O, sin_O = numpy.cos(node), numpy.sin(node)
+    cos_i, sin_i = numpy.cos(inclination), numpy.sin(inclination)
+
+    rotation = numpy.stack((
+        numpy.stack((cos_w * cos_O - sin_w * sin_O * cos_i, -sin_w * cos_O - cos_w * sin_O * cos_i), axis=-1),
+        numpy.stack((cos_w * sin_O + sin_w * cos_O * cos_i, -sin_w * sin_O + cos_w * cos_O * cos_i), axis=-1),
+        numpy.stack((sin_w * sin_i, cos_w * sin_i), axis=-1),
+    ), axis=1)
+
+    positions = numpy.einsum('nij,nj->ni', rotation, plane[:, :2])
+    velocities = numpy.einsum('nij,nj->ni', rotation, plane[:, 2:])
+
+    return positions, velocities
+
+def equatorial_to_ecliptic(vectors: numpy.ndarray) -> numpy.ndarray:
+    """Rotates vectors from the equatorial to the ecliptic frame of J2000
+
+    Args:
+        vectors (numpy.ndarray): equatorial vectors, shape (..., 3)
+
+    Returns:
+        numpy.ndarray: ecliptic vectors, shape (..., 3)
+    """
+
+    epsilon = numpy.radians(OBLIQUITY)
+    x, y, z = numpy.moveaxis(numpy.asarray(vectors, dtype=float), -1, 0)
+
+    return numpy.stack((
+        x,
+        y * numpy.cos(epsilon) + z * numpy.sin(epsilon),
+        -y * numpy.sin(epsilon) + z * numpy.cos(epsilon)
+    ), axis=-1)
+
+def calculate_orbital_elements(positions: numpy.ndarray, velocities: numpy.ndarray) -> list[numpy.ndarray]:
+    """Calculates heliocentric orbital elements from state vectors
+
+    Args:
+        positions (numpy.ndarray): heliocentric positions in metres in the
+        ecliptic frame, shape (N, 3)
+        velocities (numpy.ndarray): heliocentric velocities in m/s in the
+        ecliptic frame, shape (N, 3)
+
+    Returns:
+        list[numpy.ndarray]: semi-major axis and perihelion distance in AU,
+        eccentricity, and inclination, argument of perihelion and longitude
+        of the ascending node in decimal degrees, shape (N,) each
+    """
+
+    r = numpy.linalg.norm(positions, axis=1)
+    v = numpy.linalg.norm(velocities, axis=1)
+
+    h = numpy.cross(positions, velocities)
+    n = numpy.column_stack((-h[:, 1], h[:, 0], numpy.zeros(len(h))))
+    e_vector = numpy.cross(velocities, h) / GM_SUN - positions / r[:, None]
+
+    e = numpy.linalg.norm(e_vector, axis=1)
+    a = 1 / (2 / r - v ** 2 / GM_SUN) / AU
+    q = numpy.sum(h ** 2, axis=1) / GM_SUN / (1 + e) / AU
+
+    inclination = numpy.degrees(numpy.arccos(h[:, 2] / numpy.linalg.norm(h, axis=1)))
+    node = numpy.degrees(numpy.arctan2(n[:, 1], n[:, 0])) % 360
+
+    # Argument of perihelion from the node to the eccentricity vector
+    cos_omega = numpy.sum(n * e_vector, axis=1) / (numpy.linalg.norm(n, axis=1) * e)
+    omega = numpy.degrees(numpy.arccos(numpy.clip(cos_omega, -1, 1)))
+    omega = numpy.where(e_vector[:, 2] < 0, 360 - omega, omega)
+
+    return a, e, q, inclination, omega, node
+
+def calculate_orbits(radiants: numpy.ndarray,
+                     velocities: numpy.ndarray,
+                     positions: numpy.ndarray,
+                     times: Time) -> numpy.ndarray:
+    """Calculates heliocentric orbits of many meteors at once. The observed
+    radiants and velocities are corrected for the rotation of the Earth and
+    for zenith attraction, then the velocity of the Earth is added.
+
+    Args:
+        radiants (numpy.ndarray): observed radiants RA and Dec in decimal
+        degrees, shape (N, 2)
+        velocities (numpy.ndarray): initial velocities in m/s, shape (N,)
+        positions (numpy.ndarray): geocentric positions X, Y, Z of the
+        meteors in metres in the sidereal frame, shape (N, 3)
+        times (Time): Times of the meteors, shape (N,)
+
+    Returns:
+        numpy.ndarray: structured array of ORBIT_DTYPE with the geocentric
+        radiant in decimal degrees, geocentric and heliocentric velocity in
+        m/s and the orbital elements, shape (N,)
+    """
+
+    radiants = numpy.radians(numpy.atleast_2d(numpy.asarray(radiants, dtype=float)))
+    velocities = numpy.atleast_1d(numpy.asarray(velocities, dtype=float))
+    positions = numpy.atleast_2d(numpy.asarray(positions, dtype=float))
+    times = Time(times)
+    if times.isscalar:
+        times = times.reshape((1,))
+
+    ra, dec = radiants[:, 0], radiants[:, 1]
+    radiant = numpy.column_stack((numpy.cos(dec) * numpy.cos(ra),
+                                  numpy.cos(dec) * numpy.sin(ra),
+                                  numpy.sin(dec)))
+
+    # Add the velocity of the rotating ground to the meteor velocity
+    rotation = numpy.cross([0, 0, EARTH_ROTATION], positions)
+    velocity = -velocities[:, None] * radiant + rotation
+    v_c = numpy.linalg.norm(velocity, axis=1)
+    radiant = -velocity / v_c[:, None]
+
+    # Zenith attraction moves the radiant away from the zenith
+    r = numpy.linalg.norm(positions, axis=1)
+    zenith = positions / r[:, None]
+    v_g = numpy.sqrt(v_c ** 2 - 2 * GM_EARTH / r)
+
+    cos_z = numpy.clip(numpy.sum(radiant * zenith, axis=1), -1, 1)
+    z_c = numpy.arccos(cos_z)
+    z_g = z_c + 2 * numpy.arctan((v_c - v_g) / (v_c + v_g) * numpy.tan(z_c / 2))
+
+    across = radiant - cos_z[:, None] * zenith
+    across = across / numpy.maximum(numpy.linalg.norm(across, axis=1), 1e-15)[:, None]
+    radiant = numpy.cos(z_g)[:, None] * zenith + numpy.sin(z_g)[:, None] * across
+
+    # Heliocentric state in the ecliptic frame
+    earth_positions, earth_velocities = calculate_earth_state(times)
+    helio_positions = earth_positions + equatorial_to_ecliptic(positions)
+    helio_velocities = earth_velocities + equatorial_to_ecliptic(-v_g[:, None] * radiant)
+
+    orbits = numpy.empty(len(velocities), dtype=ORBIT_DTYPE)
+    orbits['ra_g'] = numpy.degrees(numpy.arctan2(radiant[:, 1], radiant[:, 0])) % 360
+    orbits['dec_g'] = numpy.degrees(numpy.arcsin(numpy.clip(radiant[:, 2], -1, 1)))
+    orbits['v_g'] = v_g
+    orbits['v_h'] = numpy.linalg.norm(helio_velocities, axis=1)
+    orbits['a'], orbits['e'], orbits['q'], orbits['i'], orbits['omega'], orbits['node'] = \
+        calculate_orbital_elements(helio_positions, helio_velocities)
+
+    return orbits
+
+def calculate_solar_longitudes(times: Time) -> numpy.ndarray:
+    """Calculates the geocentric ecliptic longitude of the Sun, which is
+    used to date meteor shower activity
+
+    Args:
+        times (Time): Times, shape (N,)
+
+    Returns:
+        numpy.ndarray: solar longitudes in decimal degrees of the equinox of
+        J2000, shape (N,)
+    """
+
+    positions, _ = calculate_earth_state(times)
+
+    return numpy.degrees(numpy.arctan2(-positions[:, 1], -positions[:, 0])) % 360
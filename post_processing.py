@@ -16,8 +16,9 @@ from matplotlib import pyplot as plt
 from os import path
 
 from compare import FolderComparator
-from modules import ConfigLoader, ParseData
+from modules import ConfigLoader, load_observation
 from main import MeteorsList as MeteorData
+from render import METEOR_CMAPS, draw_meteor_image, render_meteor_images
 
 HOME_DIR = ConfigLoader().get_home_dir()
 compare = FolderComparator()
@@ -70,16 +71,15 @@ class post_processing:
             processed_meteors[-1].append(self._parse_detection_type(meteor_object, 0))
             processed_meteors[-1].append(self._parse_detection_type(meteor_object, 1))
 
-            # Meteor start and end coordinates
+            # Meteor start and end coordinates, each data.txt is read once
+            # for the coordinates and the stars
             if meteor_object[0] is not None:
-                meteor_position = ParseData(
-                    f"{meteor_object[0][0]}/data.txt"
-                ).get_meteor_start_end_coordinates()
+                observation = load_observation(f"{meteor_object[0][0]}/data.txt")
+                meteor_position = observation.start_end()
 
             if meteor_object[1] is not None:
-                meteor_position1 = ParseData(
-                    f"{meteor_object[1][0]}/data.txt"
-                ).get_meteor_start_end_coordinates()
+                observation1 = load_observation(f"{meteor_object[1][0]}/data.txt")
+                meteor_position1 = observation1.start_end()
 
             # Meteor quadrants
 
@@ -129,14 +129,10 @@ class post_processing:
 
             # Stars
             if meteor_object[0] is not None:
-                stars = ParseData(
-                    f"{meteor_object[0][0]}/data.txt"
-                ).get_stars_coordinates()
-                processed_meteors[-1].append(stars)
-                stars1 = ParseData(
-                    f"{meteor_object[1][0]}/data.txt"
-                ).get_stars_coordinates()
-                processed_meteors[-1].append(stars1)
+                processed_meteors[-1].append(observation.stars.tolist())
+                processed_meteors[-1].append(
+                    observation1.stars.tolist() if meteor_object[1] is not None else None
+                )
             else:
                 processed_meteors[-1].append(None)
                 processed_meteors[-1].append(None)
@@ -324,79 +320,13 @@ class post_processing:
 
         Returns:
             ax: matplotlib axis with the meteor plotted on the image"""
-        image = cv.imread(image_path, cv.IMREAD_GRAYSCALE)
-        height, width = image.shape
-        center_x, center_y = width // 2, height // 2
-        radius = min(center_x, center_y)
-        quadrant_size = radius * 2 // 3
-
-        observatory = image_path.split("/")[-3]
-        ax.set_title(f"{observatory} - {image_path.split('/')[-1]}")
-
-        # Draw the grid
-        #for i in range(1, 3):
-        #    
-        #    if i == 1:
-        #        ax.plot(
-        #            [center_x - radius, center_x + radius],
-        #            [
-        #                center_y - radius + i * quadrant_size,
-        #                center_y - radius + i * quadrant_size,
-        #            ],
-        #            color="blue",
-        #            label="Grid",
-        #        )
-        #    else:
-        #        ax.plot(
-        #            [center_x - radius, center_x + radius],
-        #            [
-        #                center_y - radius + i * quadrant_size,
-        #                center_y - radius + i * quadrant_size,
-        #            ],
-        #            color="blue",
-        #        )
-        #    
-        #    ax.plot(
-        #        [
-        #            center_x - radius + i * quadrant_size,
-        #            center_x - radius + i * quadrant_size,
-        #        ],
-        #        [center_y - radius, center_y + radius],
-        #        color="blue",
-        #    )
-
-        if stars is not None:
-            for i, star in enumerate(stars):
-                if i == 0:
-                    ax.plot(star[0], star[1], "ro", label="Star", markersize=3)
-                else:
-                    ax.plot(star[0], star[1], "ro", markersize=3)
-
         try:
             theme = ConfigLoader().get_value_from_data("meteor_plot_theme", "post_processing")
         except KeyError:
             theme = "grey"
             logging.warning("No cmap specified in the config file. Using grey cmap.")
 
-        # Best cmap for the image is grey, hot, bone
-        if theme == "grey":
-            cmap = "grey"
-        elif theme == "red":
-            cmap = "hot"
-        elif theme == "bone":
-            cmap = "bone"
-        else:
-            cmap = "grey"
-
-        ax.imshow(image, cmap=cmap)
-
-        # Draw the meteor path
-        ax.plot(
-            [coordinates[0][0], coordinates[1][0]],
-            [coordinates[0][1], coordinates[1][1]],
-            color="yellow",
-            label="Meteor",
-        )
+        draw_meteor_image(ax, image_path, coordinates, stars, METEOR_CMAPS.get(theme, "grey"))
 
         return ax
 
@@ -456,10 +386,30 @@ class post_processing:
         # TODO: Consider adding matplotlib window to the gtk window https://matplotlib.org/stable/gallery/user_interfaces/embedding_in_gtk3_sgskip.html#sphx-glr-gallery-user-interfaces-embedding-in-gtk3-sgskip-py
         return plt, fig
 
-    def plot_all_meteors(self):
-        # Plot all meteors in the list
+    def plot_all_meteors(self, directory=None, format="png", processes=None):
+        """Plot all meteors in the list
+        Args:
+            directory: if set, render the plots headless into this directory
+                instead of showing them one by one
+            format: image format of the rendered files, e.g. png or svg
+            processes: number of rendering processes, all cores by default
+
+        Returns:
+            list of rendered files, None if the plots were shown"""
         meteors = self.meteor_data_table
         logging.info(f"Plotting {len(meteors)} meteors.")
+
+        if directory is not None:
+            return render_meteor_images(
+                (
+                    (meteor[0], [meteor[-6], meteor[-5]], meteor[-4], meteor[-3], meteor[-2], meteor[-1])
+                    for meteor in meteors
+                ),
+                directory,
+                format,
+                processes,
+            )
+
         for meteor in meteors:
             plt, fig = self.plot_meteors(
                 [meteor[-6], meteor[-5]], meteor[-4], meteor[-3], meteor[-2], meteor[-1]
@@ -1,6 +1,7 @@
 import logging
 import gi
 import os
+import threading
 
 logging.basicConfig(level=logging.WARNING)
 
@@ -10,6 +11,7 @@ from astropy.time import Time
 
 from post_processing import post_processing
 from trajectory import *
+from export import export_trajectories
 from modules import EditConfig, ConfigLoader, cache
 from configuration_gui import ConfigurationWindow as ConfigApp
 from main import MeteorsList as MeteorsData
@@ -28,6 +30,8 @@ class MeteorApp(Gtk.Window):
         self.pp = post_processing()
         self.meteor_data = self.pp.meteor_data_table
         self.index = 1
+        # Meteors already calculated, by label, with their cached results
+        self.meteors = {}
 
         self.set_border_width(10)
         self.set_default_size(800, 600)
@@ -156,7 +160,7 @@ class MeteorApp(Gtk.Window):
         self.btn_export_gpx = Gtk.ToolButton(
             icon_name="document-export", label="Export GPX"
         )
-        self.btn_export_gpx.set_tooltip_text("Export meteor data to GPX file.")
+        self.btn_export_gpx.set_tooltip_text("Export meteor trajectories to a GPX, KML or CSV file.")
         self.btn_export_gpx.connect("clicked", self.export_gpx_file)
         self.Toolbar.insert(self.btn_export_gpx, 4)
 
@@ -225,6 +229,8 @@ class MeteorApp(Gtk.Window):
 
         self.meteor_data = self.pp.meteor_data_table
         self.index = 1
+        # Meteors of the previous table are calculated from other data
+        self.meteors = {}
 
     def welcome_dialog(self, widget=None):
         dialog = Gtk.FileChooserDialog(
@@ -256,6 +262,7 @@ class MeteorApp(Gtk.Window):
 
             self.meteor_data = self.pp.meteor_data_table
             self.index = 1
+            self.meteors = {}
             logging.info("Folder selected:")
             EditConfig().set_value("home_dir", folder)
             self.update_meteor_data()
@@ -280,6 +287,61 @@ class MeteorApp(Gtk.Window):
     def export_gpx_file(self, widget):
         logging.info("Exporting meteor data to GPX file.")
 
+        dialog = Gtk.FileChooserDialog(
+            title="Export Meteor Trajectories",
+            parent=self,
+            action=Gtk.FileChooserAction.SAVE,
+            buttons=(
+                Gtk.STOCK_CANCEL,
+                Gtk.ResponseType.CANCEL,
+                Gtk.STOCK_SAVE,
+                Gtk.ResponseType.OK,
+            ),
+        )
+
+        dialog.set_default_size(800, 400)
+        dialog.set_current_folder(GLib.get_home_dir())
+        dialog.set_current_name("meteors.gpx")
+
+        response = dialog.run()
+        path = dialog.get_filename()
+        dialog.destroy()
+        if response != Gtk.ResponseType.OK:
+            return
+
+        self.btn_export_gpx.set_sensitive(False)
+
+        # The worker thread only reads these copies, meteors it creates are
+        # not kept, so only one of them is in memory at a time
+        rows = list(self.meteor_data)
+        created = dict(self.meteors)
+
+        def meteors():
+            # Create meteors one by one, skipping those that fail
+            for row in rows:
+                try:
+                    yield created[row[0]] if row[0] in created else self.create_meteor(row)
+                except Exception as e:
+                    logging.error(f"Error creating meteor object: {e}")
+
+        def on_done(message, error):
+            self.btn_export_gpx.set_sensitive(True)
+            if error:
+                self.error_dialog(message)
+            else:
+                self.info_dialog(message)
+
+        def worker():
+            # Export off the GUI thread, report back through the main loop
+            try:
+                count = export_trajectories(meteors(), path)
+                GLib.idle_add(on_done, f"{count} meteor trajectories exported.", False)
+            except Exception as e:
+                logging.error(f"Error exporting meteor data: {e}")
+                GLib.idle_add(on_done, f"Error exporting meteor data: {e}", True)
+
+        threading.Thread(target=worker, daemon=True).start()
+
     def setup_observatories(self, widget):
         logging.info("Opening observatory settings.")
         win = ConfigApp()
@@ -298,6 +360,8 @@ class MeteorApp(Gtk.Window):
 
     def on_observatory_settings_closed(self, widget):
         logging.info("Observatory settings closed.")
+        # Stations or WCS files may have changed, calculate the meteors again
+        self.meteors = {}
         self.btn_settings_observatory.set_sensitive(True)
         self.btn_view_meteor.set_sensitive(True)
         self.btn_location.set_sensitive(True)
@@ -352,6 +416,7 @@ class MeteorApp(Gtk.Window):
 
     def on_loading_data_window_closed(self, widget):
         logging.info("Data window closed.")
+        self.meteors = {}
         widget.destroy()
 
     def meteor_list_open(self, widget):
@@ -380,19 +445,21 @@ class MeteorApp(Gtk.Window):
     def location_dialog(self, widget):
         location_data = self.location_data()
 
-    def location_data(self):
-        self.btn_select_folder.set_sensitive(False)
-        self.btn_load_data.set_sensitive(False)
-        self.btn_view_meteor.set_sensitive(False)
-        self.btn_location.set_sensitive(False)
-        self.btn_settings_observatory.set_sensitive(False)
-        self.btn_load_data.set_sensitive(False)
+    def get_meteor(self, i):
+        """Creates the Meteor of the i-th row of the meteor data table, or
+        returns the one already created with its cached results"""
 
-        # Get time in this format '2018-10-8 21:38:32'
-        data = self.pp.meteor_data_table
-        logging.info("Opening meteor location dialog.")
-        i = self.index - 1
+        row = self.pp.meteor_data_table[i]
+        if row[0] not in self.meteors:
+            self.meteors[row[0]] = self.create_meteor(row)
 
+        return self.meteors[row[0]]
+
+    def create_meteor(self, row):
+        """Creates the Meteor of a row of the meteor data table without
+        keeping it, so it can be called from worker threads"""
+
+        # Get time in this format '2018-10-8 21:38:32'
         try:
             name = ConfigLoader().get_value_from_data("first_observatory", "data")
             latitude = float(
@@ -431,10 +498,9 @@ class MeteorApp(Gtk.Window):
             second_obs_wcs = ConfigLoader().get_value_from_data(
                 "second_obs_wcs", "astrometry"
             )
-            times = [data[i][1] + " " + data[i][2], data[i][1] + " " + data[i][3]]
+            times = [row[1] + " " + row[2], row[1] + " " + row[3]]
         except Exception as e:
-            logging.error(f"Error getting observatory data: {e}")
-            return
+            raise KeyError(f"Error getting observatory data: {e}")
 
         first_obs = Station(
             lat=latitude,
@@ -451,7 +517,7 @@ class MeteorApp(Gtk.Window):
             label=second_name,
         )
 
-        time = Time(data[i][1] + " " + data[i][3], format="iso")
+        time = Time(row[1] + " " + row[3], format="iso")
 
         #!IMPORTANT: Remember, first observatory in calculation is actually the second observatory in the data table
         first_obs.set_wcs(
@@ -468,70 +534,74 @@ class MeteorApp(Gtk.Window):
             Time(ConfigLoader().get_value_from_data("first_wcs_time", "data")),
         )
 
-        label = data[i][0]
-        img_A = data[i][10]
-        img_B = data[i][9]
-        data_path_A = "/".join(data[i][10].split("/")[:-1]) + "/data.txt"
-        data_path_B = "/".join(data[i][9].split("/")[:-1]) + "/data.txt"
-        time = Time(data[i][1] + " " + data[i][2], format="iso")
+        label = row[0]
+        img_A = row[10]
+        img_B = row[9]
+        data_path_A = "/".join(row[10].split("/")[:-1]) + "/data.txt"
+        data_path_B = "/".join(row[9].split("/")[:-1]) + "/data.txt"
+        time = Time(row[1] + " " + row[2], format="iso")
         try:
             c = cache()
         except Exception as e:
             os.remove(path=cache().path)
 
-        try:
-            if (
-                load_fixed
-                and os.path.exists(first_obs_wcs)
-                and os.path.exists(second_obs_wcs)
-            ):
-                try:
-                    logging.info("Loading fixed wcs data.")
-                    meteor = Meteor.from_astrometry_fixed(
-                        label,
-                        [first_obs, second_obs],
-                        [data_path_A, data_path_B],
-                        time,
-                    )
-                except Exception as e:
-                    logging.error(f"Error creating meteor object: {e}")
-                    self.error_dialog(f"Error creating meteor object: {e}")
-                    self.btn_select_folder.set_sensitive(True)
-                    self.btn_load_data.set_sensitive(True)
-                    self.btn_view_meteor.set_sensitive(True)
-                    self.btn_location.set_sensitive(True)
-                    self.btn_settings_observatory.set_sensitive(True)
-                    return
+        if (
+            load_fixed
+            and os.path.exists(first_obs_wcs)
+            and os.path.exists(second_obs_wcs)
+        ):
+            logging.info("Loading fixed wcs data.")
+            meteor = Meteor.from_astrometry_fixed(
+                label,
+                [first_obs, second_obs],
+                [data_path_A, data_path_B],
+                time,
+            )
+        else:
+            #!IMPORTANT: Loading should be added while waiting for the data to be loaded
+            logging.info("Loading meteor data from astrometry.")
+            if c.search(label, first_obs.label) is not None:
+                first_api_id = c.search(label, first_obs.label)
             else:
-                #!IMPORTANT: Loading should be added while waiting for the data to be loaded
-                logging.info("Loading meteor data from astrometry.")
-                if c.search(label, first_obs.label) is not None:
-                    first_api_id = c.search(label, first_obs.label)
-                else:
-                    first_api_id = None
-                if c.search(label, second_obs.label) is not None:
-                    second_api_id = c.search(label, second_obs.label)
-                else:
-                    second_api_id = None
-                meteor = Meteor.from_astrometry(
-                    label,
-                    [first_obs, second_obs],
-                    [img_A, img_B],
-                    [data_path_A, data_path_B],
-                    time,
-                    prep=True,
-                    job_ids=[first_api_id, second_api_id],
-
-                )
-                print(second_obs.label)
-                print(meteor.job_ids[1])
-                print(first_obs.label)
-                print(meteor.job_ids[0])
-
-                if meteor.job_ids[0] is not None or first_obs.label is not None:
-                    c.set_key(meteor.job_ids[0], label, first_obs.label)
-                if meteor.job_ids[1] is not None or second_obs.label is not None:
-                    c.set_key(meteor.job_ids[1], label, second_obs.label)
+                first_api_id = None
+            if c.search(label, second_obs.label) is not None:
+                second_api_id = c.search(label, second_obs.label)
+            else:
+                second_api_id = None
+            meteor = Meteor.from_astrometry(
+                label,
+                [first_obs, second_obs],
+                [img_A, img_B],
+                [data_path_A, data_path_B],
+                time,
+                prep=True,
+                job_ids=[first_api_id, second_api_id],
+
+            )
+            print(second_obs.label)
+            print(meteor.job_ids[1])
+            print(first_obs.label)
+            print(meteor.job_ids[0])
+
+            if meteor.job_ids[0] is not None or first_obs.label is not None:
+                c.set_key(meteor.job_ids[0], label, first_obs.label)
+            if meteor.job_ids[1] is not None or second_obs.label is not None:
+                c.set_key(meteor.job_ids[1], label, second_obs.label)
+
+        return meteor
+
+    def location_data(self):
+        self.btn_select_folder.set_sensitive(False)
+        self.btn_load_data.set_sensitive(False)
+        self.btn_view_meteor.set_sensitive(False)
+        self.btn_location.set_sensitive(False)
+        self.btn_settings_observatory.set_sensitive(False)
+        self.btn_load_data.set_sensitive(False)
+
+        logging.info("Opening meteor location dialog.")
+
+        try:
+            meteor = self.get_meteor(self.index - 1)
         except Exception as e:
             logging.error(f"Error creating meteor object: {e}")
             self.error_dialog(f"Error creating meteor object: {e}")
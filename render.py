@@ -0,0 +1,226 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2 as cv
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from trajectory import get_map_background, load_plot_config
+
+# Colormaps of the meteor_plot_theme setting, grey, hot and bone suit the
+# sky images best
+METEOR_CMAPS = {
+    'grey': 'grey',
+    'red': 'hot',
+    'bone': 'bone',
+}
+
+# Figure sizes in inches and axes of the rendered plots
+FIGURE_SIZES = {
+    'trajectory': (8, 8),
+    'radiant': (6.4, 4.8),
+    'velocities': (6.4, 4.8),
+    'image': (8, 8),
+    'images': (16, 8),
+}
+
+# Settings and reusable figures of the current process
+worker_state = {'config': {}, 'figures': {}}
+
+def draw_meteor_image(ax, image_path: str, coordinates, stars=None, cmap: str = 'grey') -> None:
+    """Draws a sky image with the detected stars and the meteor path into
+    existing axes
+
+    Args:
+        ax (Axes): matplotlib axes to draw into
+        image_path (str): path to the image
+        coordinates: start and end coordinates of the meteor in pixels
+        stars (list[tuple]): star coordinates in pixels
+        cmap (str): matplotlib colormap of the image
+    """
+
+    image = cv.imread(image_path, cv.IMREAD_GRAYSCALE)
+    if image is None:
+        raise FileNotFoundError(f"Image {image_path} not found")
+
+    observatory = image_path.split("/")[-3]
+    ax.set_title(f"{observatory} - {image_path.split('/')[-1]}")
+
+    if stars:
+        x, y = zip(*stars)
+        ax.plot(x, y, "ro", label="Star", markersize=3)
+
+    ax.imshow(image, cmap=cmap)
+
+    # Draw the meteor path
+    ax.plot(
+        [coordinates[0][0], coordinates[1][0]],
+        [coordinates[0][1], coordinates[1][1]],
+        color="yellow",
+        label="Meteor",
+    )
+
+def _init_worker(config: dict, headless: bool = True) -> None:
+    """Prepares a rendering process: selects the Agg backend and renders
+    the map background, so that every task only draws its own meteor"""
+
+    if headless:
+        matplotlib.use('Agg')
+
+    worker_state['config'] = config
+    worker_state['figures'].clear()
+
+    color = 'white' if config.get('plt_style') == 'dark' else 'black'
+    try:
+        get_map_background(color, config.get('map_style'))
+    except Exception as e:
+        logging.warning(f'Map background could not be prepared: {e}')
+
+def _get_figure(kind: str, style: str) -> Figure:
+    """Returns the cleared figure of this process for a plot kind"""
+
+    key = kind, style
+    figure = worker_state['figures'].get(key)
+    if figure is None:
+        figure = Figure(figsize=FIGURE_SIZES[kind])
+        FigureCanvasAgg(figure)
+        worker_state['figures'][key] = figure
+    else:
+        figure.clear()
+
+    return figure
+
+def _render_meteor(task: tuple) -> list[str]:
+    """Renders the requested plots of one Meteor into files"""
+
+    meteor, directory, kinds, format = task
+    config = worker_state['config']
+    style = 'dark_background' if config.get('plt_style') == 'dark' else 'default'
+
+    paths = []
+    for kind in kinds:
+        path = os.path.join(directory, f'{meteor.label}_{kind}.{format}')
+        try:
+            with matplotlib.style.context(style):
+                figure = _get_figure(kind, style)
+
+                if kind == 'trajectory':
+                    ax = figure.add_axes([0.1, 0.1, 0.8, 0.8])
+                    meteor.draw_trajectory_geodetic(ax, config)
+                elif kind == 'radiant':
+                    meteor.draw_radiant(figure.add_subplot())
+                else:
+                    meteor.draw_velocities(figure.add_subplot())
+
+                figure.savefig(path, format=format)
+            paths.append(path)
+        except Exception as e:
+            logging.error(f'Error rendering {kind} of meteor {meteor.label}: {e}')
+
+    return paths
+
+def _render_images(task: tuple) -> list[str]:
+    """Renders the sky images of one matched or unmatched meteor into a file"""
+
+    (name, images_path, first_coords, second_coords, stars, second_stars), directory, format = task
+    config = worker_state['config']
+    style = 'default' if config.get('plt_style') == 'light' else 'dark_background'
+    cmap = METEOR_CMAPS.get(config.get('meteor_plot_theme'), 'grey')
+
+    path = os.path.join(directory, f'{name}.{format}')
+    try:
+        with matplotlib.style.context(style):
+            if type(images_path) is list:
+                figure = _get_figure('images', style)
+                axes = figure.subplots(1, 2)
+                draw_meteor_image(axes[0], images_path[0], first_coords, stars, cmap)
+                draw_meteor_image(axes[1], images_path[1], second_coords, second_stars, cmap)
+            else:
+                figure = _get_figure('image', style)
+                axes = [figure.subplots()]
+                draw_meteor_image(axes[0], images_path, first_coords, cmap=cmap)
+
+            for ax in axes:
+                ax.legend(fancybox=True, shadow=True)
+
+            figure.savefig(path, format=format)
+    except Exception as e:
+        logging.error(f'Error rendering images of meteor {name}: {e}')
+        return []
+
+    return [path]
+
+def _render_all(function, tasks, processes: int, config: dict) -> list[str]:
+    """Runs rendering tasks in warm worker processes, or in this process if
+    processes is 1, and collects the written files"""
+
+    if config is None:
+        config = load_plot_config()
+
+    if processes == 1:
+        _init_worker(config, headless=False)
+        results = map(function, tasks)
+        return [path for paths in results for path in paths]
+
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(config,)) as executor:
+        return [path for paths in executor.map(function, tasks) for path in paths]
+
+def render_meteors(meteors, directory: str, kinds: tuple = ('trajectory',),
+                   format: str = 'png', processes: int = None, config: dict = None) -> list[str]:
+    """Renders plots of many meteors into image files without any GUI. The
+    meteors are drawn by a pool of processes, each of which selects the Agg
+    backend, renders the map background once and reuses its figures for
+    all meteors it draws. Meteors that cannot be drawn are skipped.
+
+    Args:
+        meteors (Iterable[Meteor]): Meteors to render
+        directory (str): Output directory, files are named
+        '{label}_{kind}.{format}'
+        kinds (tuple[str]): Plots to render, 'trajectory', 'radiant' or
+        'velocities'
+        format (str): Image format supported by matplotlib, e.g. 'png' or 'svg'
+        processes (int): Number of worker processes, all cores by default,
+        1 renders in this process
+        config (dict): post_processing settings, read from config.toml if
+        not set
+
+    Returns:
+        list[str]: paths of the written files
+    """
+
+    unknown = set(kinds) - {'trajectory', 'radiant', 'velocities'}
+    if unknown:
+        raise ValueError(f"Unknown plot kinds {sorted(unknown)}, use 'trajectory', 'radiant' or 'velocities'.")
+
+    os.makedirs(directory, exist_ok=True)
+    tasks = ((meteor, directory, tuple(kinds), format) for meteor in meteors)
+
+    return _render_all(_render_meteor, tasks, processes, config)
+
+def render_meteor_images(meteors, directory: str, format: str = 'png',
+                         processes: int = None, config: dict = None) -> list[str]:
+    """Renders the sky images of many meteors with their stars and paths
+    into image files without any GUI, in the same pool of processes as
+    render_meteors
+
+    Args:
+        meteors (Iterable[tuple]): Meteors as tuples of name, image path or
+        list of two image paths, coordinates in both images and stars in
+        both images
+        directory (str): Output directory, files are named '{name}.{format}'
+        format (str): Image format supported by matplotlib, e.g. 'png' or 'svg'
+        processes (int): Number of worker processes, all cores by default,
+        1 renders in this process
+        config (dict): post_processing settings, read from config.toml if
+        not set
+
+    Returns:
+        list[str]: paths of the written files
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    tasks = ((tuple(meteor), directory, format) for meteor in meteors)
+
+    return _render_all(_render_images, tasks, processes, config)
@@ -0,0 +1,335 @@
+from astropy.time import Time
+import numpy
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from orbit import calculate_solar_longitudes
+
+# Known meteor showers with their radiants in decimal degrees, geocentric
+# velocities in m/s and solar longitudes in decimal degrees at the peak of
+# activity, from the IMO meteor shower calendar
+SHOWER_DTYPE = numpy.dtype([
+    ('code', 'U3'), ('name', 'U24'),
+    ('ra', 'f8'), ('dec', 'f8'),
+    ('v_g', 'f8'), ('solar_longitude', 'f8'),
+])
+
+SHOWERS = numpy.array([
+    ('QUA', 'Quadrantids', 230, 49, 41e3, 283.15),
+    ('LYR', 'April Lyrids', 271, 34, 49e3, 32.32),
+    ('ETA', 'eta Aquariids', 338, -1, 66e3, 45.5),
+    ('SDA', 'Southern delta Aquariids', 340, -16, 41e3, 127),
+    ('CAP', 'alpha Capricornids', 307, -10, 23e3, 127),
+    ('PER', 'Perseids', 48, 58, 59e3, 140.0),
+    ('DRA', 'October Draconids', 262, 54, 20e3, 195.4),
+    ('STA', 'Southern Taurids', 32, 9, 27e3, 197),
+    ('ORI', 'Orionids', 95, 16, 66e3, 208),
+    ('NTA', 'Northern Taurids', 58, 22, 29e3, 230),
+    ('LEO', 'Leonids', 152, 22, 71e3, 235.27),
+    ('GEM', 'Geminids', 112, 33, 35e3, 262.2),
+    ('URS', 'Ursids', 217, 76, 33e3, 270.7),
+], dtype=SHOWER_DTYPE)
+
+# Smallest number of radiants kept outside the tree before it is rebuilt
+BUFFER_SIZE = 256
+
+class RadiantIndex:
+    """Spatial index of meteor radiants for radius queries, shower
+    association and clustering. Radiants are stored as unit vectors,
+    optionally extended with the velocity and the solar longitude, scaled so
+    that a distance of 1 means the given tolerances. Two radiants 'agree'
+    if their combined distance is at most 1.
+
+    New radiants are collected in a small buffer searched by brute force
+    and merged into a cKDTree once the buffer grows over a few times the
+    square root of the tree size, so insertion and queries stay fast for
+    millions of radiants.
+
+    Args:
+        radius (float): Angular tolerance of radiants in decimal degrees
+        velocity (float): Velocity tolerance in m/s, velocities are not
+        indexed if not set
+        longitude (float): Solar longitude tolerance in decimal degrees,
+        times are not indexed if not set
+
+    Usage:
+        ```python
+        index = RadiantIndex(radius=3, velocity=5e3)
+        index.add_meteors(meteors)
+        neighbours = index.query(meteor.get_radiant(), 40e3)
+        clusters = index.cluster(min_samples=5)```
+    """
+
+    radius: float
+    velocity: float
+    longitude: float
+    labels: list
+    radiants: numpy.ndarray
+    velocities: numpy.ndarray
+    longitudes: numpy.ndarray
+
+    def __init__(self, radius: float = 2.0, velocity: float = None, longitude: float = None) -> None:
+        self.radius = radius
+        self.velocity = velocity
+        self.longitude = longitude
+        self.labels = []
+
+        dimensions = 3 + (velocity is not None) + 2 * (longitude is not None)
+        self._features = numpy.empty((0, dimensions))
+        self.radiants = numpy.empty((0, 2))
+        self.velocities = numpy.empty(0)
+        self.longitudes = numpy.empty(0)
+        self._size = 0
+        self._tree = cKDTree(self._features)
+        self._tree_size = 0
+
+    @classmethod
+    def from_showers(cls, showers: numpy.ndarray = SHOWERS, radius: float = 5.0,
+                     velocity: float = 7e3, longitude: float = 10.0) -> 'RadiantIndex':
+        """Creates an index of known showers labeled by their codes
+
+        Args:
+            showers (numpy.ndarray): structured array of SHOWER_DTYPE
+            radius (float): Angular tolerance in decimal degrees
+            velocity (float): Velocity tolerance in m/s, or None
+            longitude (float): Solar longitude tolerance in decimal degrees,
+            or None
+
+        Returns:
+            RadiantIndex
+        """
+
+        index = cls(radius, velocity, longitude)
+        index._append(numpy.column_stack((showers['ra'], showers['dec'])),
+                      showers['v_g'], showers['solar_longitude'], showers['code'].tolist())
+        return index
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, radiants: numpy.ndarray, velocities: numpy.ndarray = None,
+            times: Time = None, labels: list = None) -> numpy.ndarray:
+        """Adds radiants to the index
+
+        Args:
+            radiants (numpy.ndarray): RA and Dec in decimal degrees, shape
+            (2,) or (N, 2)
+            velocities (numpy.ndarray): velocities in m/s, shape (N,),
+            required if the index has a velocity tolerance
+            times (Time): times of the meteors, shape (N,), required if the
+            index has a solar longitude tolerance
+            labels (list): labels of the radiants, by default their indices
+
+        Returns:
+            numpy.ndarray: indices of the added radiants
+        """
+
+        radiants = numpy.atleast_2d(numpy.asarray(radiants, dtype=float))
+        return self._append(radiants, velocities, self._solar_longitudes(times, len(radiants)), labels)
+
+    def add_meteors(self, meteors, geocentric: bool = False) -> numpy.ndarray:
+        """Adds the radiants of meteors, labeled by the meteor labels
+
+        Args:
+            meteors (Iterable[Meteor]): Meteors to add
+            geocentric (bool): Whether to add the geocentric radiants and
+            velocities from the orbits instead of the observed radiants and
+            initial velocities
+
+        Returns:
+            numpy.ndarray: indices of the added radiants
+        """
+
+        radiants, velocities, times, labels = [], [], [], []
+        for meteor in meteors:
+            if geocentric:
+                orbit = meteor.get_orbit()
+                radiants.append((orbit['ra_g'], orbit['dec_g']))
+                velocities.append(orbit['v_g'])
+            else:
+                radiants.append(meteor.get_radiant())
+                if self.velocity is not None:
+                    velocities.append(numpy.mean(meteor.get_kinematics()['initial_velocities']))
+
+            times.append(meteor.time)
+            labels.append(meteor.label)
+
+        if not labels:
+            return numpy.empty(0, dtype=int)
+
+        return self.add(numpy.reshape(radiants, (-1, 2)), velocities if velocities else None,
+                        Time(times) if self.longitude is not None else None, labels)
+
+    def query(self, radiant: numpy.ndarray, velocity: float = None,
+              time: Time = None, scale: float = 1.0) -> numpy.ndarray:
+        """Finds all stored radiants agreeing with a radiant
+
+        Args:
+            radiant (numpy.ndarray): RA and Dec in decimal degrees, shape (2,)
+            velocity (float): velocity in m/s, if the index has a velocity
+            tolerance
+            time (Time): time of the meteor, if the index has a solar
+            longitude tolerance
+            scale (float): Multiple of the tolerances to search within
+
+        Returns:
+            numpy.ndarray: sorted indices of the agreeing radiants
+        """
+
+        point = self._to_features(numpy.atleast_2d(numpy.asarray(radiant, dtype=float)),
+                                  velocity, self._solar_longitudes(time, 1))[0]
+
+        indices = self._tree.query_ball_point(point, scale, return_sorted=True) if self._tree_size else []
+
+        # Brute force search of the radiants added since the last rebuild
+        pending = self._features[self._tree_size:self._size]
+        close = numpy.flatnonzero(numpy.sum((pending - point) ** 2, axis=1) <= scale ** 2)
+
+        return numpy.concatenate((numpy.asarray(indices, dtype=int), close + self._tree_size))
+
+    def nearest(self, radiants: numpy.ndarray, velocities: numpy.ndarray = None,
+                times: Time = None, scale: float = 1.0) -> numpy.ndarray:
+        """Finds the nearest stored radiant agreeing with each radiant, e.g.
+        the shower of each meteor in an index created by from_showers
+
+        Args:
+            radiants (numpy.ndarray): RA and Dec in decimal degrees, shape
+            (2,) or (N, 2)
+            velocities (numpy.ndarray): velocities in m/s, shape (N,)
+            times (Time): times of the meteors, shape (N,)
+            scale (float): Multiple of the tolerances to search within
+
+        Returns:
+            numpy.ndarray: index of the nearest radiant, -1 where none
+            agrees, shape (N,)
+        """
+
+        radiants = numpy.atleast_2d(numpy.asarray(radiants, dtype=float))
+        points = self._to_features(radiants, velocities, self._solar_longitudes(times, len(radiants)))
+        self._rebuild()
+
+        distances, indices = self._tree.query(points, distance_upper_bound=scale)
+        return numpy.where(numpy.isfinite(distances), indices, -1)
+
+    def cluster(self, eps: float = 1.0, min_samples: int = 5) -> numpy.ndarray:
+        """Clusters all stored radiants with DBSCAN. Radiants with at least
+        min_samples radiants, themselves included, within eps tolerances
+        are cores, cores within eps of each other share a cluster and other
+        radiants join the cluster of a core within reach.
+
+        Args:
+            eps (float): Neighbourhood radius as a multiple of the tolerances
+            min_samples (int): Smallest neighbourhood of a core radiant
+
+        Returns:
+            numpy.ndarray: cluster index of each radiant, -1 for noise,
+            shape (N,)
+        """
+
+        self._rebuild()
+        pairs = self._tree.query_pairs(eps, output_type='ndarray')
+
+        counts = numpy.bincount(pairs.ravel(), minlength=self._size) + 1
+        core = counts >= min_samples
+
+        # Connected components of the graph of neighbouring cores
+        edges = pairs[core[pairs[:, 0]] & core[pairs[:, 1]]]
+        graph = coo_matrix((numpy.ones(len(edges)), (edges[:, 0], edges[:, 1])),
+                           shape=(self._size, self._size))
+        _, components = connected_components(graph, directed=False)
+
+        labels = numpy.full(self._size, -1)
+        _, labels[core] = numpy.unique(components[core], return_inverse=True)
+
+        # Border radiants join the cluster of one of their cores
+        border = pairs[core[pairs[:, 0]] != core[pairs[:, 1]]]
+        border = numpy.where(core[border[:, :1]], border, border[:, ::-1])
+        labels[border[:, 1]] = labels[border[:, 0]]
+
+        return labels
+
+    def _append(self, radiants, velocities, longitudes, labels) -> numpy.ndarray:
+        """Stores radiants and rebuilds the tree once the buffer is full"""
+
+        count = len(radiants)
+        features = self._to_features(radiants, velocities, longitudes)
+
+        if velocities is None:
+            velocities = numpy.full(count, numpy.nan)
+        if longitudes is None:
+            longitudes = numpy.full(count, numpy.nan)
+        if labels is None:
+            labels = range(self._size, self._size + count)
+
+        # Grow the storage geometrically
+        size = self._size + count
+        if size > len(self._features):
+            capacity = max(size, 2 * len(self._features), BUFFER_SIZE)
+            self._features = self._grow(self._features, capacity)
+            self.radiants = self._grow(self.radiants, capacity)
+            self.velocities = self._grow(self.velocities, capacity)
+            self.longitudes = self._grow(self.longitudes, capacity)
+
+        self._features[self._size:size] = features
+        self.radiants[self._size:size] = radiants
+        self.velocities[self._size:size] = numpy.broadcast_to(numpy.asarray(velocities, dtype=float), (count,))
+        self.longitudes[self._size:size] = longitudes
+        self.labels.extend(labels)
+
+        indices = numpy.arange(self._size, size)
+        self._size = size
+
+        if size - self._tree_size > max(BUFFER_SIZE, 4 * numpy.sqrt(self._tree_size)):
+            self._rebuild()
+
+        return indices
+
+    def _grow(self, array: numpy.ndarray, capacity: int) -> numpy.ndarray:
+        grown = numpy.empty((capacity,) + array.shape[1:])
+        grown[:self._size] = array[:self._size]
+        return grown
+
+    def _rebuild(self) -> None:
+        """Moves all buffered radiants into the tree"""
+
+        if self._tree_size == self._size:
+            return
+
+        self._tree = cKDTree(self._features[:self._size], balanced_tree=False, compact_nodes=False)
+        self._tree_size = self._size
+
+    def _solar_longitudes(self, times: Time, count: int) -> numpy.ndarray:
+        if self.longitude is None:
+            return None
+        if times is None:
+            raise ValueError("Times are required by an index with a solar longitude tolerance.")
+
+        times = Time(times)
+        return calculate_solar_longitudes(times.reshape((1,)) if times.isscalar else times) \
+            * numpy.ones(count)
+
+    def _to_features(self, radiants, velocities, longitudes) -> numpy.ndarray:
+        """Scales radiants, velocities and solar longitudes so that the
+        tolerances are at a distance of 1"""
+
+        ra, dec = numpy.radians(radiants).T
+        vectors = numpy.column_stack((numpy.cos(dec) * numpy.cos(ra),
+                                      numpy.cos(dec) * numpy.sin(ra),
+                                      numpy.sin(dec)))
+
+        # Chord lengths of the angular tolerances on the unit circle
+        features = [vectors / (2 * numpy.sin(numpy.radians(self.radius) / 2))]
+
+        if self.velocity is not None:
+            if velocities is None:
+                raise ValueError("Velocities are required by an index with a velocity tolerance.")
+            velocities = numpy.broadcast_to(numpy.asarray(velocities, dtype=float), (len(radiants),))
+            features.append(velocities[:, None] / self.velocity)
+
+        if self.longitude is not None:
+            longitudes = numpy.radians(longitudes)
+            features.append(numpy.column_stack((numpy.cos(longitudes), numpy.sin(longitudes)))
+                            / (2 * numpy.sin(numpy.radians(self.longitude) / 2)))
+
+        return numpy.hstack(features)
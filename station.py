@@ -64,7 +64,11 @@ class Station:
         self.time_zone = time_zone
         self.label = label
 
+        # Local sidereal times already calculated for given times
+        self.lst_cache = {}
+
         self.wcs_path = wcs_path
+        self.wcs_time = None
         if wcs_time != None:
             self.wcs_time = Time(wcs_time)
 
@@ -77,7 +81,8 @@ class Station:
                       client: AstrometryClient,
                       img_path: str,
                       job_id: int = None,
-                      prep: bool = False) -> None:
+                      prep: bool = False,
+                      data_path: str = None) -> None:
         """Do astrometry for the given image and save it as fixed camera
         astrometry. The resulting WCS file will be saved to the station's
         wcs_path.
@@ -88,26 +93,27 @@ class Station:
             job_id (int): job_id to use if astrometry was already calculated
             prep (bool): whether to preprocess the image before attempting
             to get astrometry
+            data_path (str): data.txt path of the image, needed to mask the
+            meteor when preprocessing
 
         Returns:
             None
         """
 
-        from coordinates import download_wcs_file, preprocess
+        from coordinates import download_wcs_file, preprocess_image
+        from store import get_wcs_store
 
         # Check if image has astrometry
         if job_id == None:
             # If no, try doing astrometry on the image
 
-            # Preprocess the image
-            if prep:
-                preprocess(img_path, data_path, 'tmp.jpg')
-                img_path = 'tmp.jpg'
+            # Preprocess the image in memory
+            image = preprocess_image(img_path, data_path) if prep else None
             
-            job_id = download_wcs_file(client, img_path, self.wcs_path)
+            job_id = download_wcs_file(client, img_path, self.wcs_path, image)
         else:
-            # If yes, download the WCS file
-            client.get_wcs_file(job_id, self.wcs_path)
+            # If yes, copy the WCS file from the store, downloading it if needed
+            get_wcs_store().get(client, job_id, self.wcs_path)
 
     def set_wcs(self, wcs_path: str, wcs_time: str) -> None:
         """Updates the WCS file path and calculation time
@@ -143,6 +149,26 @@ class Station:
                     + self.time_zone * u.hour
         self.lst = self.time.sidereal_time('mean').value / 24 * 360
 
+    def get_lst(self, time: Time) -> float:
+        """Returns the local mean sidereal time at the station for a time
+        given in the station's time zone. Results are cached per time.
+        
+        Args:
+            time (Time): Time in the station's time zone
+        Returns:
+            float: Local sidereal time in decimal degrees
+        """
+
+        time = Time(time)
+        key = (time.jd1, time.jd2)
+
+        if key not in self.lst_cache:
+            utc = Time(time, location=self.earth_location) \
+                  - self.time_zone * u.hour
+            self.lst_cache[key] = utc.sidereal_time('mean').value / 24 * 360
+
+        return self.lst_cache[key]
+
     def get_geodetic_lst(self, time: Time) -> dict:
         """Calculates the local sidereal time at station and returns the
         location information as dict
@@ -0,0 +1,512 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time as clock
+
+from astropy.time import Time
+import numpy
+
+# Default directory of the result store
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'results')
+
+# Default directory of the WCS store
+WCS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'wcs')
+
+# Modules whose source code determines the stored results
+CODE_MODULES = ('trajectory.py', 'coordinates.py', 'station.py', 'kinematics.py', 'modules.py')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    label TEXT,
+    job_ids TEXT,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS inputs (
+    key TEXT,
+    path TEXT,
+    digest TEXT
+);
+CREATE INDEX IF NOT EXISTS inputs_path ON inputs (path);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime INTEGER,
+    digest TEXT
+);
+'''
+
+_code_version = None
+
+def get_code_version() -> str:
+    """Returns a hash of the source code of the modules computing meteors,
+    so that stored results are not reused after the code changes
+
+    Returns:
+        str: hexadecimal SHA-1 digest
+    """
+
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for module in CODE_MODULES:
+            with open(os.path.join(directory, module), 'rb') as file:
+                digest.update(file.read())
+        _code_version = digest.hexdigest()
+
+    return _code_version
+
+class ResultStore:
+    """Persistent store of computed meteors. Each meteor is stored under a
+    key hashed from the contents of its input files, the station parameters,
+    the time and the code version, with its arrays in an .npz file and an
+    index in SQLite. Changing any input gives a new key, so only the
+    meteors depending on it are computed again.
+
+    Args:
+        directory (str): Directory of the store, cache/results by default
+
+    Usage:
+        ```python
+        store = ResultStore()
+        key = store.key(stations, time, data_paths)
+        meteor = store.load(key, 'label', stations, time)
+        if meteor is None:
+            meteor = Meteor('label', stations, observations, time)
+            store.save(key, meteor, data_paths)```
+    """
+
+    directory: str
+    connection: sqlite3.Connection
+
+    def __init__(self, directory: str = STORE_DIR) -> None:
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'blobs'), exist_ok=True)
+
+        # The connection is shared by the threads of the executor, every use
+        # of it holds the lock
+        self.connection = sqlite3.connect(os.path.join(directory, 'results.sqlite'),
+                                          check_same_thread=False)
+        self.lock = threading.RLock()
+        with self.lock:
+            self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+    def file_digest(self, path: str) -> str:
+        """Hashes the contents of a file. Digests are remembered by the size
+        and modification time of the file, so unchanged files are not read
+        again.
+
+        Args:
+            path (str): File path
+
+        Returns:
+            str: hexadecimal SHA-1 digest
+        """
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT digest FROM files WHERE path = ? AND size = ? AND mtime = ?',
+                (path, stat.st_size, stat.st_mtime_ns)
+            ).fetchone()
+        if row is not None:
+            return row[0]
+
+        digest = hashlib.sha1()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        digest = digest.hexdigest()
+
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                                    (path, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+    def key(self, stations: list, time: Time, data_paths: list[str],
+            img_paths: list[str] = None, **parameters) -> str:
+        """Calculates the key of a meteor from all of its inputs
+
+        Args:
+            stations (list[Station]): Stations, with their WCS files, a
+            WCS file which does not exist yet is keyed as missing
+            time (Time): Time of the meteor
+            data_paths (list[str]): data.txt files
+            img_paths (list[str]): Images, if astrometry is used
+            **parameters: Other parameters affecting the results
+
+        Returns:
+            str: hexadecimal SHA-1 digest
+        """
+
+        inputs = {
+            'code': get_code_version(),
+            'time': Time(time).isot,
+            'data': [self.file_digest(path) for path in data_paths],
+            'images': [self.file_digest(path) if path else None for path in img_paths] if img_paths else None,
+            'stations': [
+                (station.lat, station.lon, station.height, station.time_zone,
+                 self._wcs_digest(station.wcs_path),
+                 Time(station.wcs_time).isot if station.wcs_path and station.wcs_time is not None else None)
+                for station in stations
+            ],
+            'parameters': sorted(parameters.items()),
+        }
+
+        return hashlib.sha1(json.dumps(inputs, default=str).encode()).hexdigest()
+
+    def load(self, key: str, label: str, stations: list, time: Time):
+        """Loads a stored meteor with its stored results
+
+        Args:
+            key (str): Key from key()
+            label (str): Meteor label
+            stations (list[Station]): Stations of the meteor
+            time (Time): Time of the meteor
+
+        Returns:
+            Meteor: the meteor, or None if it is not stored
+        """
+
+        from trajectory import Meteor, Trajectory
+
+        with self.lock:
+            row = self.connection.execute('SELECT job_ids FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+
+        try:
+            with numpy.load(self._blob_path(key), allow_pickle=False) as blob:
+                arrays = {name: blob[name] for name in blob.files}
+        except (OSError, ValueError) as e:
+            logging.warning(f'Stored meteor {key} could not be read: {e}')
+            self.delete(key)
+            return None
+
+        ends = numpy.cumsum(arrays['counts'])[:-1]
+        observations = [
+            numpy.column_stack((coordinates, times)).tolist()
+            for coordinates, times in zip(numpy.split(arrays['observations'], ends),
+                                          numpy.split(arrays['times'], ends))
+        ]
+
+        meteor = Meteor(label, stations, observations, time, json.loads(row[0]))
+
+        # Results are assigned in the order of their dependencies
+        if 'radiant' in arrays:
+            meteor.radiant = arrays['radiant'].tolist()
+            meteor.Q_angle = float(arrays['Q_angle'])
+        if 'trajectory' in arrays:
+            meteor.trajectory = Trajectory(arrays['trajectory'], arrays['order'])
+            meteor.velocities = numpy.split(arrays['velocities'], numpy.cumsum(arrays['counts'] - 1)[:-1])
+
+        return meteor
+
+    def save(self, key: str, meteor, paths: list[str] = ()) -> None:
+        """Calculates the main results of a meteor and stores them. Results
+        which cannot be calculated are left out.
+
+        Args:
+            key (str): Key from key()
+            meteor (Meteor): Meteor to store
+            paths (list[str]): Input files of the meteor, for invalidate()
+        """
+
+        arrays = {
+            'observations': numpy.concatenate([numpy.reshape(coordinates, (-1, 2)) for coordinates in meteor.observations]),
+            'times': numpy.concatenate([numpy.asarray(times, dtype=float) for times in meteor.times]),
+            'counts': numpy.array([len(times) for times in meteor.times]),
+        }
+
+        try:
+            arrays['radiant'] = numpy.asarray(meteor.get_radiant(), dtype=float)
+            arrays['Q_angle'] = numpy.asarray(meteor.get_Q_angle(), dtype=float)
+
+            trajectory = meteor.get_trajectory()
+            arrays['trajectory'] = trajectory.data
+            arrays['order'] = trajectory.order
+            arrays['velocities'] = numpy.concatenate(meteor.get_velocities())
+        except Exception as e:
+            logging.warning(f'Results of meteor {meteor.label} are not stored: {e}')
+            for name in ('radiant', 'Q_angle', 'trajectory', 'order', 'velocities'):
+                arrays.pop(name, None)
+
+        # Write the arrays first and replace any previous file atomically
+        path = self._blob_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npz')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                numpy.savez(file, **arrays)
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+        # Digests are calculated first, so that the meteor and its inputs are
+        # written in one transaction
+        inputs = [(key, os.path.abspath(path), self.file_digest(path)) for path in paths]
+
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                                    (key, str(meteor.label), json.dumps(list(meteor.job_ids or []), default=str),
+                                     clock.time()))
+            self.connection.execute('DELETE FROM inputs WHERE key = ?', (key,))
+            self.connection.executemany('INSERT INTO inputs VALUES (?, ?, ?)', inputs)
+
+    def invalidate(self, path: str) -> int:
+        """Deletes all stored meteors computed from a file
+
+        Args:
+            path (str): Input file path
+
+        Returns:
+            int: number of deleted meteors
+        """
+
+        with self.lock:
+            keys = [row[0] for row in self.connection.execute(
+                'SELECT DISTINCT key FROM inputs WHERE path = ?', (os.path.abspath(path),)
+            )]
+        for key in keys:
+            self.delete(key)
+
+        return len(keys)
+
+    def prune(self) -> int:
+        """Deletes stored meteors whose input files have changed or
+        disappeared since they were stored
+
+        Returns:
+            int: number of deleted meteors
+        """
+
+        stale = set()
+        with self.lock:
+            inputs = self.connection.execute('SELECT key, path, digest FROM inputs').fetchall()
+
+        for key, path, digest in inputs:
+            try:
+                if self.file_digest(path) != digest:
+                    stale.add(key)
+            except OSError:
+                stale.add(key)
+
+        for key in stale:
+            self.delete(key)
+
+        return len(stale)
+
+    def delete(self, key: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM results WHERE key = ?', (key,))
+            self.connection.execute('DELETE FROM inputs WHERE key = ?', (key,))
+
+        try:
+            os.remove(self._blob_path(key))
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            return self.connection.execute('SELECT 1 FROM results WHERE key = ?', (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def _wcs_digest(self, path: str) -> str:
+        if not path:
+            return None
+        if not os.path.exists(path):
+            return 'missing'
+
+        return self.file_digest(path)
+
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self.directory, 'blobs', key[:2], f'{key}.npz')
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_result_store() -> ResultStore:
+    """Returns the shared result store in the default directory
+
+    Returns:
+        ResultStore
+    """
+
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore()
+
+    return _store
+
+def _replace_atomically(path: str, write) -> None:
+    """Writes a file under a temporary name next to it and renames it to
+    path, so that readers never see a partially written file
+
+    Args:
+        path (str): Final path of the file
+        write (callable): Called with the temporary path, writes the file
+    """
+
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        write(temporary)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+class WcsStore:
+    """Persistent store of WCS files from astrometry.net. Each file is
+    stored under its job ID, and uploaded images are remembered by the hash
+    of their contents, so the same image is not solved again and the same
+    job is not downloaded again. Files are written under temporary names
+    and renamed, so concurrent workers never read a partial file.
+
+    Args:
+        directory (str): Directory of the store, cache/wcs by default
+
+    Usage:
+        ```python
+        store = WcsStore()
+        job_id = store.find(store.image_digest(image))
+        if job_id is None:
+            job_id = ...  # solve the image
+            store.remember(store.image_digest(image), job_id)
+        wcs_path = store.get(client, job_id)```
+    """
+
+    directory: str
+
+    def __init__(self, directory: str = WCS_DIR) -> None:
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'jobs'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'images'), exist_ok=True)
+
+    @staticmethod
+    def image_digest(image: bytes) -> str:
+        """Hashes the contents of an image
+
+        Args:
+            image (bytes): Contents of the image file
+
+        Returns:
+            str: hexadecimal SHA-1 digest
+        """
+
+        return hashlib.sha1(image).hexdigest()
+
+    def path(self, job_id: int) -> str:
+        """Returns the path of the stored WCS file of a job, which exists
+        only after get()
+
+        Args:
+            job_id (int): astrometry.net job ID
+
+        Returns:
+            str: WCS file path
+        """
+
+        return os.path.join(self.directory, 'jobs', f'{int(job_id)}.wcs')
+
+    def find(self, digest: str) -> int:
+        """Finds the job which solved an image
+
+        Args:
+            digest (str): Image digest from image_digest()
+
+        Returns:
+            int: job ID, None if the image was not solved yet
+        """
+
+        try:
+            with open(self._image_path(digest), 'r') as file:
+                return int(file.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def remember(self, digest: str, job_id: int) -> None:
+        """Remembers the job which solved an image
+
+        Args:
+            digest (str): Image digest from image_digest()
+            job_id (int): astrometry.net job ID
+        """
+
+        def write(path):
+            with open(path, 'w') as file:
+                file.write(str(int(job_id)))
+
+        _replace_atomically(self._image_path(digest), write)
+
+    def get(self, client, job_id: int, wcs_path: str = None) -> str:
+        """Returns the WCS file of a job, downloading it only if it is not
+        stored yet
+
+        Args:
+            client (AstrometryClient): client to use for the download
+            job_id (int): astrometry.net job ID
+            wcs_path (str): Path, where a copy of the WCS file should be
+            saved, optional
+
+        Returns:
+            str: wcs_path if set, otherwise the path of the stored file,
+            None if the file could not be downloaded
+        """
+
+        path = self.path(job_id)
+        if not os.path.exists(path):
+            def download(temporary):
+                client.get_wcs_file(job_id, temporary)
+                if not os.path.exists(temporary) or not os.path.getsize(temporary):
+                    raise FileNotFoundError(f'WCS file of job {job_id} was not downloaded')
+
+            try:
+                _replace_atomically(path, download)
+            except FileNotFoundError as e:
+                logging.error(e)
+                return None
+
+        if wcs_path is None:
+            return path
+
+        def copy(temporary):
+            with open(path, 'rb') as source, open(temporary, 'wb') as target:
+                target.write(source.read())
+
+        _replace_atomically(wcs_path, copy)
+        return wcs_path
+
+    def _image_path(self, digest: str) -> str:
+        return os.path.join(self.directory, 'images', digest)
+
+_wcs_store = None
+
+def get_wcs_store() -> WcsStore:
+    """Returns the shared WCS store in the default directory
+
+    Returns:
+        WcsStore
+    """
+
+    global _wcs_store
+    with _store_lock:
+        if _wcs_store is None:
+            _wcs_store = WcsStore()
+
+    return _wcs_store
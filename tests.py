@@ -1,4 +1,5 @@
 from trajectory import *
+from export import export_trajectories
 import numpy
 
 def test_fixed_wcs_astrometry():
@@ -71,6 +72,1147 @@ def test_radiant_calculation() -> None:
     
     print('Passed test_radiant_calculation')
 
+def test_plane_intersection_engine():
+    """Tests the vectorized plane intersection against the per-point solver"""
+
+    ondrejov = Station(lat=49.970222, lon=14.780208, height=524, time_zone=1)
+    kunzak = Station(lat=49.107290, lon=15.200930, height=656, time_zone=1)
+    time = Time('2018-10-8 22:03:54')
+
+    meteor_ondrejov = [[358.647, 8.286], [359.220, 7.233], [0.243, 5.505], [1.169, 3.964], [2.745, 1.380]]
+    meteor_kunzak = [[327.429, 37.968], [328.218, 37.286], [329.500, 36.117], [330.790, 34.832], [332.641, 32.760]]
+
+    vector_a = calculate_meteor_plane(meteor_ondrejov) + ondrejov.get_geocentric_lst(time)
+    vector_b = calculate_meteor_plane(meteor_kunzak) + kunzak.get_geocentric_lst(time)
+
+    batched = calculate_meteor_point_vectors(meteor_ondrejov, vector_a, vector_b)
+
+    # Check the results
+    for i, point in enumerate(meteor_ondrejov):
+        single = calculate_meteor_point_vector(point, vector_a, vector_b)
+        assert numpy.allclose(batched[i], single, atol=1e-3), \
+               f'{batched[i]} is not {single}'
+
+    print('Passed test_plane_intersection_engine')
+
+def test_geodetic_conversion():
+    """Tests the WGS84 array converters against astropy's EarthLocation"""
+
+    from astropy.coordinates import EarthLocation
+
+    rng = numpy.random.default_rng(2024)
+    lat = numpy.concatenate(([90, -90, 0, 49.970222], rng.uniform(-90, 90, 1000)))
+    lon = numpy.concatenate(([0, 180, -180, 14.780208], rng.uniform(-180, 180, 1000)))
+    height = numpy.concatenate(([0, 0, 0, 524], rng.uniform(-1000, 2e6, 1000)))
+
+    location = EarthLocation.from_geodetic(lon * u.deg, lat * u.deg, height * u.m)
+    expected = location.geodetic
+
+    # Geodetic to geocentric, millimetre level
+    X, Y, Z = geodetic_to_geocentric_array(lat, lon, height)
+    for calculated, reference in ((X, location.x), (Y, location.y), (Z, location.z)):
+        assert numpy.allclose(calculated, reference.to_value(u.m), rtol=0, atol=1e-3), \
+               f'Geocentric error {numpy.max(numpy.abs(calculated - reference.to_value(u.m)))} m'
+
+    # Geocentric to geodetic, millimetre level along the surface and in height
+    calc_lat, calc_lon, calc_height = geocentric_to_geodetic_array(
+        location.x.to_value(u.m), location.y.to_value(u.m), location.z.to_value(u.m))
+
+    lon_error = (calc_lon - expected.lon.degree + 180) % 360 - 180
+    lon_error = lon_error * numpy.cos(numpy.radians(lat))
+    assert numpy.allclose(calc_height, expected.height.to_value(u.m), rtol=0, atol=1e-3)
+    assert numpy.allclose(numpy.radians(calc_lat - expected.lat.degree) * 6.4e6, 0, atol=1e-3)
+    assert numpy.allclose(numpy.radians(lon_error) * 6.4e6, 0, atol=1e-3)
+
+    print('Passed test_geodetic_conversion')
+
+def test_trajectory_views():
+    """Tests that per-station trajectory views share the trajectory buffer"""
+
+    trajectory = Trajectory.from_arrays(
+        lat=[50.0, 49.9, 50.1, 49.8], lon=[15.0, 15.1, 14.9, 15.2],
+        height=[90e3, 80e3, 85e3, 70e3],
+        X=[1, 2, 3, 4], Y=[1, 2, 3, 4], Z=[1, 2, 3, 4],
+        t=[0.0, 0.1, 0.0, 0.1],
+        station=[0, 1, 0, 1]
+    )
+    trajectory.order = numpy.array([1, 0, 3, 2])
+
+    station_a, station_b = trajectory.station(0), trajectory.station(1)
+
+    # Check the results
+    assert numpy.shares_memory(station_a.data, trajectory.data)
+    assert numpy.shares_memory(station_b.data, trajectory.data)
+    assert list(station_a['height']) == [90e3, 85e3]
+    assert list(station_b['height']) == [80e3, 70e3]
+    assert list(trajectory.merged()['height']) == [85e3, 90e3, 70e3, 80e3]
+    assert list(trajectory['height'][trajectory.order]) == [85e3, 90e3, 70e3, 80e3]
+
+    # Merged in the stored order, the merged trajectory is not copied
+    trajectory.order = numpy.arange(4)
+    assert numpy.shares_memory(trajectory.merged().data, trajectory.data)
+
+    print('Passed test_trajectory_views')
+
+def test_trajectory_resampling():
+    """Tests the merge and resampling of trajectories from two stations"""
+
+    # Two stations observing a straight line at different times
+    start = numpy.array(geodetic_to_geocentric_array(50.0, 15.0, 100e3))
+    end = numpy.array(geodetic_to_geocentric_array(49.5, 15.5, 60e3))
+    t = numpy.array([0.0, 0.2, 0.4, 0.6, 0.1, 0.3, 0.5, 0.7])
+    X, Y, Z = (start + numpy.outer(t, end - start)).T
+    lat, lon, height = geocentric_to_geodetic_array(X, Y, Z)
+
+    trajectory = Trajectory.from_arrays(lat, lon, height, X, Y, Z, t,
+                                        station=[0, 0, 0, 0, 1, 1, 1, 1])
+
+    trajectory.merge('height')
+    assert numpy.all(numpy.diff(trajectory.merged()['height']) < 0)
+    trajectory.merge('t')
+    assert numpy.allclose(trajectory.merged()['t'], numpy.arange(8) / 10)
+
+    # Only the times covered by both stations are used
+    for kind in ('linear', 'spline'):
+        resampled = trajectory.resample(kind=kind)
+        station_a, station_b = resampled.station(0), resampled.station(1)
+
+        assert numpy.allclose(station_a['t'], [0.1, 0.2, 0.3, 0.4, 0.5, 0.6])
+        assert numpy.allclose(station_a.geocentric, station_b.geocentric, atol=1e-3)
+        assert numpy.allclose(station_a['height'], station_b['height'], atol=1e-3)
+
+    # Station times starting at their own first frame are aligned by offsets
+    shifted = Trajectory.from_arrays(lat, lon, height, X, Y, Z, t - numpy.repeat([0.0, 0.1], 4),
+                                     station=[0, 0, 0, 0, 1, 1, 1, 1])
+    offsets = numpy.array([0.0, 0.1])
+    shifted.merge('t', offsets)
+    assert numpy.allclose(shifted.station_times(offsets)[shifted.order], numpy.arange(8) / 10)
+
+    resampled = shifted.resample(offsets=offsets)
+    station_a, station_b = resampled.station(0), resampled.station(1)
+    assert numpy.allclose(station_a['t'], [0.1, 0.2, 0.3, 0.4, 0.5, 0.6])
+    assert numpy.allclose(station_a.geocentric, station_b.geocentric, atol=1e-3)
+
+    print('Passed test_trajectory_resampling')
+
+def test_meteor_batch():
+    """Tests the batched radiant calculation against single meteors"""
+
+    ondrejov = Station(lat=49.970222, lon=14.780208, height=524, time_zone=1)
+    kunzak = Station(lat=49.107290, lon=15.200930, height=656, time_zone=1)
+
+    meteor_ondrejov = [[358.647, 8.286, 1.0046], [359.220, 7.233, 1.1358], [0.243, 5.505, 1.3489], [1.169, 3.964, 1.5456], [2.745, 1.380, 1.9063]]
+    meteor_kunzak = [[327.429, 37.968, 0.9655], [328.218, 37.286, 1.1130], [329.500, 36.117, 1.3097], [330.790, 34.832, 1.5228], [332.641, 32.760, 1.8507]]
+
+    meteors = [
+        Meteor('a', [ondrejov, kunzak], [meteor_ondrejov, meteor_kunzak], Time('2018-10-8 22:03:54')),
+        Meteor('b', [kunzak, ondrejov], [meteor_kunzak, meteor_ondrejov[:4]], Time('2018-10-9 03:03:54')),
+    ]
+
+    batch = MeteorBatch.from_meteors(meteors)
+    radiants = batch.get_radiants()
+    angles = batch.get_Q_angles()
+
+    # Check the results
+    for i, meteor in enumerate(meteors):
+        assert numpy.allclose(radiants[i], meteor.get_radiant()), \
+               f'{radiants[i]} is not {meteor.get_radiant()}'
+        assert numpy.isclose(angles[i], meteor.get_Q_angle()), \
+               f'{angles[i]} is not {meteor.get_Q_angle()}'
+
+    print('Passed test_meteor_batch')
+
+def test_horizon_check():
+    """Tests the sidereal time altitude against the full astropy transform"""
+
+    ondrejov = Station(lat=49.970222, lon=14.780208, height=524, time_zone=1)
+    time = Time('2024-01-08 23:52:57')
+
+    rng = numpy.random.default_rng(2024)
+    ra = rng.uniform(0, 360, 200)
+    dec = rng.uniform(-90, 90, 200)
+
+    fast = world_to_altitude_array(ra, dec, [ondrejov] * len(ra), Time([time] * len(ra)))
+    full, _ = world_to_altaz_array(ra, dec, [ondrejov] * len(ra), Time([time] * len(ra)))
+
+    # Check the results
+    assert numpy.all(numpy.sign(fast) == numpy.sign(full))
+    assert numpy.allclose(fast, full, atol=HORIZON_TOLERANCE)
+
+    for i in range(5):
+        alt = world_to_altitude(ra[i], dec[i], ondrejov, time)
+        assert numpy.sign(alt) == numpy.sign(full[i]), f'{alt} is not {full[i]}'
+
+    print('Passed test_horizon_check')
+
+def _synthetic_path(stations: list[Station], time: Time) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Returns the 12 points and the direction of flight of a straight
+    synthetic meteor path above the first station, in the sidereal frame of
+    the stations"""
+
+    position = numpy.array(stations[0].get_geocentric_lst(time))
+    zenith = position / numpy.linalg.norm(position)
+    start = position * (1 + 100e3 / numpy.linalg.norm(position)) + numpy.array([20e3, 40e3, 0])
+    direction = numpy.cross(zenith, [0, 0, 1]) - 0.8 * zenith
+    direction = direction / numpy.linalg.norm(direction)
+
+    return start + numpy.outer(numpy.linspace(0, 30e3, 12), direction), direction
+
+def _synthetic_observations(stations: list[Station], time: Time) -> list[numpy.ndarray]:
+    """Returns the observations of the synthetic meteor path from every
+    station, in RA, Dec and seconds"""
+
+    points, _ = _synthetic_path(stations, time)
+
+    observations = []
+    for station in stations:
+        sight = points - numpy.array(station.get_geocentric_lst(time))
+        sight = sight / numpy.linalg.norm(sight, axis=1)[:, None]
+        ra, dec = solve_goniometry_array(sight)
+        observations.append(numpy.column_stack((ra, dec, numpy.linspace(0, 1, len(points)))))
+
+    return observations
+
+def test_multi_station_meteor():
+    """Tests the radiant and trajectory of a synthetic meteor seen from
+    three stations"""
+
+    time = Time('2024-01-08 23:52:57')
+    stations = [
+        Station(lat=49.970222, lon=14.780208, height=524, label='Ondřejov'),
+        Station(lat=49.107290, lon=15.200930, height=656, label='Kunžak'),
+        Station(lat=49.560000, lon=16.400000, height=400, label='C'),
+    ]
+
+    # Straight meteor path in the sidereal frame of the stations
+    points, direction = _synthetic_path(stations, time)
+    observations = _synthetic_observations(stations, time)
+
+    meteor = Meteor('test', stations, observations, time)
+
+    # Radiant is opposite to the direction of flight
+    expected = solve_goniometry_array([-direction])
+    assert numpy.allclose(meteor.get_radiant(), numpy.ravel(expected), atol=1e-6), \
+           f'Should be {numpy.ravel(expected)}, not {meteor.get_radiant()}'
+    assert len(meteor.get_Q_angles()) == 3
+
+    # Every station's points lie on the meteor path
+    GST = time.sidereal_time('mean', 'greenwich').value / 24 * 360
+    lat, lon, height = geocentric_to_geodetic_array(*points.T)
+    for trajectory in meteor.get_trajectories_geodetic():
+        assert numpy.allclose(trajectory['height'], height, atol=1e-2)
+        assert numpy.allclose(trajectory['lon'], lon - GST, atol=1e-6)
+
+    assert len(meteor.get_velocities()) == 3
+
+    # The least-squares engine recovers the same path
+    meteor = Meteor('test', stations, observations, time, engine='lsq')
+    assert numpy.allclose(meteor.get_radiant(), numpy.ravel(expected), atol=1e-6), \
+           f'Should be {numpy.ravel(expected)}, not {meteor.get_radiant()}'
+    assert numpy.allclose(meteor.get_residuals(), 0, atol=1e-2)
+    for trajectory in meteor.get_trajectories_geodetic():
+        assert numpy.allclose(trajectory['height'], height, atol=1e-2)
+
+    print('Passed test_multi_station_meteor')
+
+def test_uncertainty_estimation():
+    """Tests the Monte Carlo uncertainty of a synthetic meteor seen from
+    three stations"""
+
+    time = Time('2024-01-08 23:52:57')
+    stations = [
+        Station(lat=49.970222, lon=14.780208, height=524, label='Ondřejov'),
+        Station(lat=49.107290, lon=15.200930, height=656, label='Kunžak'),
+        Station(lat=49.560000, lon=16.400000, height=400, label='C'),
+    ]
+
+    observations = _synthetic_observations(stations, time)
+
+    for engine in ('plane', 'lsq'):
+        meteor = Meteor('test', stations, observations, time, engine=engine)
+
+        # Without noise all samples are the nominal solution
+        uncertainty = meteor.estimate_uncertainty(n_samples=20, sigma=0, seed=0)
+        assert numpy.allclose(uncertainty['radiant'], 0, atol=1e-9)
+        for heights in uncertainty['heights']:
+            assert numpy.allclose(heights, 0, atol=1e-3)
+
+        # Noise spreads the radiant and the heights of every station
+        uncertainty = meteor.estimate_uncertainty(n_samples=500, sigma=0.01, seed=0)
+        assert all(0 < value < 1 for value in uncertainty['radiant'])
+        assert len(uncertainty['heights']) == 3
+        for heights, velocities in zip(uncertainty['heights'], uncertainty['velocities']):
+            assert heights.shape == (12,) and numpy.all(heights > 0)
+            assert velocities.shape == (11,) and numpy.all(numpy.isfinite(velocities))
+
+    print('Passed test_uncertainty_estimation')
+
+def test_kinematics_fit():
+    """Tests the path lengths and the fits of the linear and deceleration
+    models on synthetic tracks"""
+
+    # Points along a straight line with the Whipple-Jacchia motion
+    times = numpy.tile(numpy.linspace(0, 0.8, 40), 2)
+    tracks = numpy.repeat([0, 1], 40)
+    parameters = numpy.array([[0, 30e3, 20, 6], [0, 45e3, 5, 7]])
+
+    l0, v, a1, a2 = parameters[tracks].T
+    lengths = l0 + v * times - a1 * numpy.exp(a2 * times) + a1
+    points = numpy.outer(lengths, [0.6, 0.8, 0]) + [4e6, 3e6, 4e6]
+
+    assert numpy.allclose(calculate_path_lengths(points, tracks), lengths)
+
+    linear, residuals = fit_linear_models(lengths, times, tracks)
+    assert linear.shape == (2, 2) and residuals.shape == (80,)
+
+    deceleration, residuals = fit_deceleration_models(lengths, times, tracks)
+    assert numpy.allclose(deceleration[:, 1:], parameters[:, 1:], rtol=1e-4)
+    assert numpy.allclose(residuals, 0, atol=1e-3)
+
+    velocities = calculate_model_velocities(deceleration, 0)
+    assert numpy.allclose(velocities, [30e3 - 120, 45e3 - 35], rtol=1e-5)
+
+    # Tracks too short for a model are not fitted
+    short = numpy.append(tracks[:44], [2, 2, 2, 3])
+    lengths, times = lengths[:48], numpy.append(times[:44], [0, 0.1, 0.2, 0])
+
+    deceleration, residuals = fit_deceleration_models(lengths, times, short)
+    assert numpy.allclose(deceleration[0, 1:], parameters[0, 1:], rtol=1e-4)
+    assert numpy.all(numpy.isfinite(deceleration[1])) and numpy.all(numpy.isnan(deceleration[2:]))
+    assert numpy.all(numpy.isnan(residuals[44:])) and numpy.all(numpy.isfinite(residuals[:44]))
+
+    linear, residuals = fit_linear_models(lengths, times, short)
+    assert numpy.all(numpy.isfinite(linear[:3])) and numpy.all(numpy.isnan(linear[3]))
+
+    print('Passed test_kinematics_fit')
+
+def test_computed_results():
+    """Tests memoization and invalidation of the computed Meteor results"""
+
+    time = Time('2024-01-08 23:52:57')
+    stations = [
+        Station(lat=49.970222, lon=14.780208, height=524, label='Ondřejov'),
+        Station(lat=49.107290, lon=15.200930, height=656, label='Kunžak'),
+    ]
+
+    # Straight meteor path seen from both stations
+    observations = _synthetic_observations(stations, time)
+
+    meteor = Meteor('test', stations, observations, time)
+
+    # Results are computed once and shared by later stages
+    radiant = meteor.get_radiant()
+    meteor.get_velocities()
+    meteor.get_velocities()
+    trajectory = meteor.get_trajectory()
+
+    info = meteor.cache_info()
+    assert info['positions'] == {'hits': 0, 'misses': 1}
+    assert info['velocities'] == {'hits': 1, 'misses': 1}
+    assert info['trajectory']['misses'] == 1
+
+    # Changing an input recomputes only the results depending on it
+    meteor.time = Time('2024-01-08 23:53:57')
+    assert meteor.get_trajectory() is not trajectory
+    assert meteor.get_radiant() is not radiant
+
+    info = meteor.cache_info()
+    assert info['positions']['misses'] == 2
+    assert info['planes'] == {'hits': 2, 'misses': 1}
+
+    # Explicit invalidation after changing observations in place
+    meteor.observations[0] = [(ra + 0.01, dec) for ra, dec in meteor.observations[0]]
+    meteor.invalidate('observations')
+    assert meteor.cache_info()['planes']['misses'] == 1
+    meteor.get_Q_angle()
+    assert meteor.cache_info()['planes']['misses'] == 2
+
+    # Distances are straight from the first point, path lengths add segments
+    for distances, lengths in zip(meteor.get_distances(), meteor.get_path_lengths()):
+        assert distances[0] == 0 and numpy.all(lengths >= distances - 1e-6)
+
+    # Trajectories too short for the deceleration model are left out
+    short = Meteor('short', stations, [observations[0][:3], observations[1]], time)
+    assert numpy.isnan(short.get_kinematics()['initial_velocities'][0])
+    assert numpy.isfinite(short.get_orbit()['v_g'])
+
+    print('Passed test_computed_results')
+
+def test_orbit_calculation():
+    """Tests the Earth ephemeris and the orbit of a Perseid meteor"""
+
+    from astropy.coordinates import get_body_barycentric_posvel
+    import astropy.units as u
+
+    # Earth state against the built-in astropy ephemeris
+    times = Time(['2010-03-01 00:00:00', '2024-01-08 23:52:57'])
+    positions, velocities = calculate_earth_state(times)
+
+    earth, earth_velocity = get_body_barycentric_posvel('earth', times)
+    sun, sun_velocity = get_body_barycentric_posvel('sun', times)
+    expected_positions = equatorial_to_ecliptic((earth.xyz - sun.xyz).to(u.m).value.T)
+    expected_velocities = equatorial_to_ecliptic((earth_velocity.xyz - sun_velocity.xyz).to(u.m / u.s).value.T)
+
+    assert numpy.all(numpy.linalg.norm(positions - expected_positions, axis=1) < 2e-4 * AU)
+    assert numpy.all(numpy.linalg.norm(velocities - expected_velocities, axis=1) < 30)
+
+    # Perseid with q = 0.95 AU, i = 113, omega = 151 and node = 140 degrees
+    time = Time('2023-08-13 01:00:00')
+    lst = time.sidereal_time('mean', longitude=14.78).degree
+    position = geodetic_to_geocentric_array(49.97, lst, 100e3)
+    orbit = calculate_orbits([[48.2, 58.1]], [59.6e3], [position], time)[0]
+
+    assert abs(orbit['q'] - 0.95) < 0.02, f'Should be 0.95, not {orbit["q"]}'
+    assert abs(orbit['i'] - 113) < 2, f'Should be 113, not {orbit["i"]}'
+    assert abs(orbit['omega'] - 151) < 5, f'Should be 151, not {orbit["omega"]}'
+    assert abs(orbit['node'] - 140) < 1, f'Should be 140, not {orbit["node"]}'
+    assert orbit['v_g'] < 59.6e3
+
+    print('Passed test_orbit_calculation')
+
+def test_trajectory_export():
+    """Tests the streaming export of many meteors into GPX, KML and CSV"""
+
+    import os
+    import tempfile
+    import xml.dom.minidom
+
+    time = Time('2024-01-08 23:52:57')
+    stations = [
+        Station(lat=49.970222, lon=14.780208, height=524, label='Ondřejov'),
+        Station(lat=49.107290, lon=15.200930, height=656, label='Kunžak'),
+    ]
+
+    observations = _synthetic_observations(stations, time)
+
+    meteor = Meteor('test', stations, observations, time)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # All meteors of a generator in one file
+        for format in ('gpx', 'kml'):
+            path = os.path.join(directory, f'night.{format}')
+            count = export_trajectories((meteor for _ in range(3)), path)
+            assert count == 3
+
+            document = xml.dom.minidom.parse(path)
+            points = document.getElementsByTagName('trkpt' if format == 'gpx' else 'LineString')
+            assert len(points) == (72 if format == 'gpx' else 3)
+
+        path = os.path.join(directory, 'night.csv')
+        assert export_trajectories([meteor, meteor], path) == 2
+        with open(path) as file:
+            rows = file.read().splitlines()
+        assert rows[0] == 'label,station,t,lat,lon,height' and len(rows) == 49
+        assert all(-180 <= float(row.split(',')[4]) < 180 for row in rows[1:])
+
+        # One file for each meteor
+        class Broken:
+            """Meteor whose trajectory cannot be calculated"""
+
+            label = 'broken'
+
+            def __init__(self, stations):
+                self.stations = stations
+
+            def get_trajectory(self):
+                raise ValueError('No trajectory')
+
+        count = export_trajectories([meteor, Broken(stations)], os.path.join(directory, 'meteors'), 'gpx', separate=True)
+        assert count == 1 and os.listdir(os.path.join(directory, 'meteors')) == ['test.gpx']
+
+    print('Passed test_trajectory_export')
+
+def test_map_background():
+    """Tests that the trajectory map background is rendered only once"""
+
+    import os
+    import tempfile
+    import trajectory
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache_dir, trajectory.MAP_CACHE_DIR = trajectory.MAP_CACHE_DIR, directory
+        trajectory.map_backgrounds.clear()
+        try:
+            m, background = get_map_background('black')
+            assert background.ndim == 3 and background.shape[2] == 4
+            assert len(os.listdir(directory)) == 1
+
+            # Same objects from memory, same image from disk
+            assert get_map_background('black')[1] is background
+            trajectory.map_backgrounds.clear()
+            m_loaded, loaded = get_map_background('black')
+            assert numpy.array_equal(loaded, background)
+            assert numpy.allclose((m_loaded.xmax, m_loaded.ymax), (m.xmax, m.ymax))
+        finally:
+            trajectory.MAP_CACHE_DIR = cache_dir
+            trajectory.map_backgrounds.clear()
+
+    print('Passed test_map_background')
+
+def test_headless_rendering():
+    """Tests rendering plots of many meteors into files in worker processes"""
+
+    import os
+    import tempfile
+    import cv2 as cv
+    from render import render_meteors, render_meteor_images
+
+    time = Time('2024-01-08 23:52:57')
+    stations = [
+        Station(lat=49.970222, lon=14.780208, height=524, label='Ondřejov'),
+        Station(lat=49.107290, lon=15.200930, height=656, label='Kunžak'),
+    ]
+
+    observations = _synthetic_observations(stations, time)
+
+    meteors = [Meteor(f'test{i}', stations, observations, time) for i in range(3)]
+    config = {'plt_style': 'dark', 'map_style': 'default', 'meteor_plot_theme': 'bone'}
+
+    with tempfile.TemporaryDirectory() as directory:
+        # In this process and in a pool of workers
+        paths = render_meteors(meteors, directory, ('trajectory', 'velocities'), processes=1, config=config)
+        assert len(paths) == 6
+        paths = render_meteors(meteors, directory, ('radiant',), 'svg', processes=2, config=config)
+        assert sorted(os.path.basename(path) for path in paths) == ['test0_radiant.svg', 'test1_radiant.svg', 'test2_radiant.svg']
+        assert all(os.path.getsize(path) > 0 for path in paths)
+
+        # Sky images, a missing image is skipped
+        image = os.path.join(directory, 'Ondrejov', 'night', 'meteor.jpg')
+        os.makedirs(os.path.dirname(image))
+        cv.imwrite(image, numpy.zeros((120, 160), numpy.uint8))
+
+        paths = render_meteor_images([
+            ('001', [image, image], [(10, 20), (50, 60)], [(15, 25), (55, 65)], [(5, 5), (90, 40)], []),
+            ('002', [image, 'missing.jpg'], [(10, 20), (50, 60)], [(15, 25), (55, 65)], None, None),
+        ], directory, processes=1, config=config)
+        assert paths == [os.path.join(directory, '001.png')]
+
+    print('Passed test_headless_rendering')
+
+def test_shower_association():
+    """Tests radius queries, shower association and clustering of radiants"""
+
+    from showers import RadiantIndex, BUFFER_SIZE
+
+    rng = numpy.random.default_rng(3)
+    index = RadiantIndex(radius=2, velocity=5e3)
+
+    # Queries must agree with brute force before and after the tree rebuild
+    count = BUFFER_SIZE * 3
+    radiants = numpy.column_stack((rng.uniform(0, 360, count), rng.uniform(-30, 90, count)))
+    velocities = rng.uniform(11e3, 72e3, count)
+    for radiant, velocity in zip(radiants[:BUFFER_SIZE + 10], velocities):
+        index.add(radiant, velocity)
+    index.add(radiants[BUFFER_SIZE + 10:], velocities[BUFFER_SIZE + 10:])
+    assert len(index) == count and index._tree_size > 0
+
+    vectors = numpy.column_stack((numpy.cos(numpy.radians(radiants[:, 1])) * numpy.cos(numpy.radians(radiants[:, 0])),
+                                  numpy.cos(numpy.radians(radiants[:, 1])) * numpy.sin(numpy.radians(radiants[:, 0])),
+                                  numpy.sin(numpy.radians(radiants[:, 1]))))
+    for i in range(0, count, 37):
+        angles = numpy.degrees(2 * numpy.arcsin(numpy.linalg.norm(vectors - vectors[i], axis=1) / 2))
+        distances = (numpy.sin(numpy.radians(angles) / 2) / numpy.sin(numpy.radians(1))) ** 2 \
+                    + ((velocities - velocities[i]) / 5e3) ** 2
+        assert numpy.array_equal(numpy.sort(index.query(radiants[i], velocities[i])),
+                                 numpy.flatnonzero(distances <= 1 + 1e-12))
+
+    # Association with known showers by radiant, velocity and date
+    showers = RadiantIndex.from_showers()
+    nearest = showers.nearest([[47.5, 57.6], [112.4, 32.5], [47.5, 57.6]], [58e3, 34e3, 58e3],
+                              Time(['2024-08-12 23:00', '2024-12-14 01:00', '2024-12-14 01:00']))
+    assert [showers.labels[i] if i >= 0 else None for i in nearest] == ['PER', 'GEM', None]
+
+    # Two dense showers on a sparse background
+    clustered = RadiantIndex(radius=2, velocity=5e3)
+    clustered.add(numpy.column_stack((rng.uniform(0, 360, 2000), numpy.degrees(numpy.arcsin(rng.uniform(-1, 1, 2000))))),
+                  rng.uniform(11e3, 72e3, 2000))
+    clustered.add(numpy.column_stack((rng.normal(48, 1, 100), rng.normal(58, 0.5, 100))), rng.normal(59e3, 1e3, 100))
+    clustered.add(numpy.column_stack((rng.normal(112, 1, 100), rng.normal(33, 0.5, 100))), rng.normal(35e3, 1e3, 100))
+
+    labels = clustered.cluster(min_samples=8)
+    assert labels.max() == 1
+    assert len(numpy.unique(labels[2000:2100])) == 1 and len(numpy.unique(labels[2100:])) == 1
+    assert labels[2000] != labels[2100] and numpy.sum(labels[:2000] >= 0) < 20
+
+    print('Passed test_shower_association')
+
+def test_result_store():
+    """Tests storing and reloading computed meteors by their inputs"""
+
+    import os
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from astropy import wcs
+    from executor import MeteorExecutor
+    import store
+
+    time = Time('2024-01-08 23:52:57')
+
+    with tempfile.TemporaryDirectory() as directory:
+        default_store, store._store = store._store, store.ResultStore(os.path.join(directory, 'store'))
+        try:
+            # Fixed camera alignments of both stations
+            stations = []
+            for label, lat, lon, height, center in [('Ondřejov', 49.970222, 14.780208, 524, (60, 50)),
+                                                    ('Kunžak', 49.107290, 15.200930, 656, (61, 49))]:
+                alignment = wcs.WCS(naxis=2)
+                alignment.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+                alignment.wcs.crval = center
+                alignment.wcs.crpix = [320, 240]
+                alignment.wcs.cdelt = [-0.1, 0.1]
+                wcs_path = os.path.join(directory, f'{lon}.wcs')
+                alignment.to_fits().writeto(wcs_path)
+
+                stations.append(Station(lat=lat, lon=lon, height=height, label=label,
+                                        wcs_path=wcs_path, wcs_time='2024-01-08 23:52:57'))
+
+            data_paths = [
+                shutil.copy(f'./data/meteory/{folder}/2024-01-08-23-52-57/data.txt',
+                            os.path.join(directory, f'{folder}.txt'))
+                for folder in ('Ondrejov', 'Kunzak')
+            ]
+
+            computed = Meteor.from_astrometry_fixed('test', stations, data_paths, time)
+            assert len(store._store) == 1
+
+            # The second meteor is loaded with its results
+            loaded = Meteor.from_astrometry_fixed('test', stations, data_paths, time)
+            assert loaded.observations == computed.observations and loaded.times == computed.times
+            assert loaded.get_radiant() == computed.get_radiant()
+            assert loaded.get_Q_angle() == computed.get_Q_angle()
+            assert numpy.array_equal(loaded.get_trajectory().merged(), computed.get_trajectory().merged())
+            assert all(numpy.array_equal(a, b) for a, b in zip(loaded.get_velocities(), computed.get_velocities()))
+            assert loaded.cache_info()['radiant'] == {'hits': 1, 'misses': 0}
+
+            # A changed input file affects only meteors computed from it
+            with open(data_paths[1], 'a') as file:
+                file.write('\n')
+            Meteor.from_astrometry_fixed('test', stations, data_paths, time)
+            assert len(store._store) == 2
+            assert store._store.prune() == 1 and len(store._store) == 1
+            assert store._store.invalidate(data_paths[1]) == 1 and len(store._store) == 0
+
+            # A fixed WCS file which does not exist yet is keyed as missing
+            missing = Station(lat=49.970222, lon=14.780208, height=524,
+                              wcs_path=os.path.join(directory, 'missing.wcs'), wcs_time='2024-01-08 23:52:57')
+            key = store._store.key([missing, stations[1]], time, data_paths)
+            with open(missing.wcs_path, 'wb') as file:
+                file.write(b'created later')
+            assert store._store.key([missing, stations[1]], time, data_paths) != key
+            os.remove(missing.wcs_path)
+
+            # A WCS file without its time is keyed without failing
+            untimed = Station(lat=49.970222, lon=14.780208, height=524, wcs_path=stations[0].wcs_path)
+            assert untimed.wcs_time is None
+            assert store._store.key([untimed, stations[1]], time, data_paths) != key
+
+            # Meteors saved by many threads at once are stored with all inputs
+            with ThreadPoolExecutor(4) as executor:
+                list(executor.map(lambda i: store._store.save(f'{i:040x}', computed, data_paths), range(8)))
+            assert len(store._store) == 8
+            assert store._store.invalidate(data_paths[0]) == 8
+
+            # Results falling back to the fixed alignment are not stored
+            class Client:
+                """Downloads a WCS file unless offline"""
+
+                def __init__(self, offline):
+                    self.offline = offline
+
+                def get_wcs_file(self, job_id, save_path):
+                    if self.offline:
+                        raise ConnectionError('offline')
+                    alignment = wcs.WCS(naxis=2)
+                    alignment.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+                    alignment.wcs.crval = [60, 50]
+                    alignment.wcs.crpix = [320, 240]
+                    alignment.wcs.cdelt = [-0.1, 0.1]
+                    alignment.to_fits().writeto(save_path)
+
+            img_paths = [shutil.copy('./data/2024-01-08-21-35-44.jpg', os.path.join(directory, f'{i}.jpg'))
+                         for i in range(2)]
+            default_wcs_store, store._wcs_store = store._wcs_store, store.WcsStore(os.path.join(directory, 'wcs'))
+            try:
+                with open(img_paths[0], 'rb') as file:
+                    store._wcs_store.remember(store._wcs_store.image_digest(file.read()), 7)
+
+                with MeteorExecutor(threads=2) as executor:
+                    executor._client = Client(offline=True)
+                    fallback = Meteor.from_astrometry('test', stations, img_paths, data_paths, time, executor=executor)
+                    assert fallback.job_ids == [None, None] and len(store._store) == 0
+
+                    executor._client = Client(offline=False)
+                    solved = Meteor.from_astrometry('test', stations, img_paths, data_paths, time, executor=executor)
+                    assert solved.job_ids == [7, 7] and len(store._store) == 1
+                    assert executor._process_pool is not None
+            finally:
+                store._wcs_store = default_wcs_store
+
+            store._store.close()
+        finally:
+            store._store = default_store
+
+    print('Passed test_result_store')
+
+def test_astrometry_executor():
+    """Tests concurrent astrometry of many meteors with timeouts and errors"""
+
+    import tempfile
+    import threading
+    import time as clock
+    from concurrent.futures import Future
+    from astropy import wcs
+    from executor import MeteorExecutor
+    import store
+
+    class Client:
+        """Answers WCS downloads with a fixed alignment after a delay"""
+
+        def __init__(self, delay=0.0, error=None):
+            self.delay = delay
+            self.error = error
+            self.running = 0
+            self.most_running = 0
+            self.lock = threading.Lock()
+
+        def get_wcs_file(self, job_id, save_path):
+            with self.lock:
+                self.running += 1
+                self.most_running = max(self.most_running, self.running)
+            clock.sleep(self.delay)
+            with self.lock:
+                self.running -= 1
+
+            if self.error:
+                raise self.error
+
+            alignment = wcs.WCS(naxis=2)
+            alignment.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+            alignment.wcs.crval = [60 + job_id, 50 - job_id]
+            alignment.wcs.crpix = [320, 240]
+            alignment.wcs.cdelt = [-0.1, 0.1]
+            alignment.to_fits().writeto(save_path)
+
+    time = Time('2024-01-08 23:52:57')
+    stations = [
+        Station(lat=49.970222, lon=14.780208, height=524, label='Ondřejov'),
+        Station(lat=49.107290, lon=15.200930, height=656, label='Kunžak'),
+    ]
+    data_paths = [
+        './data/meteory/Ondrejov/2024-01-08-23-52-57/data.txt',
+        './data/meteory/Kunzak/2024-01-08-23-52-57/data.txt',
+    ]
+    img_paths = [None, None]
+
+    # Every job is downloaded into an empty WCS store
+    with tempfile.TemporaryDirectory() as directory, MeteorExecutor(threads=8) as executor:
+        default_store, store._wcs_store = store._wcs_store, store.WcsStore(directory)
+
+        # Both stations of several meteors run at once
+        executor._client = Client(delay=0.2)
+        start = clock.time()
+        futures = [
+            Meteor.submit_astrometry(f'test{i}', stations, img_paths, data_paths, time,
+                                     [2 * i + 1, 2 * i + 2], store=False, executor=executor)
+            for i in range(4)
+        ]
+        meteors = [future.result(timeout=30) for future in futures]
+        assert clock.time() - start < 0.8 and executor._client.most_running == 8
+        assert [meteor.label for meteor in meteors] == ['test0', 'test1', 'test2', 'test3']
+        assert meteors[0].job_ids == [1, 2] and len(meteors[0].get_radiant()) == 2
+
+        # Timeouts raise and cancel the combined future
+        executor._client = Client(delay=0.5)
+        try:
+            Meteor.from_astrometry('slow', stations, img_paths, data_paths, time, [11, 12],
+                                   store=False, timeout=0.05, executor=executor)
+            assert False, 'Should time out'
+        except TimeoutError:
+            pass
+
+        # Errors of a station are propagated
+        executor._client = Client(error=ConnectionError('offline'))
+        try:
+            Meteor.from_astrometry('failed', stations, img_paths, data_paths, time, [21, 22],
+                                   store=False, executor=executor)
+            assert False, 'Should fail'
+        except ConnectionError:
+            pass
+
+        # Downloads still running finish before the store is removed
+        executor.shutdown()
+        store._wcs_store = default_store
+
+        # Cancelling the combined future cancels pending parts
+        pending = [Future(), Future()]
+        combined = MeteorExecutor.gather(pending)
+        combined.cancel()
+        assert all(future.cancelled() for future in pending)
+
+        # Chained futures follow the returned future and cancel both
+        first, second = Future(), Future()
+        chained = MeteorExecutor.then(first, lambda future: second)
+        first.set_result(1)
+        second.set_result(2)
+        assert chained.result() == 2
+
+        first, second = Future(), Future()
+        chained = MeteorExecutor.then(first, lambda future: second)
+        first.set_result(1)
+        chained.cancel()
+        assert second.cancelled()
+
+    print('Passed test_astrometry_executor')
+
+def test_wcs_cache():
+    """Tests that WCS files are parsed once, reparsed after a change and
+    evicted beyond the cache size"""
+
+    import os
+    import tempfile
+    from astropy import wcs
+    import coordinates
+
+    def write_wcs(path, ra):
+        alignment = wcs.WCS(naxis=2)
+        alignment.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+        alignment.wcs.crval = [ra, 50]
+        alignment.wcs.crpix = [320, 240]
+        alignment.wcs.cdelt = [-0.1, 0.1]
+        alignment.to_fits().writeto(path, overwrite=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'station.wcs')
+        write_wcs(path, 60)
+
+        first = coordinates.load_wcs(path)
+        assert coordinates.load_wcs(path) is first
+        assert numpy.allclose(coordinates.pixels_to_world(path, [[319, 239]])[0], [60, 50])
+
+        # A rewritten file is parsed again and replaces the stale entry
+        write_wcs(path, 70)
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+        assert coordinates.load_wcs(path) is not first
+        assert numpy.allclose(coordinates.pixels_to_world(path, [[319, 239]])[0], [70, 50])
+        assert sum(key[0] == os.path.abspath(path) for key in coordinates.wcs_cache) == 1
+
+        # The least recently used files are evicted
+        for i in range(coordinates.WCS_CACHE_SIZE + 5):
+            other = os.path.join(directory, f'{i}.wcs')
+            write_wcs(other, i)
+            coordinates.load_wcs(other)
+        assert len(coordinates.wcs_cache) == coordinates.WCS_CACHE_SIZE
+        assert os.path.abspath(path) not in [key[0] for key in coordinates.wcs_cache]
+
+        coordinates.wcs_cache.clear()
+
+    print('Passed test_wcs_cache')
+
+def test_pixel_world_conversion():
+    """Tests the array conversions between pixels and RA/Dec against the
+    per-point astropy conversion"""
+
+    import os
+    import tempfile
+    from astropy import wcs
+    from astropy.coordinates import SkyCoord
+    import coordinates
+
+    alignment = wcs.WCS(naxis=2)
+    alignment.wcs.ctype = ['RA---TAN-SIP', 'DEC--TAN-SIP']
+    alignment.wcs.crval = [60, 50]
+    alignment.wcs.crpix = [320, 240]
+    alignment.wcs.cd = [[-0.1, 0.001], [0.002, 0.1]]
+    distortion = numpy.array([[0, 0, 1e-6], [0, 2e-6, 0], [1e-6, 0, 0]])
+    alignment.sip = wcs.Sip(distortion, distortion.T, None, None, alignment.wcs.crpix)
+
+    pixels = numpy.random.default_rng(5).uniform(0, 640, (2, 50, 2))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'sip.wcs')
+        alignment.to_fits(relax=True).writeto(path)
+
+        # Two meteors concatenated along the first axis
+        world = coordinates.pixels_to_world(path, pixels)
+        assert world.shape == pixels.shape
+
+        parsed = coordinates.load_wcs(path)
+        for (x, y), (ra, dec) in zip(pixels[1], world[1]):
+            sky = parsed.pixel_to_world(x, y)
+            assert abs(sky.ra.degree - ra) < 1e-9 and abs(sky.dec.degree - dec) < 1e-9
+
+        assert numpy.allclose(coordinates.world_to_pixel(path, world), pixels, atol=1e-6)
+        assert coordinates.pixels_to_world(path, [[1, 2]]).shape == (1, 2)
+
+        coordinates.wcs_cache.clear()
+
+    print('Passed test_pixel_world_conversion')
+
+def test_sky_rotation():
+    """Tests re-pointing the fixed camera alignment by one rotation matrix
+    against transforming every point through astropy"""
+
+    import os
+    import tempfile
+    from astropy import wcs
+    import coordinates
+
+    station = Station(lat=49.970222, lon=14.780208, height=524, label='Ondřejov',
+                      wcs_time='2024-01-08 21:35:44')
+    time = Time('2024-01-08 23:52:57')
+
+    with tempfile.TemporaryDirectory() as directory:
+        alignment = wcs.WCS(naxis=2)
+        alignment.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+        alignment.wcs.crval = [60, 50]
+        alignment.wcs.crpix = [320, 240]
+        alignment.wcs.cdelt = [-0.1, 0.1]
+        station.wcs_path = os.path.join(directory, 'ondrejov.wcs')
+        alignment.to_fits().writeto(station.wcs_path)
+
+        data_path = './data/meteory/Ondrejov/2024-01-08-23-52-57/data.txt'
+        fast = numpy.array(coordinates.get_meteor_coordinates_fixed(data_path, station, time))
+        exact = numpy.array(coordinates.get_meteor_coordinates_fixed(data_path, station, time, exact=True))
+
+        coordinates.wcs_cache.clear()
+
+    # Within a few arcseconds, the seconds are unchanged
+    assert fast.shape == exact.shape
+    assert numpy.all(fast[:, 2] == exact[:, 2])
+    separation = numpy.hypot((fast[:, 0] - exact[:, 0]) * numpy.cos(numpy.radians(exact[:, 1])),
+                             fast[:, 1] - exact[:, 1])
+    assert numpy.max(separation) < 5 / 3600
+
+    # The sky turns by about 34° in the 2h17m between the times
+    rotation = coordinates.get_sky_rotation(station, station.wcs_time, time)
+    assert numpy.allclose(rotation @ rotation.T, numpy.eye(3))
+    assert abs(numpy.degrees(numpy.arccos((numpy.trace(rotation) - 1) / 2)) - 34.4) < 0.2
+
+    # The matrix is calculated once for the same station and times
+    assert coordinates.get_sky_rotation(station, Time(station.wcs_time), Time(time.isot)) is rotation
+
+    print('Passed test_sky_rotation')
+
+def test_data_file_parsing():
+    """Tests reading all meteors and stars of a data.txt file"""
+
+    import os
+    import tempfile
+    from modules import parse_data_file
+    from coordinates import load_meteors
+
+    path = './data/meteory/Ondrejov/2024-01-08-23-52-57/data.txt'
+    observation = parse_data_file(path)
+    meteors, stars = observation.tracks, observation.stars
+
+    assert len(meteors) == 1 and len(meteors[0]) == 19
+    assert stars.shape == (34, 2) and tuple(stars[1]) == (114.5, 181)
+    assert observation.start_end() == ((244, 171), (260.5, 250.5))
+    assert tuple(meteors[0][['x', 'y']][0]) == (244, 171)
+    assert meteors[0]['frame'][-1] == 948945
+    assert abs(meteors[0]['t'][-1] - (1.34426 - 0.983607)) < 1e-12
+
+    # The first frame is left out of the paths used for calculation
+    pixels, times = load_meteors(path)
+    assert numpy.array_equal(pixels[0], numpy.column_stack((meteors[0]['x'], meteors[0]['y']))[1:])
+    assert times[0][0] == 0 and len(times[0]) == 18
+
+    # Files with many meteors
+    lines = ['Number of stars:2', '#1 position (1, 2)', '#2 position (3.5, 4)', 'Number of meteors:50']
+    for i in range(50):
+        lines.append(f'#Meteor {i + 1}: start (0, 0) end (9, 9) frames: {i}-{i + 9} from: {i}s to: {i + 0.9}s ')
+        lines.extend(f' frame = {i + j} x = {j}   y = {2 * j}' for j in range(10))
+    lines.append('END classification---')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'data.txt')
+        with open(path, 'w', newline='\r\n') as file:
+            file.write('\n'.join(lines))
+
+        observation = parse_data_file(path)
+        meteors, stars = observation.tracks, observation.stars
+        pixels, times = load_meteors(path)
+
+    assert stars.tolist() == [[1, 2], [3.5, 4]]
+    assert len(meteors) == 50 and len(pixels) == 50
+    assert meteors[49]['frame'].tolist() == list(range(49, 59))
+    assert numpy.allclose(meteors[49]['t'], numpy.arange(10) * 0.1)
+    assert numpy.allclose(pixels[49], [[j, 2 * j] for j in range(1, 10)])
+    assert numpy.allclose(times[49], numpy.arange(9) * 0.9 / 8)
+
+    # Meteors of one or two frames
+    lines = ['Number of stars:0', 'Number of meteors:3',
+             '#Meteor 1: start (5, 6) end (5, 6) frames: 10-10 from: 1s to: 1s ',
+             ' frame = 10 x = 5   y = 6',
+             '#Meteor 2: start (5, 6) end (7, 8) frames: 10-11 from: 1s to: 1.04s ',
+             ' frame = 10 x = 5   y = 6',
+             ' frame = 11 x = 7   y = 8',
+             '#Meteor 3: start (5, 6) end (5, 6) frames: 0-0 from: 0s to: 0s ',
+             'END classification---']
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'data.txt')
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines))
+
+        observation = parse_data_file(path)
+        pixels, times = load_meteors(path)
+
+    assert [len(track) for track in observation.tracks] == [1, 2, 0]
+    assert observation.tracks[0]['t'].tolist() == [0]
+    assert pixels[0].shape == (0, 2) and times[0].shape == (0,)
+    assert pixels[1].tolist() == [[7, 8]] and times[1].tolist() == [0]
+    assert pixels[2].shape == (0, 2) and times[2].shape == (0,)
+
+    print('Passed test_data_file_parsing')
+
+def test_observation_cache():
+    """Tests sharing one record of each data.txt file"""
+
+    import os
+    import shutil
+    import tempfile
+    import modules
+    from modules import ParseData, load_observation
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for folder in ('Ondrejov', 'Kunzak'):
+            paths.append(os.path.join(directory, f'{folder}.txt'))
+            shutil.copy(f'./data/meteory/{folder}/2024-01-08-23-52-57/data.txt', paths[-1])
+
+        observation = load_observation(paths[0])
+        assert load_observation(paths[0]) is observation
+        assert ParseData(paths[0]).observation is observation
+        assert ParseData(paths[0]).get_meteor_start_end_coordinates() == ((244, 171), (260.5, 250.5))
+        assert ParseData(paths[0]).get_stars_coordinates()[0] == (228, 124)
+
+        # Shared arrays cannot be changed by one of the callers
+        try:
+            observation.tracks[0]['x'][0] = 0
+            assert False, 'Shared track was changed'
+        except ValueError:
+            pass
+
+        # A changed file is read again and replaces the old record
+        with open(paths[0], 'a') as file:
+            file.write('\n')
+        changed = load_observation(paths[0])
+        assert changed is not observation
+        assert numpy.array_equal(changed.tracks[0], observation.tracks[0])
+        assert sum(key[0] == os.path.abspath(paths[0]) for key in modules.observation_cache) == 1
+
+        # The least recently used records are evicted
+        default_size, modules.OBSERVATION_CACHE_SIZE = modules.OBSERVATION_CACHE_SIZE, 1
+        try:
+            load_observation(paths[1])
+            assert len(modules.observation_cache) == 1
+            assert load_observation(paths[0]) is not changed
+        finally:
+            modules.OBSERVATION_CACHE_SIZE = default_size
+            modules.observation_cache.clear()
+
+    print('Passed test_observation_cache')
+
+def test_image_preprocessing():
+    """Tests masking images for astrometry in memory"""
+
+    import cv2
+    import coordinates
+
+    folder = './data/meteory/Ondrejov/2024-01-08-23-52-57'
+    img_path, data_path = f'{folder}/2024-01-08-23-52-57.jpg', f'{folder}/data.txt'
+
+    image = coordinates.preprocess_image(img_path, data_path)
+    masked = cv2.imdecode(numpy.frombuffer(image, numpy.uint8), cv2.IMREAD_UNCHANGED)
+    original = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+
+    # Grayscale, dark outside the sky view and at the meteor
+    assert masked.shape == original.shape
+    assert masked[0, 0] < 5 and masked[-1, -1] < 5
+    assert masked[171, 244] < 5 and masked[250, 260] < 5
+    assert abs(int(masked[291, 388]) - int(original[291, 388])) < 10
+
+    # The mask of the image size is reused
+    hits = coordinates._sky_mask.cache_info().hits
+    images = coordinates.preprocess_images([(img_path, data_path)] * 3, threads=3)
+    assert images == [image] * 3
+    assert coordinates._sky_mask.cache_info().hits == hits + 3
+    assert not coordinates._sky_mask(*original.shape).flags.writeable
+
+    print('Passed test_image_preprocessing')
+
+def test_wcs_store():
+    """Tests that images are solved and WCS files downloaded only once"""
+
+    import os
+    import tempfile
+    from astropy import wcs
+    import coordinates
+    import store
+
+    class Client:
+        """Solves every image as job 5 and counts the requests"""
+
+        def __init__(self):
+            self.uploads = []
+            self.downloads = 0
+
+        def upload_image(self, image_path, image=None):
+            self.uploads.append(image)
+            return 1
+
+        def is_job_done(self, submission_id):
+            return [[5]]
+
+        def get_wcs_file(self, job_id, save_path):
+            self.downloads += 1
+            alignment = wcs.WCS(naxis=2)
+            alignment.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+            alignment.wcs.crval = [60, 50]
+            alignment.wcs.crpix = [320, 240]
+            alignment.wcs.cdelt = [-0.1, 0.1]
+            alignment.to_fits().writeto(save_path)
+
+    folder = './data/meteory/Ondrejov/2024-01-08-23-52-57'
+    img_path, data_path = f'{folder}/2024-01-08-23-52-57.jpg', f'{folder}/data.txt'
+    station = Station(lat=49.970222, lon=14.780208, height=524, label='Ondřejov')
+    time = Time('2024-01-08 23:52:57')
+
+    with tempfile.TemporaryDirectory() as directory:
+        default_store, store._wcs_store = store._wcs_store, store.WcsStore(os.path.join(directory, 'wcs'))
+        try:
+            client = Client()
+            job_id, world = coordinates.get_meteor_coordinates(client, img_path, data_path, station, time)
+            assert job_id == 5 and len(world) == 18
+            assert len(client.uploads) == 1 and client.downloads == 1
+
+            # The same image is neither uploaded nor downloaded again
+            again = coordinates.get_meteor_coordinates(client, img_path, data_path, station, time)
+            assert again == (job_id, world)
+            assert len(client.uploads) == 1 and client.downloads == 1
+
+            # A preprocessed image is a different image
+            coordinates.get_meteor_coordinates(client, img_path, data_path, station, time, prep=True)
+            assert len(client.uploads) == 2 and client.downloads == 1
+
+            # Copies are written for stations, without temporary files left
+            station.wcs_path = os.path.join(directory, 'ondrejov.wcs')
+            station.get_fixed_wcs(client, img_path, job_id=5)
+            assert os.path.exists(station.wcs_path) and client.downloads == 1
+            assert sorted(os.listdir(os.path.join(directory, 'wcs', 'jobs'))) == ['5.wcs']
+
+            # Failed downloads are not stored
+            client.get_wcs_file = lambda job_id, save_path: None
+            assert store.get_wcs_store().get(client, 6) is None
+            assert sorted(os.listdir(os.path.join(directory, 'wcs', 'jobs'))) == ['5.wcs']
+        finally:
+            store._wcs_store = default_store
+            coordinates.wcs_cache.clear()
+
+    print('Passed test_wcs_store')
+
 def test_meteor_calculation():
     """Tests the fixed astrometry and calculation procedures"""
 
@@ -176,6 +1318,30 @@ def test_get_fixed_wcs():
 if __name__ == '__main__':
     test_fixed_wcs_astrometry()
     test_radiant_calculation()
+    test_plane_intersection_engine()
+    test_geodetic_conversion()
+    test_trajectory_views()
+    test_trajectory_resampling()
+    test_meteor_batch()
+    test_horizon_check()
+    test_multi_station_meteor()
+    test_uncertainty_estimation()
+    test_kinematics_fit()
+    test_computed_results()
+    test_orbit_calculation()
+    test_trajectory_export()
+    test_map_background()
+    test_headless_rendering()
+    test_shower_association()
+    test_result_store()
+    test_astrometry_executor()
+    test_wcs_cache()
+    test_pixel_world_conversion()
+    test_sky_rotation()
+    test_data_file_parsing()
+    test_observation_cache()
+    test_image_preprocessing()
+    test_wcs_store()
     test_meteor_calculation()
     test_get_fixed_wcs()
     print('Tests passed')
\ No newline at end of file
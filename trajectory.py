@@ -1,4 +1,7 @@
 from math import sin, cos, radians, sqrt, asin, acos, degrees, pi
+from concurrent.futures import Future
+import hashlib
+import os
 import astropy.units as u
 from astropy.time import Time
 import numpy
@@ -6,9 +9,247 @@ from mpl_toolkits.basemap import Basemap
 import matplotlib.pyplot as plot
 
 from coordinates import *
+from kinematics import *
+from orbit import *
+from export import export_trajectories
 from station import Station
+from modules import computed, Computed
+from store import get_result_store
+from executor import MeteorExecutor, get_executor
+
+# Structured layout of a single trajectory point
+TRAJECTORY_DTYPE = numpy.dtype([
+    ('lat', 'f8'), ('lon', 'f8'), ('height', 'f8'),
+    ('X', 'f8'), ('Y', 'f8'), ('Z', 'f8'),
+    ('t', 'f8'),
+    ('station', 'i2'),
+])
+
+# Projection of the background map of plot_trajectory_geodetic
+MAP_PROJECTION = dict(projection='stere', rsphere=6371200.,
+                      lat_0=50, lon_0=15, width=1200000, height=800000)
+
+# Rendered map backgrounds, in memory by style and on disk in this directory
+MAP_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'maps')
+MAP_DPI = 200
+map_backgrounds = {}
+
+class Trajectory:
+    """Meteor trajectory points from all stations stored in one structured
+    array. Points are grouped by station, so per-station views are zero-copy
+    slices of the buffer. The merged order is kept as the public index array
+    order, merged() gathers the points in that order into a new buffer, so
+    index single columns with order where a copy of all fields is not needed.
+
+    Usage:
+        ```python
+        trajectory['height']       # heights of all points
+        trajectory.station(0)      # points observed from the first station
+        trajectory.merged()['t']   # times of the merged trajectory, copied
+        trajectory['t'][trajectory.order]  # the same, copying only one column
+        trajectory.resample()      # all stations on a common timebase
+        ```
+    """
+
+    __slots__ = ('data', 'order')
+
+    data: numpy.ndarray
+    order: numpy.ndarray
+
+    def __init__(self, data: numpy.ndarray, order: numpy.ndarray = None) -> None:
+        """Args:
+            data (numpy.ndarray): Structured array of TRAJECTORY_DTYPE points
+            grouped by station
+            order (numpy.ndarray): Indices of data in the merged order,
+            defaults to the stored order
+        """
+
+        self.data = data
+        self.order = numpy.arange(len(data)) if order is None else order
+
+    @staticmethod
+    def from_arrays(lat: numpy.ndarray, lon: numpy.ndarray, height: numpy.ndarray,
+                    X: numpy.ndarray, Y: numpy.ndarray, Z: numpy.ndarray,
+                    t: numpy.ndarray, station: numpy.ndarray) -> 'Trajectory':
+        """Constructs a trajectory from column arrays
+
+        Args:
+            lat, lon, height (numpy.ndarray): Geodetic coordinates in decimal
+            degrees and metres
+            X, Y, Z (numpy.ndarray): Geocentric coordinates in metres
+            t (numpy.ndarray): Time of each point in seconds
+            station (numpy.ndarray): Index of the observing station
+
+        Returns:
+            Trajectory: trajectory holding all points in one buffer
+        """
+
+        data = numpy.empty(len(lat), dtype=TRAJECTORY_DTYPE)
+        data['lat'], data['lon'], data['height'] = lat, lon, height
+        data['X'], data['Y'], data['Z'] = X, Y, Z
+        data['t'] = t
+        data['station'] = station
+
+        # Keep the points grouped by station for slicing
+        grouping = numpy.argsort(data['station'], kind='stable')
+        if numpy.any(grouping != numpy.arange(len(data))):
+            data = data[grouping]
+
+        return Trajectory(data)
+
+    def station(self, index: int) -> 'Trajectory':
+        """Returns a zero-copy view of the points observed from one station
+
+        Args:
+            index (int): Index of the station
+
+        Returns:
+            Trajectory: points observed from the station in observation order
+        """
+
+        start, end = numpy.searchsorted(self.data['station'], [index, index + 1])
+        return Trajectory(self.data[start:end])
+
+    def merged(self) -> 'Trajectory':
+        """Returns the points of all stations in the merged order. Unless the
+        merged order is the stored order, the points are copied.
+
+        Returns:
+            Trajectory: merged trajectory
+        """
+
+        # Gathering by the order copies the whole buffer
+        if numpy.any(self.order != numpy.arange(len(self.data))):
+            return Trajectory(self.data[self.order])
+
+        return Trajectory(self.data)
+
+    def merge(self, by: str = 'height', offsets: numpy.ndarray = None) -> None:
+        """Sets the merged order of the points of all stations, by descending
+        height or by ascending time. Points with equal values keep the order
+        of the stations.
+
+        The times of each station start at zero at its own first frame, so
+        merging by time assumes that all stations saw the meteor start at
+        the same moment, unless offsets are given.
+
+        Args:
+            by (str): 'height' or 't'
+            offsets (numpy.ndarray): Seconds added to the times of each
+            station, indexed by station, to put them on a common clock
+        """
+
+        if by == 'height':
+            keys = -self.data['height']
+        elif by == 't':
+            keys = self.station_times(offsets)
+        else:
+            raise ValueError(f"Cannot merge by '{by}', use 'height' or 't'.")
+
+        self.order = numpy.argsort(keys, kind='stable')
+
+    def resample(self, times: numpy.ndarray = None, kind: str = 'linear',
+                 offsets: numpy.ndarray = None) -> 'Trajectory':
+        """Interpolates the track of every station onto a common timebase.
+        The times of each station start at zero at its own first frame, see
+        merge(), pass offsets if the stations did not see the meteor start
+        at the same moment.
+
+        Args:
+            times (numpy.ndarray): Times in seconds to resample to, defaults
+            to all observation times covered by every station
+            kind (str): 'linear' or 'spline' for cubic spline interpolation
+            offsets (numpy.ndarray): Seconds added to the times of each
+            station, indexed by station, to put them on a common clock
+
+        Returns:
+            Trajectory: new trajectory with one point per station and time,
+            merged by time, with the times on the common clock
+        """
+
+        if kind not in ('linear', 'spline'):
+            raise ValueError(f"Unknown interpolation '{kind}', use 'linear' or 'spline'.")
+
+        stations = numpy.unique(self.data['station'])
+        tracks = []
+        for index in stations:
+            track = self.station(index).data.copy()
+            track['t'] += 0 if offsets is None else offsets[index]
+            tracks.append(track[numpy.argsort(track['t'], kind='stable')])
+
+        if times is None:
+            start = max(track['t'][0] for track in tracks)
+            end = min(track['t'][-1] for track in tracks)
+            times = numpy.unique(self.station_times(offsets))
+            times = times[(times >= start) & (times <= end)]
+        times = numpy.asarray(times, dtype=float)
+
+        # Interpolate the geocentric coordinates, which change linearly along
+        # a straight meteor path
+        geocentric = numpy.empty((len(stations), len(times), 3))
+        for i, track in enumerate(tracks):
+            for j, axis in enumerate(('X', 'Y', 'Z')):
+                if kind == 'spline':
+                    from scipy.interpolate import CubicSpline
+                    geocentric[i, :, j] = CubicSpline(track['t'], track[axis])(times)
+                else:
+                    geocentric[i, :, j] = numpy.interp(times, track['t'], track[axis])
+
+        X, Y, Z = geocentric.reshape(-1, 3).T
+        lat, lon, height = geocentric_to_geodetic_array(X, Y, Z)
+
+        trajectory = Trajectory.from_arrays(
+            lat, lon, height, X, Y, Z,
+            t=numpy.tile(times, len(stations)),
+            station=numpy.repeat(stations, len(times))
+        )
+        trajectory.merge('t')
+
+        return trajectory
+
+    def station_times(self, offsets: numpy.ndarray = None) -> numpy.ndarray:
+        """Returns the times of all points on a common clock
+
+        Args:
+            offsets (numpy.ndarray): Seconds added to the times of each
+            station, indexed by station, none by default
+
+        Returns:
+            numpy.ndarray: times in seconds, shape (N,)
+        """
+
+        if offsets is None:
+            return self.data['t']
+
+        return self.data['t'] + numpy.asarray(offsets, dtype=float)[self.data['station']]
+
+    @property
+    def geocentric(self) -> numpy.ndarray:
+        """numpy.ndarray: geocentric coordinates X, Y, Z, shape (N, 3)"""
+
+        return numpy.column_stack((self.data['X'], self.data['Y'], self.data['Z']))
+
+    @property
+    def geodetic(self) -> numpy.ndarray:
+        """numpy.ndarray: geodetic coordinates lat, lon, height, shape (N, 3)"""
+
+        return numpy.column_stack((self.data['lat'], self.data['lon'], self.data['height']))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
     
-class Meteor:
+class Meteor(Computed):
+    """Meteor observed from two or more stations. Derived results are
+    computed on first access, memoized and recalculated only after the
+    observations, stations, time or engine change, see cache_info().
+    """
+
     label: str
 
     # Station and observation information
@@ -20,6 +261,7 @@ class Meteor:
     times: (list[float])
 
     Q_angle: float
+    Q_angles: numpy.ndarray
 
     # Astrometry information
     job_ids: list[int]
@@ -28,35 +270,53 @@ class Meteor:
     radiant: list[float]
 
     # Trajectory information
-    geocentric_trajectory_a: list[list[float]]
-    geocentric_trajectory_b: list[list[float]]
+    engine: str
+    trajectory: Trajectory
+    residuals: numpy.ndarray
+
+    distances: list[numpy.ndarray]
+    path_lengths: list[numpy.ndarray]
+    velocities: list[numpy.ndarray]
+    kinematics: dict
 
-    geodetic_trajectory_a: list[list[float]]
-    geodetic_trajectory_b: list[list[float]]
+    # Orbit information
+    orbit: numpy.void
 
-    distance_from_beginning_a: list[float]
-    distance_from_beginning_b: list[float]
+    # Monte Carlo uncertainty information
+    uncertainty: dict
 
     def __init__(self, label: str,
                  stations: list[Station],
                  observations: list[list[float]],
                  time: Time,
-                 job_ids: int = None) -> None:
+                 job_ids: int = None,
+                 engine: str = 'plane') -> None:
         """Args:
             label (str): Meteor label
-            stations (list[Station]): List of Stations from which the meteor
-            was observed
+            stations (list[Station]): List of two or more Stations from which
+            the meteor was observed
             observations (list[list[float]]): List of observations of the
-            meteor describing the coordinates and time values
+            meteor describing the coordinates and time values, one for each
+            station
             time: (Time): Time and date to which the measurements are related
+            engine (str): Trajectory solver, 'plane' for the plane intersection
+            method of Ceplecha (1987) or 'lsq' for a least-squares line fit to
+            all lines of sight in the style of Borovička (1990)
         """
 
+        if engine not in ('plane', 'lsq'):
+            raise ValueError(f"Unknown trajectory engine '{engine}', use 'plane' or 'lsq'.")
+
+        if len(stations) < 2 or len(stations) != len(observations):
+            raise ValueError(f"At least two stations with one observation each are required, got {len(stations)} stations and {len(observations)} observations.")
+
         # Station and observation information
         self.label = label
         self.stations = stations
         self.time = time
 
         self.job_ids = job_ids
+        self.engine = engine
 
         # Separate coordinate and time values
         self.observations = []
@@ -69,33 +329,22 @@ class Meteor:
             self.observations.append(coords)
             self.times.append(times)
 
-        # Define yet uncalculated values
-        self.radiant = None
-        self.Q_angle = None
-
-        self.geocentric_trajectory_a = None
-        self.geocentric_trajectory_b = None
-
-        self.geodetic_trajectory_a = None
-        self.geodetic_trajectory_b = None
-
-        self.geodetic_trajectory = None
-        self.geocentric_trajectory = None
-
-        self.distance_from_beginning_a = None
-        self.distance_from_beginning_b = None
-
-        self.velocities_a = None
-        self.velocities_b = None
+        self.uncertainty = None
 
     def from_astrometry(label: str,
                         stations: list[Station],
                         img_paths: list[str],
                         data_paths: list[str],
                         time: Time,
-                        job_ids: list[int] = [None, None],
-                        prep: bool = False):
-        """Constructs a meteor object from astrometry
+                        job_ids: list[int] = None,
+                        prep: bool = False,
+                        store: bool = True,
+                        timeout: float = None,
+                        executor: MeteorExecutor = None):
+        """Constructs a meteor object from astrometry. Meteors already
+        computed from the same inputs are loaded from the result store,
+        meteors for which any station fell back to the fixed alignment are
+        not stored.
         
         Args:
             label (str): Meteor label
@@ -108,56 +357,114 @@ class Meteor:
             for the observations
             pre (bool): Whether to preprocess the images before attempting
             astrometry
+            store (bool): Whether to use the result store
+            timeout (float): Seconds to wait for the astrometry of all
+            stations, unlimited by default
+            executor (MeteorExecutor): Executor running the astrometry, the
+            shared one by default
+
+        Raises:
+            TimeoutError: If the astrometry does not finish in time, the
+            astrometry of stations which have not started is cancelled
         """
 
-        import multiprocessing
+        future = Meteor.submit_astrometry(label, stations, img_paths, data_paths, time,
+                                          job_ids, prep, store, executor)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def submit_astrometry(label: str,
+                          stations: list[Station],
+                          img_paths: list[str],
+                          data_paths: list[str],
+                          time: Time,
+                          job_ids: list[int] = None,
+                          prep: bool = False,
+                          store: bool = True,
+                          executor: MeteorExecutor = None) -> Future:
+        """Starts constructing a meteor object from astrometry without
+        waiting for it, so that many meteors can be in flight at once. The
+        astrometry of all stations runs concurrently in the threads of the
+        executor. Meteors which are stored are calculated in its processes
+        first. See from_astrometry() for the arguments.
+
+        Returns:
+            Future: future of the Meteor. A failure of any station is raised
+            by its result() and cancelling it cancels all stations which
+            have not started.
+        """
 
-        from astrometry import AstrometryClient
-        client = AstrometryClient()
-        client.authenticate()
+        if store:
+            key = get_result_store().key(stations, time, data_paths, img_paths, prep=prep,
+                                         job_ids=list(job_ids) if job_ids is not None else None)
+            meteor = get_result_store().load(key, label, stations, time)
+            if meteor is not None:
+                future = Future()
+                future.set_result(meteor)
+                return future
+
+        if job_ids is None:
+            job_ids = [None] * len(stations)
+
+        if executor is None:
+            executor = get_executor()
+
+        # Start the astrometry of each station
+        futures = [
+            executor.submit_astrometry(img_paths[i], data_paths[i], stations[i], time, job_ids[i], prep)
+            for i in range(len(stations))
+        ]
 
-        # Define a multiprocessing worker
-        def worker(process_number, return_list):
-            return_list[process_number] = get_meteor_coordinates(
-                client,
-                img_paths[process_number],
-                data_paths[process_number],
-                stations[process_number],
-                time,
-                job_ids[process_number],
-                prep
+        def combine(observations):
+            return Meteor(
+                label=label,
+                stations=stations,
+                observations=[observations[i][1] for i in range(len(observations))],
+                job_ids=[observations[i][0] for i in range(len(observations))],
+                time=time,
             )
 
-        manager = multiprocessing.Manager()
-        return_dict = manager.dict()
-
-        # Start workers for each station
-        jobs = []
-        for i in range(len(stations)):
-            p = multiprocessing.Process(target=worker, args=(i, return_dict))
-            jobs.append(p)
-            p.start()
-
-        # Wait for all workers to return
-        for p in jobs:
-            p.join()
-
-        # Order the observations correctly
-        observations = [return_dict[i] for i in range(len(stations))]
-
-        return Meteor(
-            label=label,
-            stations=stations,
-            observations=[observations[i][1] for i in range(len(observations))],
-            job_ids=[observations[i][0] for i in range(len(observations))],
-            time=time,
-        )
+        meteor = executor.gather(futures, combine)
+        if not store:
+            return meteor
+
+        def calculate(astrometry):
+            meteor = astrometry.result()
+
+            # Results of stations which fell back to the fixed alignment are
+            # not stored, so that astrometry is tried again next time
+            if any(meteor.job_ids[i] is None and img_paths[i] is not None for i in range(len(stations))):
+                return meteor
+
+            # The results are calculated in a process and stored from a thread,
+            # so the astrometry threads only wait for the network
+            calculation = executor.submit_calculation(meteor)
+            return executor.then(calculation, lambda calculation: executor.threads.submit(save, meteor, calculation))
+
+        def save(meteor, calculation):
+            try:
+                meteor = calculation.result()
+            except Exception as e:
+                logging.warning(f'Meteor {label} could not be calculated: {e}')
+                return meteor
+
+            meteor.save_to_store(key, list(data_paths) + [path for path in img_paths if path])
+            return meteor
+
+        return executor.then(meteor, calculate)
     
     def from_astrometry_fixed(label: str,
                               stations: list[Station],
                               data_paths: list[str],
-                              time: Time):
-        """Constructs a meteor object from fixed camera alignment
+                              time: Time,
+                              store: bool = True,
+                              exact: bool = False):
+        """Constructs a meteor object from fixed camera alignment. Meteors
+        already computed from the same inputs are loaded from the result
+        store.
         
         Args:
             label (str): Meteor label
@@ -165,47 +472,129 @@ class Meteor:
             was observed
             data_paths (str): List of data.txt file paths to use for astrometry
             time: (Time): Time and date to which the measurements are related
+            store (bool): Whether to use the result store
+            exact (bool): Whether to transform every point through astropy
+            instead of one sky rotation, see get_meteor_coordinates_fixed()
         """
 
+        if store:
+            key = get_result_store().key(stations, time, data_paths, exact=exact)
+            meteor = get_result_store().load(key, label, stations, time)
+            if meteor is not None:
+                return meteor
+
         observations = [
             get_meteor_coordinates_fixed(data_paths[i],
                                          stations[i],
-                                         time) for i in range(len(stations))
+                                         time,
+                                         exact) for i in range(len(stations))
         ]
 
-        return Meteor(
+        meteor = Meteor(
             label,
             stations,
             observations,
             time,
-            [None, None]
+            [None] * len(stations)
         )
 
-    def calculate_radiant(self) -> None:
-        """Calculates the radiant of the meteor according to Ceplecha (1987)
+        if store:
+            meteor.save_to_store(key, data_paths)
 
-        Returns:
-            None
+        return meteor
+
+    def save_to_store(self, key: str, paths: list[str] = ()) -> None:
+        """Calculates the main results and saves them into the result store.
+        Failures are only logged, since the meteor itself is still usable.
+
+        Args:
+            key (str): Key of the inputs, see ResultStore.key()
+            paths (list[str]): Input files of the meteor
         """
 
-        aa, ba, ca = calculate_meteor_plane(self.observations[0])
-        ab, bb, cb = calculate_meteor_plane(self.observations[1])
-        
-        d = sqrt((ba * cb - bb * ca) ** 2 + (ab * ca - aa * cb) ** 2 + (aa * bb - ab * ba) ** 2)
+        # WCS files which do not exist are not inputs, the key marks them as
+        # missing instead
+        paths = list(paths) + [station.wcs_path for station in self.stations
+                               if station.wcs_path and os.path.exists(station.wcs_path)]
+        try:
+            get_result_store().save(key, self, paths)
+        except Exception as e:
+            logging.warning(f'Meteor {self.label} could not be stored: {e}')
+
+    @computed('observations')
+    def planes(self) -> numpy.ndarray:
+        """numpy.ndarray: meteor path planes of all stations, shape (S, 3)"""
+
+        return calculate_meteor_planes(self.observations)
+
+    @computed('stations', 'time')
+    def positions(self) -> numpy.ndarray:
+        """numpy.ndarray: station positions X, Y, Z in the sidereal frame,
+        shape (S, 3)"""
+
+        return numpy.array([station.get_geocentric_lst(self.time) for station in self.stations])
+
+    @computed('observations', 'times', 'positions')
+    def line_fit(self) -> list[numpy.ndarray]:
+        """list[numpy.ndarray]: least-squares line fit to the lines of sight
+        of all stations, see solve_lsq_trajectory()"""
 
-        Xi = (ba * cb - bb * ca) / d
-        Eta = (ab * ca - aa * cb) / d
-        Zeta = (aa * bb - ab * ba) / d
+        return self.solve_lsq_trajectory()
 
-        angle = degrees(acos(abs(aa*ab + ba*bb + ca*cb)) / sqrt((aa**2+ba**2+ca**2)*(ab**2+bb**2+cb**2)))
+    @computed('planes')
+    def radiant_vectors(self) -> list[numpy.ndarray]:
+        """list[numpy.ndarray]: radiant vectors and Q angles of all station
+        pairs (0, 1), (0, 2), ..., (1, 2), ..."""
 
-        ra, dec = solve_goniometry((Xi, Eta, Zeta))
+        planes = self.planes
+        first, second = numpy.triu_indices(len(self.stations), 1)
+        return calculate_radiant_vectors(planes[first], planes[second])
+
+    @computed('radiant_vectors', 'line_fit', 'engine', 'stations', 'time')
+    def radiant(self) -> list[float]:
+        """list[float]: radiant RA and Dec in decimal degrees according to
+        Ceplecha (1987). With more than two stations, the radiants of all
+        station pairs are combined, weighted by the convergence angle of
+        each pair."""
+
+        vectors, Q_angles = self.radiant_vectors
+
+        if self.engine == 'lsq':
+            # The radiant is opposite to the direction of flight of the fitted line
+            vector = -self.line_fit[1][0]
+        else:
+            vector = combine_radiant_vectors(vectors, calculate_pair_weights(Q_angles))
+
+        ra, dec = solve_goniometry_array([vector])
         # If the radiant is under the horizon, change sign of Xi, Eta, Zeta
-        if world_to_altaz(ra, dec, self.stations[0], self.time)[0] < 0 or world_to_altaz(ra, dec, self.stations[1], self.time)[0] < 0:
-            ra, dec = solve_goniometry((-Xi, -Eta, -Zeta))
+        if self.engine == 'plane' and any(world_to_altitude(ra[0], dec[0], station, self.time) < 0 for station in self.stations):
+            ra, dec = solve_goniometry_array([-vector])
+
+        return [float(ra[0]), float(dec[0])]
+
+    @computed('radiant_vectors')
+    def Q_angles(self) -> numpy.ndarray:
+        """numpy.ndarray: angles between planes of all station pairs in
+        decimal degrees"""
 
-        self.radiant = [ra, dec]
-        self.Q_angle = angle
+        return self.radiant_vectors[1]
+
+    @computed('Q_angles')
+    def Q_angle(self) -> float:
+        """float: the largest Q angle of all station pairs"""
+
+        return float(numpy.max(self.Q_angles))
+
+    def calculate_radiant(self) -> None:
+        """Recalculates the radiant of the meteor and the Q angles
+
+        Returns:
+            None
+        """
+
+        self.invalidate('radiant_vectors')
+        self.invalidate('radiant')
+        self.get_radiant()
 
     def get_radiant(self) -> list[float]:
         """Returns radiant coordinates in decimal degrees
@@ -214,24 +603,27 @@ class Meteor:
             list[float]: Radiant RA and Dec coordinates
         """
 
-        # If radiant isn't calculated yet, calculate
-        if self.radiant == None:
-            self.calculate_radiant()
-
         return self.radiant
     
     def get_Q_angle(self) -> float:
-        """Returns the angle between planes containing the meteor and observation stations
+        """Returns the angle between planes containing the meteor and observation stations,
+        the largest one of all station pairs
         
         Returns:
             float: the Q angle in decimal degrees
         """
 
-        # If the angle isn't calculated yet, calculate
-        if self.Q_angle == None:
-            self.calculate_radiant()
-
         return self.Q_angle
+
+    def get_Q_angles(self) -> numpy.ndarray:
+        """Returns the angles between planes of all station pairs, ordered
+        (0, 1), (0, 2), ..., (1, 2), ...
+        
+        Returns:
+            numpy.ndarray: the Q angles in decimal degrees
+        """
+
+        return self.Q_angles
     
     def plot_radiant(self) -> None:
         """Plots calculated meteor radiant and meteor tracks
@@ -240,152 +632,195 @@ class Meteor:
             None
         """
 
-        # If radiant isn't calculated yet, calculate
-        if self.radiant == None:
-            self.calculate_radiant()
-
         fig, ax = plot.subplots()
+        self.draw_radiant(ax)
 
-        # Plot the path from station A
-        x, y = [], []
-        for point in self.observations[0]:
-            ax.scatter(point[0], point[1], color = 'b')
-            x.append(point[0])
-            y.append(point[1])
-        ax.plot(x, y)
-        
-        # Plot the path from station B
-        x, y = [], []
-        for point in self.observations[1]:
-            ax.scatter(point[0], point[1], color = 'y')
-            x.append(point[0])
-            y.append(point[1])
-        ax.plot(x, y)
+        plot.show()
+
+    def draw_radiant(self, ax) -> None:
+        """Draws the meteor radiant and meteor tracks into existing axes
+
+        Args:
+            ax (Axes): matplotlib axes to draw into
+        """
+
+        # Plot the path from each station
+        colors = ['b', 'y', 'g', 'c', 'm']
+        for i, observation in enumerate(self.observations):
+            x, y = numpy.asarray(observation).T
+            ax.scatter(x, y, color = colors[i % len(colors)])
+            ax.plot(x, y)
 
         # Plot the radiant
         ax.scatter(self.radiant[0], self.radiant[1], color = 'r')
 
-        plot.show()
+    @computed('engine', 'planes', 'positions', 'line_fit', 'time', 'times')
+    def trajectory(self) -> Trajectory:
+        """Trajectory: meteor trajectories from all stations calculated with
+        the selected engine, merged by height"""
+
+        if self.engine == 'lsq':
+            raw = self.line_fit[2]
+        else:
+            raw = self.solve_plane_trajectory()
+
+        # Calculate GST
+        GST = self.time.sidereal_time('mean', 'greenwich').value / 24 * 360
+
+        # Convert to geodetic coordinates and rotate the longitude by GST
+        lat, lon, height = geocentric_to_geodetic_array(*raw.T)
+        lon = lon - GST
+        X, Y, Z = geodetic_to_geocentric_array(lat, lon, height)
+
+        trajectory = Trajectory.from_arrays(
+            lat, lon, height, X, Y, Z,
+            t=numpy.concatenate(self.times),
+            station=numpy.repeat(numpy.arange(len(self.times)),
+                                 [len(times) for times in self.times])
+        )
+
+        # Mesh trajectories together according to the height, always taking
+        # the data point with higher height value
+        trajectory.merge('height')
+
+        return trajectory
+
+    @computed('engine', 'line_fit')
+    def residuals(self) -> numpy.ndarray:
+        """numpy.ndarray: distances of all lines of sight from the fitted
+        trajectory in metres, available with the 'lsq' engine"""
+
+        if self.engine != 'lsq':
+            raise ValueError("Residuals are only available with the 'lsq' engine.")
+
+        return self.line_fit[3]
 
     def calculate_trajectories(self) -> None:
-        """Calculates meteor trajectories from both stations
+        """Recalculates meteor trajectories from all stations with the
+        selected engine
         
         Returns:
             None
         """
 
-        # Solve the station planes
-        vector_a = calculate_meteor_plane(self.observations[0]) + self.stations[0].get_geocentric_lst(self.time)
-        vector_b = calculate_meteor_plane(self.observations[1]) + self.stations[1].get_geocentric_lst(self.time)
+        self.invalidate('line_fit')
+        self.invalidate('trajectory')
+        self.get_trajectory()
 
-        # Calculate GST
-        GST = self.time.sidereal_time('mean', 'greenwich').value / 24 * 360
+    def solve_plane_trajectory(self) -> numpy.ndarray:
+        """Intersects the lines of sight from each station with the planes of
+        all other stations, weighted by the convergence angle of each pair
 
-        # Solve the intersection with the meteor plane
-        self.geocentric_trajectory_a = []
-        self.geodetic_trajectory_a = []
-        for point in self.observations[0]:
-            raw = calculate_meteor_point_vector(point, vector_a, vector_b)
-
-            lon, lat, height = geocentric_to_geodetic(raw)
-            cor = {'lat': lat, 'lon': lon - GST, 'height': height}
-
-            self.geodetic_trajectory_a.append(cor)
-            self.geocentric_trajectory_a.append(geodetic_to_geocentric(cor))
-
-        self.geocentric_trajectory_b = []
-        self.geodetic_trajectory_b = []
-        for point in self.observations[1]:
-            raw = calculate_meteor_point_vector(point, vector_b, vector_a)
-
-            lon, lat, height = geocentric_to_geodetic(raw)
-            cor = {'lat': lat, 'lon': lon - GST, 'height': height}
-
-            self.geodetic_trajectory_b.append(cor)
-            self.geocentric_trajectory_b.append(geodetic_to_geocentric(cor))
-
-        # Mesh trajectories together according to the height
-        self.merged_times = []
-        self.geocentric_trajectory = []
-        self.geodetic_trajectory = []
-
-        # Append the data point with higher height value
-        i, j = 0, 0
-        while i < len(self.times[0]) and j < len(self.times[1]):
-            if self.geodetic_trajectory_a[i]['height'] > self.geodetic_trajectory_b[j]['height']:
-                self.merged_times.append(self.times[0][i])
-                self.geocentric_trajectory.append(self.geocentric_trajectory_a[i])
-                self.geodetic_trajectory.append(self.geodetic_trajectory_a[i])
-                i += 1
-            else:
-                self.merged_times.append(self.times[1][j])
-                self.geocentric_trajectory.append(self.geocentric_trajectory_b[j])
-                self.geodetic_trajectory.append(self.geodetic_trajectory_b[j])
-                j += 1
-
-        # Append the rest
-        while i < len(self.times[0]):
-            self.merged_times.append(self.times[0][i])
-            self.geocentric_trajectory.append(self.geocentric_trajectory_a[i])
-            self.geodetic_trajectory.append(self.geodetic_trajectory_a[i])
-            i += 1
-
-        while j < len(self.times[1]):
-            self.merged_times.append(self.times[1][j])
-            self.geocentric_trajectory.append(self.geocentric_trajectory_b[j])
-            self.geodetic_trajectory.append(self.geodetic_trajectory_b[j])
-            j += 1
-
-    def get_trajectories_geocentric(self) -> list[list[list[float]]]:
-        """Returns the separate trajectories from both stations in geocentric coordinates
-        
         Returns:
-            list[list[list[float]]]
+            numpy.ndarray: points X, Y, Z in the sidereal frame, shape (N, 3)
         """
 
-        # If the geocentric trajectory isn't calculated yet, calculate
-        if self.geocentric_trajectory_a == None or self.geocentric_trajectory_b == None:
-            self.calculate_trajectories()
+        # Station planes and positions
+        planes = self.planes
+        vectors = numpy.column_stack((planes, self.positions))
+
+        # Weights of all station pairs from their Q angles
+        cos_Q = numpy.clip(numpy.abs(planes @ planes.T), 0, 1)
+        weights = calculate_pair_weights(numpy.degrees(numpy.arccos(cos_Q)))
+
+        # Solve the intersections with the meteor planes for all points at once
+        raw = []
+        for i, observation in enumerate(self.observations):
+            partners = [j for j in range(len(self.stations)) if j != i]
+            raw.append(calculate_meteor_point_vectors(observation, vectors[i],
+                                                      vectors[partners],
+                                                      weights[i, partners]))
+
+        return numpy.concatenate(raw)
 
-        return self.geocentric_trajectory_a, self.geocentric_trajectory_b
+    def solve_lsq_trajectory(self) -> list[numpy.ndarray]:
+        """Fits a single straight line to the lines of sight from all
+        stations at once
 
-    def get_trajectories_geodetic(self) -> list[list[list[float]]]:
-        """Returns the separate trajectories from both stations in geodetic coordinates
+        Returns:
+            list[numpy.ndarray]: point on the line and direction of flight,
+            shapes (1, 3), points X, Y, Z on the line closest to each line of
+            sight in the sidereal frame, shape (N, 3), and the distance of
+            each line of sight from the line in metres, shape (N,)
+        """
+
+        counts = [len(observation) for observation in self.observations]
+        origins = numpy.repeat(self.positions, counts, axis=0)
+
+        return fit_trajectory_lines(
+            origins,
+            calculate_meteor_points(numpy.concatenate(self.observations)),
+            times=numpy.concatenate(self.times),
+            tracks=numpy.repeat(numpy.arange(len(counts)), counts)
+        )
+
+    def get_trajectory(self) -> Trajectory:
+        """Returns the trajectory points from all stations
         
         Returns:
-            list[list[list[float]]]
+            Trajectory
         """
 
-        # If the geodetic trajectories aren't calculated yet, calculate
-        if self.geodetic_trajectory_a == None or self.geodetic_trajectory_b == None:
-            self.calculate_trajectories()
+        return self.trajectory
 
-        return self.geodetic_trajectory_a, self.geodetic_trajectory_b
-    
-    def save_trajectory_gpx(self) -> None:
-        """Save the geodetic trajectory in a .gpx file"""
+    def get_resampled_trajectory(self, times: numpy.ndarray = None,
+                                 kind: str = 'linear', offsets: numpy.ndarray = None) -> Trajectory:
+        """Returns the trajectories from all stations interpolated onto
+        a common timebase. The times of each station start at its first
+        frame, so without offsets the stations are assumed to have seen the
+        meteor start at the same moment.
 
-        # If the geodetic trajectories aren't calculated yet, calculate
-        if self.geodetic_trajectory_a == None or self.geodetic_trajectory_b == None:
-            self.calculate_trajectories()
+        Args:
+            times (numpy.ndarray): Times in seconds to resample to, defaults
+            to all observation times covered by every station
+            kind (str): 'linear' or 'spline'
+            offsets (numpy.ndarray): Seconds added to the times of each
+            station, e.g. the differences of the recording start times
 
-        gpx = '<?xml version="1.0" encoding="UTF-8"?><gpx xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns="http://www.topografix.com/GPX/1/1" xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd http://www.garmin.com/xmlschemas/GpxExtensions/v3 http://www.garmin.com/xmlschemas/GpxExtensionsv3.xsd http://www.garmin.com/xmlschemas/TrackPointExtension/v1 http://www.garmin.com/xmlschemas/TrackPointExtensionv1.xsd http://www.topografix.com/GPX/gpx_style/0/2 http://www.topografix.com/GPX/gpx_style/0/2/gpx_style.xsd" xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1" xmlns:gpxx="http://www.garmin.com/xmlschemas/GpxExtensions/v3" xmlns:gpx_style="http://www.topografix.com/GPX/gpx_style/0/2" version="1.1" creator="https://gpx.studio"><metadata>    <name>Meteory</name>    <author>        <name>gpx.studio</name>        <link href="https://gpx.studio"></link>    </author></metadata>'
+        Returns:
+            Trajectory: resampled trajectory merged by time
+        """
 
-        # Add stations
-        gpx += f'<wpt lat="{self.stations[0].geodetic["lat"]}" lon="{self.stations[0].geodetic["lon"]}"><ele>{self.stations[0].geodetic["height"]}</ele><name>{self.stations[0].label}</name></wpt>'
-        gpx += f'<wpt lat="{self.stations[1].geodetic["lat"]}" lon="{self.stations[1].geodetic["lon"]}"><ele>{self.stations[1].geodetic["height"]}</ele><name>{self.stations[1].label}</name></wpt>'
+        return self.get_trajectory().resample(times, kind, offsets)
 
-        # Add trajectories
-        gpx += f'<trk><name>Trajectory {self.label}</name><trkseg>'
-        for point in self.geodetic_trajectory:
-            gpx += f'<trkpt lat="{point["lat"]}" lon="{point["lon"]}"><ele>{point["height"]}</ele></trkpt>'
-        gpx += '</trkseg></trk>'
+    def get_residuals(self) -> numpy.ndarray:
+        """Returns the distances of all lines of sight from the fitted
+        trajectory, available with the 'lsq' engine
+        
+        Returns:
+            numpy.ndarray: residuals in metres, ordered by station
+        """
 
-        # Terminate the gpx file
-        gpx += '</gpx>'
+        return self.residuals
 
-        # Write the gpx to a file
-        open(f'{self.label}.gpx', 'w').write(gpx)
+    def get_trajectories_geocentric(self) -> list[numpy.ndarray]:
+        """Returns the separate trajectories from all stations in geocentric coordinates
+        
+        Returns:
+            list[numpy.ndarray]: X, Y, Z arrays of shape (N, 3)
+        """
+
+        trajectory = self.get_trajectory()
+        return [trajectory.station(i).geocentric for i in range(len(self.stations))]
+
+    def get_trajectories_geodetic(self) -> list[Trajectory]:
+        """Returns the separate trajectories from all stations in geodetic coordinates
+        
+        Returns:
+            list[Trajectory]: views with lat, lon and height columns
+        """
+
+        trajectory = self.get_trajectory()
+        return [trajectory.station(i) for i in range(len(self.stations))]
+    
+    def save_trajectory_gpx(self, path: str = None) -> None:
+        """Save the geodetic trajectory in a .gpx file
+        
+        Args:
+            path (str): Output file, '{label}.gpx' by default
+        """
+
+        export_trajectories([self], path or f'{self.label}.gpx', 'gpx')
 
     def plot_trajectory_geodetic(self) -> None:
         """Plots the geodetic trajectory with matplotlib
@@ -394,132 +829,144 @@ class Meteor:
             None
         """
 
-        if self.geodetic_trajectory == None:
-            self.calculate_trajectories()
-
         fig = plot.figure(figsize=(8,8))
         ax = fig.add_axes([0.1,0.1,0.8,0.8])
+        self.draw_trajectory_geodetic(ax)
+
+        return plot, fig
+
+    def draw_trajectory_geodetic(self, ax, config: dict = None) -> None:
+        """Draws the geodetic trajectory over the background map into
+        existing axes
+
+        Args:
+            ax (Axes): matplotlib axes to draw into
+            config (dict): post_processing settings, read from config.toml
+            if not set
+        """
+
+        merged = self.get_trajectory().merged()
 
-        # Set up the background map
-        m = Basemap(projection = 'stere', rsphere = 6371200.,
-                    resolution = 'i', area_thresh = 10000,
-                    lat_0 = 50, lon_0 = 15,
-                    width=1200000, height=800000)
+        # Read the plot settings once
+        if config is None:
+            config = load_plot_config()
 
-        if ConfigLoader().get_value_from_data('plt_style', 'post_processing') == 'dark':
+        if config.get('plt_style') == 'dark':
             plt_color = 'white'
         else:
             plt_color = 'black'
 
-        m.drawcoastlines(color=plt_color)
-        m.drawcountries(color=plt_color)
-
-        if ConfigLoader().get_value_from_data('map_style', 'post_processing') == 'shaderelief':
-            m.shadedrelief()
-            logging.info('Using shaded relief map style')
-        elif ConfigLoader().get_value_from_data('map_style', 'post_processing') == 'bluemarble':
-            m.bluemarble()
-            logging.info('Using blue marble map style')
+        # Draw the cached background map
+        m, background = get_map_background(plt_color, config.get('map_style'))
+        ax.imshow(background, extent=(m.xmin, m.xmax, m.ymin, m.ymax),
+                  origin='upper', interpolation='bilinear')
+        ax.set_xlim(m.xmin, m.xmax)
+        ax.set_ylim(m.ymin, m.ymax)
+        ax.set_xticks([])
+        ax.set_yticks([])
 
         # Draw stations
         for station in self.stations:
-            m.scatter(
-                latlon = True,
-                x = station.lon,
-                y = station.lat,
-                color='red'
-            )
+            x, y = m(station.lon, station.lat)
+            ax.scatter(x, y, color='red')
             
-            plot.annotate(
-                station.label,
-                m(station.lon, station.lat)
-            )
+            ax.annotate(station.label, (x, y))
         
         # Draw meteor trajectories
-        x, y, heights = [], [], []
-        for point in self.geodetic_trajectory:
-            x.append(point['lon'])
-            y.append(point['lat'])
-
-            heights.append(point['height'])
-
-        x, y = m(x, y)
-        plot.title(f'Meteor {self.label}')
-        m.plot(x, y, linewidth=1.5, color='blue')
+        heights = merged['height']
+        x, y = m(merged['lon'], merged['lat'])
+        ax.set_title(f'Meteor {self.label}')
+        ax.plot(x, y, linewidth=1.5, color='blue')
 
         # Add height marks
         for i in [0, len(x) - 1]:
-            plot.annotate(f'{(int)(round(self.merged_times[i], 2) * 100)} ms; {round(heights[i] / 1000, 1)} km', (x[i], y[i]))
+            ax.annotate(f'{(int)(round(merged["t"][i], 2) * 100)} ms; {round(heights[i] / 1000, 1)} km', (x[i], y[i]))
 
         # Draw the first and last points with special markers
-        m.scatter(x[0], y[0], marker='^', color='blue')
-        m.scatter(x[-1], y[-1], marker='x', color='blue')
-            
-        return plot, fig
+        ax.scatter(x[0], y[0], marker='^', color='blue')
+        ax.scatter(x[-1], y[-1], marker='x', color='blue')
+
+    @computed('trajectory')
+    def distances(self) -> list[numpy.ndarray]:
+        """list[numpy.ndarray]: distances of points on all trajectories from
+        the first points"""
+
+        trajectory = self.get_trajectory()
+        ends = numpy.searchsorted(trajectory['station'], numpy.arange(1, len(self.stations)))
+
+        return [numpy.linalg.norm(track - track[0], axis=1)
+                for track in numpy.split(trajectory.geocentric, ends)]
 
     def calculate_distances(self) -> None:
-        """Calculates the distance of each point on both trajectories from
+        """Recalculates the distance of each point on all trajectories from
         the first points.
 
         Returns:
             None
         """
 
-        # If the geocentric trajectories aren't calculated yet, calculate
-        if self.geocentric_trajectory_a == None or self.geocentric_trajectory_b == None:
-            self.calculate_trajectories()
-
-        self.distance_from_beginning_a = []
-        beginning = self.geocentric_trajectory_a[0]
-        for point in self.geocentric_trajectory_a:
-            self.distance_from_beginning_a.append(sqrt((beginning[0] - point[0]) ** 2 + (beginning[1] - point[1]) ** 2 + (beginning[2] - point[2]) ** 2))
+        self.invalidate('distances')
+        self.get_distances()
 
-        self.distance_from_beginning_b = []
-        beginning = self.geocentric_trajectory_b[0]
-        for point in self.geocentric_trajectory_b:
-            self.distance_from_beginning_b.append(sqrt((beginning[0] - point[0]) ** 2 + (beginning[1] - point[1]) ** 2 + (beginning[2] - point[2]) ** 2))
-
-    def get_distances(self) -> list[list[float]]:
-        """Returns the distances of points on both trajectories from
+    def get_distances(self) -> list[numpy.ndarray]:
+        """Returns the distances of points on all trajectories from
         the first point
         
         Returns:
-            list[list[float]]
+            list[numpy.ndarray]
         """
 
-        # If the distances aren't calculated yet, calculate
-        if self.distance_from_beginning_a == None or self.distance_from_beginning_b == None:
-            self.calculate_distances()
+        return self.distances
+
+    @computed('trajectory')
+    def path_lengths(self) -> list[numpy.ndarray]:
+        """list[numpy.ndarray]: path lengths along all trajectories from the
+        first points, summed over all segments between the points, used by
+        the kinematic models"""
+
+        trajectory = self.get_trajectory()
+        lengths = calculate_path_lengths(trajectory.geocentric, trajectory['station'])
+
+        ends = numpy.searchsorted(trajectory['station'], numpy.arange(1, len(self.stations)))
+        return numpy.split(lengths, ends)
 
-        return self.distance_from_beginning_a, self.distance_from_beginning_b
+    def get_path_lengths(self) -> list[numpy.ndarray]:
+        """Returns the path lengths along all trajectories from the first
+        points. Unlike get_distances(), every segment between the points is
+        added, so scattered points make the path longer.
+        
+        Returns:
+            list[numpy.ndarray]
+        """
+
+        return self.path_lengths
     
-    def calculate_velocities(self) -> None:
-        """Calculates the velocity of meteor at each point in both trajectories"""
+    @computed('distances', 'times')
+    def velocities(self) -> list[numpy.ndarray]:
+        """list[numpy.ndarray]: average velocities from the first point at
+        all other points of all trajectories"""
+
+        velocities = []
+        for distances, times in zip(self.get_distances(), self.times):
+            times = numpy.asarray(times)
+            velocities.append(distances[1:] / (times[1:] - times[0]))
 
-        # If the geocentric trajectories aren't calculated yet, calculate
-        if self.distance_from_beginning_b == None or self.distance_from_beginning_b == None:
-            self.calculate_distances()
+        return velocities
 
-        self.velocities_a = []
-        for i in range(1, len(self.geocentric_trajectory_a)):
-            self.velocities_a.append(self.distance_from_beginning_a[i]/(self.times[0][i] - self.times[0][0]))
+    def calculate_velocities(self) -> None:
+        """Recalculates the velocity of meteor at each point in all trajectories"""
 
-        self.velocities_b = []
-        for i in range(1, len(self.geocentric_trajectory_b)):
-            self.velocities_b.append(self.distance_from_beginning_b[i]/(self.times[1][i] - self.times[1][0]))
+        self.invalidate('velocities')
+        self.get_velocities()
 
-    def get_velocities(self) -> list[list[float]]:
-        """Returns the velocities at all but the first points from both trajectories
+    def get_velocities(self) -> list[numpy.ndarray]:
+        """Returns the velocities at all but the first points from all trajectories
         
         Returns:
-            list[list[float]]
+            list[numpy.ndarray]
         """
 
-        # If the velocities aren't calculated yet, calculate
-        if self.velocities_a == None or self.velocities_b == None:
-            self.calculate_velocities()
-
-        return self.velocities_a, self.velocities_b
+        return self.velocities
     
     def plot_velocities(self) -> None:
         """Plots a velocity vs time graph
@@ -528,25 +975,572 @@ class Meteor:
             None
         """
 
-        # If the velocities aren't calculated yet, calculate
-        if self.velocities_a == None or self.velocities_b == None:
-            self.calculate_velocities()
-
         fig, ax = plot.subplots()
+        self.draw_velocities(ax)
 
-        x, y = [], []
-        for i in range(len(self.velocities_a)):
-            x.append(self.times[0][i + 1])
-            y.append(self.velocities_a[i])
-        ax.plot(x, y)
+        plot.show()
 
-        x, y = [], []
-        for i in range(len(self.velocities_b)):
-            x.append(self.times[1][i + 1])
-            y.append(self.velocities_b[i])
-        ax.plot(x, y)
+    def draw_velocities(self, ax) -> None:
+        """Draws the velocity vs time graph into existing axes
 
-        plot.show()
+        Args:
+            ax (Axes): matplotlib axes to draw into
+        """
+
+        for velocities, times in zip(self.get_velocities(), self.times):
+            ax.plot(times[1:], velocities)
+
+    @computed('trajectory', 'path_lengths')
+    def kinematics(self) -> dict:
+        """dict: linear and exponential deceleration models of Whipple and
+        Jacchia fitted to the path lengths of all trajectories at once, see
+        get_kinematics()"""
+
+        trajectory = self.get_trajectory()
+        lengths = numpy.concatenate(self.get_path_lengths())
+        ends = numpy.searchsorted(trajectory['station'], numpy.arange(1, len(self.stations)))
+
+        linear, linear_residuals = fit_linear_models(lengths, trajectory['t'], trajectory['station'])
+        deceleration, residuals = fit_deceleration_models(lengths, trajectory['t'], trajectory['station'])
+
+        return {
+            'velocities': linear[:, 1],
+            'initial_velocities': calculate_model_velocities(deceleration, 0),
+            'linear': linear,
+            'deceleration': deceleration,
+            'linear_residuals': numpy.split(linear_residuals, ends),
+            'residuals': numpy.split(residuals, ends)
+        }
+
+    def calculate_kinematics(self) -> None:
+        """Refits the linear and the exponential deceleration model of
+        Whipple and Jacchia to the path lengths of all trajectories
+
+        Returns:
+            None
+        """
+
+        self.invalidate('kinematics')
+        self.get_kinematics()
+
+    def get_kinematics(self) -> dict:
+        """Returns the kinematic models of all trajectories
+        
+        Returns:
+            dict: Average velocities of the linear model and initial
+            velocities of the deceleration model in m/s, one for each
+            station, parameters l0, v of the linear and l0, v, a1, a2 of the
+            deceleration model with time from the first point of each
+            station, and residuals of both models in metres. Trajectories
+            too short for a model have NaN parameters, velocities and
+            residuals.
+        """
+
+        return self.kinematics
+
+    @computed('radiant', 'kinematics', 'trajectory', 'time')
+    def orbit(self) -> numpy.void:
+        """numpy.void: heliocentric orbit from the radiant and the mean
+        initial velocity of all stations with enough points for the
+        deceleration model, see calculate_orbits()"""
+
+        # Highest point of the trajectory in the sidereal frame
+        trajectory = self.get_trajectory()
+        first = trajectory.data[trajectory.order[0]]
+        GST = self.time.sidereal_time('mean', 'greenwich').value / 24 * 360
+        position = geodetic_to_geocentric_array(first['lat'], first['lon'] + GST, first['height'])
+
+        return calculate_orbits(
+            [self.get_radiant()],
+            [numpy.nanmean(self.get_kinematics()['initial_velocities'])],
+            [position],
+            self.time
+        )[0]
+
+    def get_orbit(self) -> numpy.void:
+        """Returns the heliocentric orbit of the meteor
+        
+        Returns:
+            numpy.void: record of ORBIT_DTYPE with the geocentric radiant
+            ra_g, dec_g in decimal degrees, velocities v_g, v_h in m/s and
+            the orbital elements a, q in AU, e, and i, omega, node in
+            decimal degrees
+        """
+
+        return self.orbit
+
+    def estimate_uncertainty(self, n_samples: int = 1000,
+                             sigma: float = 0.01,
+                             noise_model=None,
+                             seed: int = None) -> dict:
+        """Estimates the uncertainty of the radiant, trajectory and velocities
+        by Monte Carlo. The RA/Dec observations are perturbed n_samples times
+        and all samples are propagated through the planes, radiant,
+        trajectory and velocities as stacked arrays of shape
+        (n_samples, n_points, 3), without a loop over the samples.
+
+        Args:
+            n_samples (int): Number of Monte Carlo samples
+            sigma (float): Standard deviation of the default Gaussian noise
+            in decimal degrees on the sky
+            noise_model (callable): Function (rng, shape) returning the RA and
+            Dec offsets in decimal degrees on the sky for all samples and
+            points, shape (n_samples, n_points, 2), replaces the Gaussian noise
+            seed (int): Seed of the random number generator
+
+        Returns:
+            dict: Standard deviations of the radiant RA and Dec and the
+            Q angle in decimal degrees, and for each station of the heights
+            and positions X, Y, Z in metres and of the velocities in m/s
+        """
+
+        rng = numpy.random.default_rng(seed)
+
+        counts = [len(observation) for observation in self.observations]
+        starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+        ends = numpy.cumsum(counts)
+        points = numpy.concatenate(self.observations)
+        shape = (n_samples, len(points), 2)
+
+        # Perturb the observations, RA offsets are scaled to the sky
+        if noise_model is None:
+            noise = rng.normal(0, sigma, shape)
+        else:
+            noise = numpy.asarray(noise_model(rng, shape), dtype=float)
+
+        samples = numpy.empty(shape)
+        samples[..., 0] = points[:, 0] + noise[..., 0] / numpy.cos(numpy.radians(points[:, 1]))
+        samples[..., 1] = points[:, 1] + noise[..., 1]
+
+        lines = calculate_meteor_points(samples)
+        planes = calculate_plane_normals(lines, starts)
+        positions = self.positions
+
+        # Radiant and Q angle of the best station pair for every sample
+        first, second = numpy.triu_indices(len(self.stations), 1)
+        vectors, Q_angles = calculate_radiant_vectors(planes[:, first], planes[:, second])
+
+        if self.engine == 'lsq':
+            # Every sample is a separate meteor with its own tracks
+            track_count = len(self.stations)
+            tracks = numpy.repeat(numpy.arange(track_count), counts)
+            line_points, directions, raw, _ = fit_trajectory_lines(
+                numpy.tile(positions[tracks], (n_samples, 1)),
+                lines.reshape(-1, 3),
+                tracks=(numpy.arange(n_samples)[:, None] * track_count + tracks).ravel(),
+                groups=numpy.repeat(numpy.arange(n_samples), len(points)),
+                times=numpy.tile(numpy.concatenate(self.times), n_samples)
+            )
+            radiants = -directions
+            raw = raw.reshape(n_samples, len(points), 3)
+        else:
+            radiants = combine_radiant_vectors(vectors, calculate_pair_weights(Q_angles))
+
+            # Weights of all station pairs from their Q angles in every sample
+            cos_Q = numpy.clip(numpy.abs(planes @ planes.transpose(0, 2, 1)), 0, 1)
+            weights = calculate_pair_weights(numpy.degrees(numpy.arccos(cos_Q)))
+            stations = numpy.concatenate(
+                (planes, numpy.broadcast_to(positions, planes.shape)), axis=-1)
+
+            raw = numpy.empty((n_samples, len(points), 3))
+            for i in range(len(self.stations)):
+                partners = [j for j in range(len(self.stations)) if j != i]
+                raw[:, starts[i]:ends[i]] = calculate_meteor_point_vectors(
+                    samples[:, starts[i]:ends[i]], stations[:, i],
+                    stations[:, partners], weights[:, i, partners]
+                )
+
+        # Orient all sampled radiants like the nominal one
+        nominal = calculate_meteor_points(self.get_radiant())
+        radiants = radiants * numpy.where(radiants @ nominal < 0, -1.0, 1.0)[:, None]
+        ra, dec = solve_goniometry_array(radiants)
+        ra = (ra - self.radiant[0] + 180) % 360 - 180
+
+        heights = geocentric_to_geodetic_array(*numpy.moveaxis(raw, -1, 0))[2]
+
+        self.uncertainty = {
+            'radiant': [float(numpy.std(ra)), float(numpy.std(dec))],
+            'Q_angle': float(numpy.std(numpy.max(Q_angles, axis=-1))),
+            'heights': [],
+            'positions': [],
+            'velocities': []
+        }
+
+        # Spread of the trajectory and velocities of each station
+        for start, end, times in zip(starts, ends, self.times):
+            times = numpy.asarray(times)
+            track = raw[:, start:end]
+            distances = numpy.linalg.norm(track - track[:, :1], axis=-1)
+
+            self.uncertainty['heights'].append(numpy.std(heights[:, start:end], axis=0))
+            self.uncertainty['positions'].append(numpy.std(track, axis=0))
+            self.uncertainty['velocities'].append(
+                numpy.std(distances[:, 1:] / (times[1:] - times[0]), axis=0))
+
+        return self.uncertainty
+
+class MeteorBatch:
+    """Radiant calculation for many meteors observed from station pairs at
+    once. All meteor planes, radiant vectors, Q angles and RA/Dec values are
+    computed as array operations over the whole batch.
+
+    Usage:
+        ```python
+        batch = MeteorBatch.from_meteors(meteors)
+        radiants = batch.get_radiants()
+        ```
+    """
+
+    labels: list[str]
+
+    # Station and observation information
+    stations: list[list[Station]]
+    observations: list[list[numpy.ndarray]]
+    times: Time
+
+    # Radiant information
+    radiants: numpy.ndarray
+    Q_angles: numpy.ndarray
+
+    # Least-squares trajectory information
+    line_points: numpy.ndarray
+    line_directions: numpy.ndarray
+    positions: numpy.ndarray
+    residuals: list[numpy.ndarray]
+
+    # Kinematic and orbit information
+    kinematics: dict
+    orbits: numpy.ndarray
+
+    def __init__(self, labels: list[str],
+                 stations: list[list[Station]],
+                 observations,
+                 times: Time) -> None:
+        """Args:
+            labels (list[str]): Meteor labels
+            stations (list[list[Station]]): Pair of Stations for each meteor
+            observations: RA and Dec observations of each meteor from both
+            stations, either ragged as a list of pairs of (M, 2) arrays or
+            padded with NaN as an array of shape (N, 2, M, 2), optionally
+            with time values as a third column
+            times (Time): Time and date of each meteor
+        """
+
+        self.labels = list(labels)
+        self.stations = [list(pair) for pair in stations]
+        self.times = Time(times)
+
+        # Separate coordinate and time values and drop padding
+        self.observations = []
+        self.observation_times = []
+        for pair in observations:
+            tracks, times_ = [], []
+            for track in pair:
+                track = numpy.asarray(track, dtype=float)
+                track = track[~numpy.isnan(track[:, :2]).any(axis=1)]
+                tracks.append(track[:, :2])
+                times_.append(track[:, 2] if track.shape[1] > 2 else None)
+            self.observations.append(tracks)
+            self.observation_times.append(times_)
+
+        # Define yet uncalculated values
+        self.radiants = None
+        self.Q_angles = None
+
+        self.line_points = None
+        self.line_directions = None
+        self.positions = None
+        self.residuals = None
+
+        self.kinematics = None
+        self.orbits = None
+
+    @staticmethod
+    def from_meteors(meteors: list[Meteor]) -> 'MeteorBatch':
+        """Constructs a batch from Meteor instances
+
+        Args:
+            meteors (list[Meteor]): Meteors observed from two stations
+
+        Returns:
+            MeteorBatch
+        """
+
+        return MeteorBatch(
+            labels=[meteor.label for meteor in meteors],
+            stations=[meteor.stations[:2] for meteor in meteors],
+            observations=[
+                [numpy.column_stack((observation, times))
+                 for observation, times in zip(meteor.observations[:2], meteor.times[:2])]
+                for meteor in meteors
+            ],
+            times=Time([meteor.time for meteor in meteors])
+        )
+
+    def calculate_radiants(self) -> None:
+        """Calculates the radiants of all meteors according to
+        Ceplecha (1987)
+
+        Returns:
+            None
+        """
+
+        planes = calculate_meteor_planes(
+            [track for pair in self.observations for track in pair]
+        )
+        vectors, self.Q_angles = calculate_radiant_vectors(planes[0::2], planes[1::2])
+        ra, dec = solve_goniometry_array(vectors)
+
+        # If the radiant is under the horizon, change sign of Xi, Eta, Zeta
+        alt_a = world_to_altitude_array(ra, dec, [pair[0] for pair in self.stations], self.times)
+        alt_b = world_to_altitude_array(ra, dec, [pair[1] for pair in self.stations], self.times)
+
+        flip = (alt_a < 0) | (alt_b < 0)
+        vectors[flip] = -vectors[flip]
+
+        self.radiants = numpy.column_stack(solve_goniometry_array(vectors))
+
+    def get_radiants(self) -> numpy.ndarray:
+        """Returns radiant coordinates of all meteors in decimal degrees
+        
+        Returns:
+            numpy.ndarray: Radiant RA and Dec coordinates, shape (N, 2)
+        """
+
+        # If radiants aren't calculated yet, calculate
+        if self.radiants is None:
+            self.calculate_radiants()
+
+        return self.radiants
+
+    def get_Q_angles(self) -> numpy.ndarray:
+        """Returns the angles between planes containing the meteors and
+        observation stations
+        
+        Returns:
+            numpy.ndarray: the Q angles in decimal degrees, shape (N,)
+        """
+
+        # If the angles aren't calculated yet, calculate
+        if self.Q_angles is None:
+            self.calculate_radiants()
+
+        return self.Q_angles
+
+    def calculate_lines(self) -> None:
+        """Fits straight trajectories to the lines of sight of all meteors in
+        a single least-squares solve
+
+        Returns:
+            None
+        """
+
+        tracks = [track for pair in self.observations for track in pair]
+        counts = numpy.array([len(track) for track in tracks])
+
+        # Station positions at the local sidereal time of each meteor
+        stations = [station for pair in self.stations for station in pair]
+        times = self.times[numpy.repeat(numpy.arange(len(self)), 2)] \
+                + u.hour * numpy.array([station.time_zone for station in stations])
+        lst = times.sidereal_time('mean', longitude=[station.lon for station in stations] * u.deg)
+        positions = numpy.column_stack(geodetic_to_geocentric_array(
+            [station.lat for station in stations], lst.degree,
+            [station.height for station in stations]
+        ))
+
+        # Orient the lines by time only if all tracks have time values
+        times = [times for pair in self.observation_times for times in pair]
+        if any(t is None for t in times):
+            times = None
+        else:
+            times = numpy.concatenate(times)
+
+        self.line_points, self.line_directions, self.positions, residuals = fit_trajectory_lines(
+            numpy.repeat(positions, counts, axis=0),
+            calculate_meteor_points(numpy.concatenate(tracks)),
+            tracks=numpy.repeat(numpy.arange(len(tracks)), counts),
+            groups=numpy.repeat(numpy.arange(len(tracks)) // 2, counts),
+            times=times
+        )
+
+        # Split the residuals by meteor
+        ends = numpy.cumsum(counts)[1::2]
+        self.residuals = numpy.split(residuals, ends[:-1])
+
+    def get_lines(self) -> list[numpy.ndarray]:
+        """Returns the fitted straight trajectories of all meteors in the
+        sidereal frame
+
+        Returns:
+            list[numpy.ndarray]: points on the lines and directions of
+            flight, shape (N, 3) each
+        """
+
+        # If the lines aren't calculated yet, calculate
+        if self.line_points is None:
+            self.calculate_lines()
+
+        return self.line_points, self.line_directions
+
+    def calculate_kinematics(self) -> None:
+        """Fits the linear and the exponential deceleration model of Whipple
+        and Jacchia to the path lengths along the fitted lines of all
+        meteors at once
+
+        Returns:
+            None
+        """
+
+        times = [times for pair in self.observation_times for times in pair]
+        if any(t is None for t in times):
+            raise ValueError("Time values of all observations are required for kinematics.")
+
+        if self.positions is None:
+            self.calculate_lines()
+
+        counts = [len(t) for t in times]
+        tracks = numpy.repeat(numpy.arange(len(times)), counts)
+        times = numpy.concatenate(times)
+        lengths = calculate_path_lengths(self.positions, tracks)
+
+        linear, _ = fit_linear_models(lengths, times, tracks)
+        deceleration, _ = fit_deceleration_models(lengths, times, tracks)
+
+        self.kinematics = {
+            'velocities': linear[:, 1].reshape(-1, 2),
+            'initial_velocities': calculate_model_velocities(deceleration, 0).reshape(-1, 2),
+            'linear': linear.reshape(-1, 2, 2),
+            'deceleration': deceleration.reshape(-1, 2, 4)
+        }
+
+    def get_kinematics(self) -> dict:
+        """Returns the kinematic models of all meteors
+        
+        Returns:
+            dict: Average and initial velocities in m/s, shape (N, 2), and
+            parameters of the linear and deceleration models, shapes
+            (N, 2, 2) and (N, 2, 4), for both stations of each meteor
+        """
+
+        # If the models aren't fitted yet, fit
+        if self.kinematics is None:
+            self.calculate_kinematics()
+
+        return self.kinematics
+
+    def calculate_orbits(self) -> None:
+        """Calculates heliocentric orbits of all meteors at once from the
+        radiants and the mean initial velocities of both stations
+
+        Returns:
+            None
+        """
+
+        kinematics = self.get_kinematics()
+
+        # First point on the fitted line of each meteor
+        counts = [len(track) for pair in self.observations for track in pair]
+        starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))[0::2]
+
+        self.orbits = calculate_orbits(
+            self.get_radiants(),
+            numpy.nanmean(kinematics['initial_velocities'], axis=1),
+            self.positions[starts],
+            self.times
+        )
+
+    def get_orbits(self) -> numpy.ndarray:
+        """Returns the heliocentric orbits of all meteors
+        
+        Returns:
+            numpy.ndarray: structured array of ORBIT_DTYPE, shape (N,)
+        """
+
+        # If the orbits aren't calculated yet, calculate
+        if self.orbits is None:
+            self.calculate_orbits()
+
+        return self.orbits
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+def load_plot_config() -> dict:
+    """Reads the post_processing plot settings from config.toml
+
+    Returns:
+        dict: the settings, empty if there is no config file
+    """
+
+    try:
+        return ConfigLoader().load_config().get('post_processing', {})
+    except FileNotFoundError:
+        return {}
+
+def get_map_background(color: str = 'black', style: str = None) -> list:
+    """Returns the projection and the rendered background of the trajectory
+    map with coastlines, countries and an optional relief. The background
+    is rendered only once for each style and kept in memory and on disk,
+    later maps only need the projection, which is built without reading
+    any coastline data.
+
+    Args:
+        color (str): Color of coastlines and borders
+        style (str): 'shaderelief', 'bluemarble' or None for no relief
+
+    Returns:
+        list: Basemap projection and RGBA background image covering
+        (m.xmin, m.xmax, m.ymin, m.ymax)
+    """
+
+    key = (color, style)
+    if key in map_backgrounds:
+        return map_backgrounds[key]
+
+    digest = hashlib.sha1(repr((sorted(MAP_PROJECTION.items()), color, style, MAP_DPI)).encode()).hexdigest()
+    path = os.path.join(MAP_CACHE_DIR, f'{digest}.npy')
+
+    if os.path.exists(path):
+        m = Basemap(resolution=None, **MAP_PROJECTION)
+        background = numpy.load(path)
+    else:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        m = Basemap(resolution='i', area_thresh=10000, **MAP_PROJECTION)
+
+        # Render on a transparent figure of the map's aspect ratio
+        width = 8
+        fig = Figure(figsize=(width, width * (m.ymax - m.ymin) / (m.xmax - m.xmin)), dpi=MAP_DPI)
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
+        fig.patch.set_alpha(0)
+        ax.patch.set_alpha(0)
+
+        m.drawcoastlines(color=color, ax=ax)
+        m.drawcountries(color=color, ax=ax)
+
+        if style == 'shaderelief':
+            m.shadedrelief(ax=ax)
+            logging.info('Using shaded relief map style')
+        elif style == 'bluemarble':
+            m.bluemarble(ax=ax)
+            logging.info('Using blue marble map style')
+
+        ax.set_xlim(m.xmin, m.xmax)
+        ax.set_ylim(m.ymin, m.ymax)
+        canvas.draw()
+        background = numpy.array(canvas.buffer_rgba())
+
+        try:
+            os.makedirs(MAP_CACHE_DIR, exist_ok=True)
+            numpy.save(path, background)
+        except OSError as e:
+            logging.warning(f'Map background could not be cached: {e}')
+
+    map_backgrounds[key] = m, background
+    return m, background
 
 def calculate_meteor_plane(points: list[float]) -> list[float]:
     """Calculates meteor path plane according to equations 9 and 11
@@ -559,15 +1553,13 @@ def calculate_meteor_plane(points: list[float]) -> list[float]:
     """
 
     # Calculate equation 9 for all meteor points
-    xi_eta, eta_zeta, eta_eta, xi_zeta, xi_xi = 0, 0, 0, 0, 0
-    for point in points:
-        Xi, Eta, Zeta = calculate_meteor_point(point)
+    Xi, Eta, Zeta = calculate_meteor_points(points).T
 
-        xi_eta += Xi * Eta
-        eta_zeta += Eta * Zeta
-        eta_eta += Eta ** 2
-        xi_zeta += Xi * Zeta
-        xi_xi += Xi ** 2
+    xi_eta = float(numpy.sum(Xi * Eta))
+    eta_zeta = float(numpy.sum(Eta * Zeta))
+    eta_eta = float(numpy.sum(Eta ** 2))
+    xi_zeta = float(numpy.sum(Xi * Zeta))
+    xi_xi = float(numpy.sum(Xi ** 2))
 
     # Calculate equation 11
     a_dash = xi_eta * eta_zeta - eta_eta * xi_zeta
@@ -581,6 +1573,124 @@ def calculate_meteor_plane(points: list[float]) -> list[float]:
 
     return a, b, c
 
+def calculate_meteor_planes(tracks: list[numpy.ndarray]) -> numpy.ndarray:
+    """Calculates meteor path planes of many tracks at once according to
+    equations 9 and 11
+
+    Args:
+        tracks (list[numpy.ndarray]): ra and dec coordinates of meteor points
+        for each track, ragged list of (M, 2) arrays
+
+    Returns:
+        numpy.ndarray: vectors (a, b, c) describing meteor path planes,
+        shape (K, 3)
+    """
+
+    lengths = numpy.array([len(track) for track in tracks])
+    starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+
+    # Calculate equation 9 for all meteor points of all tracks
+    vectors = calculate_meteor_points(numpy.concatenate(
+        [numpy.asarray(track, dtype=float)[:, :2] for track in tracks]
+    ))
+
+    return calculate_plane_normals(vectors, starts)
+
+def calculate_plane_normals(vectors: numpy.ndarray, starts: numpy.ndarray) -> numpy.ndarray:
+    """Calculates meteor path planes by equation 11 from the vectors of
+    equation 9 of consecutive tracks. Leading dimensions are kept, so
+    stacked samples of the same tracks are solved at once.
+
+    Args:
+        vectors (numpy.ndarray): vectors (Xi, Eta, Zeta) of all tracks one
+        after another, shape (..., M, 3)
+        starts (numpy.ndarray): index of the first vector of each track,
+        shape (K,)
+
+    Returns:
+        numpy.ndarray: unit vectors (a, b, c) describing meteor path planes,
+        shape (..., K, 3)
+    """
+
+    Xi, Eta, Zeta = vectors[..., 0], vectors[..., 1], vectors[..., 2]
+
+    xi_eta = numpy.add.reduceat(Xi * Eta, starts, axis=-1)
+    eta_zeta = numpy.add.reduceat(Eta * Zeta, starts, axis=-1)
+    eta_eta = numpy.add.reduceat(Eta ** 2, starts, axis=-1)
+    xi_zeta = numpy.add.reduceat(Xi * Zeta, starts, axis=-1)
+    xi_xi = numpy.add.reduceat(Xi ** 2, starts, axis=-1)
+
+    # Calculate equation 11
+    planes = numpy.stack((
+        xi_eta * eta_zeta - eta_eta * xi_zeta,
+        xi_eta * xi_zeta - xi_xi * eta_zeta,
+        xi_xi * eta_eta - xi_eta ** 2
+    ), axis=-1)
+
+    return planes / numpy.linalg.norm(planes, axis=-1, keepdims=True)
+
+def calculate_radiant_vectors(planes_a: numpy.ndarray,
+                              planes_b: numpy.ndarray) -> list[numpy.ndarray]:
+    """Calculates the radiant vectors (Xi, Eta, Zeta) as intersections of
+    pairs of meteor planes and the Q angles between them
+
+    Args:
+        planes_a (numpy.ndarray): vectors (a, b, c) of planes A,
+        shape (..., N, 3)
+        planes_b (numpy.ndarray): vectors (a, b, c) of planes B,
+        shape (..., N, 3)
+
+    Returns:
+        list[numpy.ndarray]: unit radiant vectors, shape (..., N, 3), and
+        Q angles in decimal degrees, shape (..., N)
+    """
+
+    vectors = numpy.cross(planes_a, planes_b)
+    vectors = vectors / numpy.linalg.norm(vectors, axis=-1, keepdims=True)
+
+    cos_Q = numpy.abs(numpy.sum(planes_a * planes_b, axis=-1)) \
+            / (numpy.linalg.norm(planes_a, axis=-1) * numpy.linalg.norm(planes_b, axis=-1))
+    Q_angles = numpy.degrees(numpy.arccos(numpy.clip(cos_Q, -1, 1)))
+
+    return vectors, Q_angles
+
+def calculate_pair_weights(Q_angles: numpy.ndarray) -> numpy.ndarray:
+    """Calculates weights of station pairs from their Q angles, favouring
+    pairs with planes close to perpendicular
+
+    Args:
+        Q_angles (numpy.ndarray): Q angles in decimal degrees
+
+    Returns:
+        numpy.ndarray: weights sin^2(Q)
+    """
+
+    return numpy.sin(numpy.radians(Q_angles)) ** 2
+
+def combine_radiant_vectors(vectors: numpy.ndarray, weights: numpy.ndarray) -> numpy.ndarray:
+    """Combines radiant vectors of several station pairs into one weighted
+    unit vector. Vectors pointing against the best weighted one are flipped
+    first, since the sign of a plane intersection is arbitrary.
+
+    Args:
+        vectors (numpy.ndarray): unit radiant vectors, shape (..., P, 3)
+        weights (numpy.ndarray): weight of each vector, shape (..., P)
+
+    Returns:
+        numpy.ndarray: combined unit radiant vector (Xi, Eta, Zeta),
+        shape (..., 3)
+    """
+
+    vectors = numpy.asarray(vectors, dtype=float)
+    weights = numpy.asarray(weights, dtype=float)
+
+    best = numpy.argmax(weights, axis=-1)[..., None, None]
+    reference = numpy.take_along_axis(vectors, best, axis=-2)
+    signs = numpy.where(numpy.sum(vectors * reference, axis=-1) < 0, -1.0, 1.0)
+
+    vector = numpy.sum((weights * signs)[..., None] * vectors, axis=-2)
+    return vector / numpy.linalg.norm(vector, axis=-1, keepdims=True)
+
 def calculate_meteor_point(point: list[float]) -> list[float]:
     """Calculates Xi, Eta and Zeta values from ra and dec values of meteor point
 
@@ -598,6 +1708,27 @@ def calculate_meteor_point(point: list[float]) -> list[float]:
 
     return xi, eta, zeta
 
+def calculate_meteor_points(points: list[list[float]]) -> numpy.ndarray:
+    """Calculates Xi, Eta and Zeta values for an array of meteor points
+
+    Args:
+        points (list[list[float]]): ra and dec coordinates in decimal degrees,
+        shape (..., N, 2)
+
+    Returns:
+        numpy.ndarray: Geocentric vectors Xi, Eta, Zeta, shape (..., N, 3)
+    """
+
+    points = numpy.radians(numpy.asarray(points, dtype=float)[..., :2])
+    ra, dec = points[..., 0], points[..., 1]
+
+    # Calculate equation 9
+    return numpy.stack((
+        numpy.cos(dec) * numpy.cos(ra),
+        numpy.cos(dec) * numpy.sin(ra),
+        numpy.sin(dec)
+    ), axis=-1)
+
 def calculate_meteor_point_vector(point: list[float], station_a: list[float], station_b: list[float]) -> list[float]:
     """Calculates vector X, Y, Z for meteor point
     
@@ -628,6 +1759,64 @@ def calculate_meteor_point_vector(point: list[float], station_a: list[float], st
 
     return solve_plane_intersection(plane_a, plane_b, plane_n)
 
+def calculate_meteor_point_vectors(points: list[list[float]],
+                                   station_a: list[float],
+                                   station_b: list[float],
+                                   weights: numpy.ndarray = None) -> numpy.ndarray:
+    """Calculates vectors X, Y, Z for all meteor points observed from
+    station A at once. When several partner stations B are given, the
+    intersections with each of their planes are averaged with the weights.
+    Leading dimensions of all arguments are broadcast, e.g. for samples.
+
+    Args:
+        points (list[list[float]]): ra and dec of meteor points,
+        shape (..., N, 2)
+        station_a (list[float]): vectors a, b, c and X, Y, Z of station A,
+        shape (..., 6)
+        station_b (list[float]): vectors a, b, c and X, Y, Z of station B,
+        shape (..., 6), or of P partner stations with shape (..., P, 6)
+        weights (numpy.ndarray): weights of the partner stations,
+        shape (..., P), equal weights if not set
+
+    Returns:
+        numpy.ndarray: coordinates X, Y and Z of intersections,
+        shape (..., N, 3)
+    """
+
+    station_a = numpy.asarray(station_a, dtype=float)
+    station_b = numpy.asarray(station_b, dtype=float)
+    if station_b.ndim == station_a.ndim:
+        station_b = station_b[..., None, :]
+
+    normal_a, position_a = station_a[..., :3], station_a[..., 3:]
+    normals_b, positions_b = station_b[..., :3], station_b[..., 3:]
+    lines = calculate_meteor_points(points)
+
+    # Plane definitions and equation 13, shared by all points
+    plane_a = numpy.concatenate(
+        (normal_a, -numpy.sum(normal_a * position_a, axis=-1, keepdims=True)), axis=-1)
+    planes_b = numpy.concatenate(
+        (normals_b, -numpy.sum(normals_b * positions_b, axis=-1, keepdims=True)), axis=-1)
+
+    # Equation 18 for every point
+    normals_n = numpy.cross(lines, normal_a[..., None, :])
+    planes_n = numpy.concatenate(
+        (normals_n, -numpy.sum(normals_n * position_a[..., None, :], axis=-1, keepdims=True)), axis=-1)
+
+    # Solve every point against every partner plane in one call
+    intersections = solve_plane_intersections(
+        plane_a[..., None, None, :],
+        planes_b[..., :, None, :],
+        planes_n[..., None, :, :]
+    )
+
+    if weights is None:
+        weights = numpy.ones(station_b.shape[:-1])
+    weights = numpy.asarray(weights, dtype=float)
+
+    return numpy.einsum('...p,...pnk->...nk', weights, intersections) \
+           / numpy.sum(weights, axis=-1)[..., None, None]
+
 def calculate_distance(point_a: list[float], point_b: list[float]) -> float:
     """Calculates distance between two points defined with geocentric vectors
     
@@ -683,6 +1872,107 @@ def solve_goniometry(vector: list[float]) -> list[float]:
         if numpy.allclose(vector, (cos(dec)*cos(ra), cos(dec)*sin(ra), sin(dec)), atol=0.001):
             return degrees(ra), degrees(dec)
 
+def fit_trajectory_lines(origins: numpy.ndarray,
+                         directions: numpy.ndarray,
+                         tracks: numpy.ndarray,
+                         groups: numpy.ndarray = None,
+                         times: numpy.ndarray = None) -> list[numpy.ndarray]:
+    """Fits straight lines to lines of sight from several stations by least
+    squares, in the style of Borovička (1990). The direction of each line is
+    the one closest to all station planes, the position minimises the sum of
+    squared distances from all lines of sight. Many meteors can be solved at
+    once by assigning their lines of sight to groups.
+
+    Args:
+        origins (numpy.ndarray): station positions X, Y, Z, shape (K, 3)
+        directions (numpy.ndarray): lines of sight Xi, Eta, Zeta, shape (K, 3)
+        tracks (numpy.ndarray): index of the station track of each line of
+        sight, unique across groups, shape (K,)
+        groups (numpy.ndarray): index of the meteor of each line of sight,
+        a single meteor if not set, shape (K,)
+        times (numpy.ndarray): time of each line of sight used to orient the
+        lines in the direction of flight, shape (K,)
+
+    Returns:
+        list[numpy.ndarray]: point on each line closest to the geocentre and
+        direction of each line, shape (B, 3) each, points on the lines
+        closest to each line of sight, shape (K, 3), and distances of the
+        lines of sight from the lines, shape (K,)
+    """
+
+    origins = numpy.asarray(origins, dtype=float)
+    directions = numpy.asarray(directions, dtype=float)
+    directions = directions / numpy.linalg.norm(directions, axis=1)[:, None]
+    tracks = numpy.asarray(tracks, dtype=int)
+    groups = numpy.zeros(len(origins), dtype=int) if groups is None else numpy.asarray(groups, dtype=int)
+
+    track_count, group_count = tracks.max() + 1, groups.max() + 1
+
+    # Normal of the plane fitted to each station track
+    scatter = numpy.zeros((track_count, 3, 3))
+    numpy.add.at(scatter, tracks, directions[:, :, None] * directions[:, None, :])
+    normals = numpy.linalg.eigh(scatter)[1][:, :, 0]
+
+    # Line direction closest to perpendicular to all planes of a meteor
+    track_groups = numpy.zeros(track_count, dtype=int)
+    track_groups[tracks] = groups
+
+    scatter = numpy.zeros((group_count, 3, 3))
+    numpy.add.at(scatter, track_groups, normals[:, :, None] * normals[:, None, :])
+    line_directions = numpy.linalg.eigh(scatter)[1][:, :, 0]
+
+    # Normal equations for the line position in the plane perpendicular to it
+    d = line_directions[groups]
+    m = numpy.cross(d, directions)
+    m = m / numpy.linalg.norm(m, axis=1)[:, None]
+
+    A = numpy.zeros((group_count, 3, 3))
+    numpy.add.at(A, groups, m[:, :, None] * m[:, None, :])
+    A += line_directions[:, :, None] * line_directions[:, None, :]
+
+    b = numpy.zeros((group_count, 3))
+    numpy.add.at(b, groups, m * numpy.einsum('ij,ij->i', m, origins)[:, None])
+
+    line_points = numpy.linalg.solve(A, b[:, :, None])[:, :, 0]
+
+    # Closest points on the lines to each line of sight
+    w = line_points[groups] - origins
+    cos_angle = numpy.einsum('ij,ij->i', d, directions)
+    s = (cos_angle * numpy.einsum('ij,ij->i', directions, w) - numpy.einsum('ij,ij->i', d, w)) \
+        / (1 - cos_angle ** 2)
+
+    positions = line_points[groups] + s[:, None] * d
+    residuals = numpy.abs(numpy.einsum('ij,ij->i', m, w))
+
+    # Orient the lines so that the meteor moves along them with time
+    if times is not None:
+        times = numpy.asarray(times, dtype=float)
+        counts = numpy.bincount(tracks, minlength=track_count)
+        s_centered = s - (numpy.bincount(tracks, s, track_count) / counts)[tracks]
+        t_centered = times - (numpy.bincount(tracks, times, track_count) / counts)[tracks]
+
+        flip = numpy.bincount(groups, s_centered * t_centered, group_count) < 0
+        line_directions[flip] = -line_directions[flip]
+
+    return line_points, line_directions, positions, residuals
+
+def solve_goniometry_array(vectors: numpy.ndarray) -> list[numpy.ndarray]:
+    """Solves equation 9 for many vectors at once
+    
+    Args:
+        vectors (numpy.ndarray): Vectors (Xi, Eta, Zeta), shape (N, 3)
+        
+    Returns:
+        list[numpy.ndarray]: RA in [0, 360) and Dec in decimal degrees
+    """
+
+    Xi, Eta, Zeta = numpy.asarray(vectors, dtype=float).T
+
+    ra = numpy.degrees(numpy.arctan2(Eta, Xi)) % 360
+    dec = numpy.degrees(numpy.arctan2(Zeta, numpy.hypot(Xi, Eta)))
+
+    return ra, dec
+
 def solve_plane_intersection(plane_a: list[float], plane_b: list[float], plane_c: list[float]) -> list[float]:
     """Finds the intersection of three planes defined by (a, b, c) and d by equation 19
 
@@ -699,4 +1989,37 @@ def solve_plane_intersection(plane_a: list[float], plane_b: list[float], plane_c
     # Invert d since numpy assumes ax + by + cz = d
     b = numpy.array([-plane_a[3], -plane_b[3], -plane_c[3]])
 
-    return list(numpy.linalg.solve(a, b))
\ No newline at end of file
+    return list(numpy.linalg.solve(a, b))
+
+def solve_plane_intersections(planes_a: numpy.ndarray,
+                              planes_b: numpy.ndarray,
+                              planes_c: numpy.ndarray) -> numpy.ndarray:
+    """Finds the intersections of stacked triples of planes defined by
+    (a, b, c) and d by equation 19, using Cramer's rule in closed form
+
+    Args:
+        planes_a (numpy.ndarray): values a, b, c and d of planes A,
+        shape (..., 4)
+        planes_b (numpy.ndarray): values a, b, c and d of planes B,
+        shape (..., 4)
+        planes_c (numpy.ndarray): values a, b, c and d of planes C,
+        shape (..., 4)
+
+    Returns:
+        numpy.ndarray: coordinates X, Y and Z of intersections, with the
+        broadcast shape of the planes and 3 in the last dimension
+    """
+
+    planes_a = numpy.asarray(planes_a, dtype=float)
+    planes_b = numpy.asarray(planes_b, dtype=float)
+    planes_c = numpy.asarray(planes_c, dtype=float)
+
+    n_a, n_b, n_c = planes_a[..., :3], planes_b[..., :3], planes_c[..., :3]
+
+    # x = -(d_a (n_b x n_c) + d_b (n_c x n_a) + d_c (n_a x n_b)) / det
+    bc = numpy.cross(n_b, n_c)
+    ca = numpy.cross(n_c, n_a)
+    ab = numpy.cross(n_a, n_b)
+    det = numpy.sum(n_a * bc, axis=-1, keepdims=True)
+
+    return -(planes_a[..., 3:] * bc + planes_b[..., 3:] * ca + planes_c[..., 3:] * ab) / det